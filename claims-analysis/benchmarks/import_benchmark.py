@@ -0,0 +1,103 @@
+"""Start-up time benchmark: fresh-interpreter import times of the package entry points.
+
+Every measurement starts a new interpreter, so nothing is shared through sys.modules
+and the timings are what a user of the console script waits for before any work starts.
+
+Run from the claims-analysis folder:
+    python -m benchmarks.import_benchmark
+    python -m benchmarks.import_benchmark --repeats 10 --top 15
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import Counter
+from time import perf_counter
+
+# Statements timed in a fresh interpreter, from the lightest entry point to the full pipeline
+TARGETS = {
+    "cli": "import claims_analysis.cli",
+    "dry_run": "import claims_analysis.dry_run",
+    "claims_processing": "import claims_analysis.claims_processing",
+}
+
+# Lines of `python -X importtime` output: self microseconds and the module name
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)")
+
+
+def _package_env() -> dict[str, str]:
+    """Environment that makes the package importable from the claims-analysis folder."""
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [root] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+    )
+    return env
+
+
+def time_command(args: list[str], repeats: int) -> float:
+    """Best wall time in seconds of running args in a subprocess over repeats runs."""
+
+    env = _package_env()
+    best = float("inf")
+    for _ in range(repeats):
+        start = perf_counter()
+        subprocess.run(args, check=True, env=env, capture_output=True)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def top_imports(statement: str, top: int) -> list[tuple[str, float]]:
+    """Top-level packages by total import time in seconds when running statement.
+
+    Self times of all modules are summed per top-level package, so e.g. every
+    langchain submodule counts towards langchain wherever it was imported from.
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        check=True,
+        env=_package_env(),
+        capture_output=True,
+        text=True,
+    )
+    packages: Counter = Counter()
+    for line in result.stderr.splitlines():
+        if match := _IMPORTTIME_LINE.match(line):
+            packages[match.group(2).split(".")[0]] += int(match.group(1)) / 1e6
+    return packages.most_common(top)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=0,
+        help="also list the slowest top-level imports of each target",
+    )
+    args = parser.parse_args()
+
+    baseline = time_command([sys.executable, "-c", "pass"], args.repeats)
+    print(f"interpreter start-up:      {baseline:6.3f}s")
+    for name, statement in TARGETS.items():
+        elapsed = time_command([sys.executable, "-c", statement], args.repeats)
+        print(f"import {name + ':':19s}{elapsed:6.3f}s (+{elapsed - baseline:.3f}s)")
+    elapsed = time_command(
+        [sys.executable, "-m", "claims_analysis.cli", "--help"], args.repeats
+    )
+    print(f"claims-analysis --help:    {elapsed:6.3f}s (+{elapsed - baseline:.3f}s)")
+
+    if args.top:
+        for name, statement in TARGETS.items():
+            print(f"\nslowest packages imported by {name}:")
+            for module, seconds in top_imports(statement, args.top):
+                print(f"  {module:30s}{seconds:6.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""Offline throughput benchmark of the claims pipeline on synthetic claims and a stub model.
+
+Each scenario runs in a fresh process so its peak RSS is its own. Results are written
+as JSON so they can be compared between commits:
+
+Run from the claims-analysis folder:
+    python -m benchmarks.pipeline_benchmark --output results/after.json
+    python -m benchmarks.pipeline_benchmark --output results/after.json --compare results/before.json
+
+Peak memory against claim size, default vs memory-bounded mode:
+    python -m benchmarks.pipeline_benchmark --scenarios end_to_end --claims 1 --page-counts 200 800 3200
+    python -m benchmarks.pipeline_benchmark --scenarios end_to_end --claims 1 --page-counts 200 800 3200 \
+        --max-pages-in-flight 16
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any, Callable, Optional
+
+from benchmarks.stub_chat import StubChatConfig, patch_chat_model
+from benchmarks.synthetic_claims import generate_claims
+
+# Budgets high enough that the request scheduler doesn't pace the stub unless asked to
+UNTHROTTLED_REQUESTS_PER_MINUTE = 1e9
+UNTHROTTLED_TOKENS_PER_MINUTE = 1e12
+
+
+@dataclass
+class BenchmarkConfig:
+    """Parameters shared by all scenarios of a benchmark run.
+
+    extraction_workers and threads apply to the stage scenarios; end_to_end runs
+    process_claims with its defaults, i.e. EXTRACTION_WORKERS and THREADS, in
+    memory-bounded mode if max_pages_in_flight is set.
+    """
+
+    claims: int = 4
+    pages: int = 200
+    keyword_density: float = 0.2
+    extraction_workers: int = 1
+    threads: int = 8
+    max_pages_in_flight: Optional[int] = None
+    requests_per_minute: float = UNTHROTTLED_REQUESTS_PER_MINUTE
+    tokens_per_minute: float = UNTHROTTLED_TOKENS_PER_MINUTE
+    stub: StubChatConfig = field(
+        default_factory=lambda: StubChatConfig(latency_median=0.05)
+    )
+    seed: int = 0
+
+
+def _peak_rss_mb(include_children: bool = True) -> float:
+    """Peak resident set size of this process and optionally its finished children, in MB."""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if include_children:
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def _extract_all(claim_paths: list[str], workers: int) -> list[list[str]]:
+    from claims_analysis.utils import convert_pdf_to_page_list
+
+    return [convert_pdf_to_page_list(path, workers=workers) for path in claim_paths]
+
+
+def run_extraction(config: BenchmarkConfig, claim_paths: list[str]) -> dict[str, Any]:
+    """PDF text extraction only."""
+
+    start = perf_counter()
+    claims = _extract_all(claim_paths, config.extraction_workers)
+    return {"pages": sum(map(len, claims)), "wall_seconds": perf_counter() - start}
+
+
+def run_prefilter(config: BenchmarkConfig, claim_paths: list[str]) -> dict[str, Any]:
+    """Prefilter scan of already extracted pages."""
+
+    from claims_analysis.prefilter import get_prefilter_engine
+
+    claims = _extract_all(claim_paths, config.extraction_workers)
+    engine = get_prefilter_engine()
+
+    start = perf_counter()
+    page_matches = [engine.scan_pages(pages) for pages in claims]
+    wall_seconds = perf_counter() - start
+
+    return {
+        "pages": sum(map(len, claims)),
+        "pages_matched": sum(
+            bool(page_match.matched_types)
+            for matches in page_matches
+            for page_match in matches
+        ),
+        "wall_seconds": wall_seconds,
+    }
+
+
+def run_classification(
+    config: BenchmarkConfig, claim_paths: list[str]
+) -> dict[str, Any]:
+    """Prefilter and page classification of already extracted pages with the stub model."""
+
+    from claims_analysis.page_processing import process_claim_pages
+    from claims_analysis.rate_limiting import configure_request_scheduler
+
+    claims = _extract_all(claim_paths, config.extraction_workers)
+    configure_request_scheduler(config.requests_per_minute, config.tokens_per_minute)
+
+    with patch_chat_model(config.stub) as counter:
+        start = perf_counter()
+        flagged = 0
+        for path, pages in zip(claim_paths, claims):
+            violations, _ = process_claim_pages(path, pages, threads=config.threads)
+            flagged += len(violations)
+        wall_seconds = perf_counter() - start
+
+    return {
+        "pages": sum(map(len, claims)),
+        "calls": counter.calls,
+        "stub_errors": counter.errors,
+        "violations": flagged,
+        "wall_seconds": wall_seconds,
+    }
+
+
+def run_end_to_end(config: BenchmarkConfig, claim_paths: list[str]) -> dict[str, Any]:
+    """process_claims from PDFs to output files, with a cold cache and text store."""
+
+    from claims_analysis.claims_processing import RunOptions, process_claims
+
+    run_dir = tempfile.mkdtemp(prefix="claims_benchmark_")
+    dirs = {
+        name: os.path.join(run_dir, name.split("_")[0].lower())
+        for name in ["OUTPUTS_DIR", "LOGS_DIR", "CACHE_DIR"]
+    }
+    for path in dirs.values():
+        os.makedirs(path)
+
+    with patch_chat_model(config.stub) as counter:
+        start = perf_counter()
+        process_claims(
+            is_cloud_run=True,
+            config_data_parameters={
+                "OPENAI_API_KEY": "benchmark",
+                "CLAIMS_DIR": os.path.dirname(claim_paths[0]),
+                **dirs,
+            },
+            run_id="benchmark",
+            claim_paths=claim_paths,
+            options=RunOptions(
+                requests_per_minute=config.requests_per_minute,
+                tokens_per_minute=config.tokens_per_minute,
+                max_pages_in_flight=config.max_pages_in_flight,
+            ),
+        )
+        wall_seconds = perf_counter() - start
+
+    with open(os.path.join(dirs["OUTPUTS_DIR"], "benchmark_metrics.json")) as f:
+        run_metrics = json.load(f)
+
+    return {
+        "pages": config.claims * config.pages,
+        "calls": counter.calls,
+        "stub_errors": counter.errors,
+        "wall_seconds": wall_seconds,
+        "stage_p95_seconds": {
+            name: stats["p95"]
+            for name, stats in run_metrics["distributions"].items()
+            if name.endswith("_seconds")
+        },
+    }
+
+
+SCENARIOS: dict[str, Callable[[BenchmarkConfig, list[str]], dict[str, Any]]] = {
+    "extraction": run_extraction,
+    "prefilter": run_prefilter,
+    "classification": run_classification,
+    "end_to_end": run_end_to_end,
+}
+
+
+def _run_scenario(
+    name: str, config: BenchmarkConfig, claim_paths: list[str]
+) -> dict[str, Any]:
+    """Runs a scenario and adds the derived throughput figures and peak RSS."""
+
+    # Scenarios run in their own process; keep their logs out of the results output
+    import logging
+
+    logging.disable(logging.INFO)
+
+    result = SCENARIOS[name](config, claim_paths)
+    result["pages_per_sec"] = result["pages"] / result["wall_seconds"]
+    if "calls" in result:
+        result["calls_per_claim"] = result["calls"] / len(claim_paths)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    # Forked extraction workers start out with a copy of the scenario process, so the
+    # peak of the scenario process alone shows its growth with claim size more clearly
+    result["self_peak_rss_mb"] = _peak_rss_mb(include_children=False)
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    config: BenchmarkConfig,
+    scenario_names: list[str],
+    page_counts: Optional[list[int]] = None,
+) -> dict[str, Any]:
+    """Generates the synthetic claims and runs each scenario in a fresh process.
+
+    With page_counts, every scenario is run once per claim size and its results are keyed
+    "<scenario>@<pages>", which shows how peak RSS grows with the size of the claims.
+    """
+
+    results: dict[str, Any] = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": asdict(config),
+        "scenarios": {},
+    }
+
+    for pages in page_counts or [config.pages]:
+        sized_config = replace(config, pages=pages)
+        with tempfile.TemporaryDirectory(prefix="synthetic_claims_") as claims_dir:
+            claim_paths = generate_claims(
+                claims_dir, config.claims, pages, config.keyword_density, config.seed
+            )
+            for name in scenario_names:
+                key = f"{name}@{pages}" if page_counts else name
+                # spawn rather than fork so the scenario starts without our memory
+                with ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn")
+                ) as executor:
+                    results["scenarios"][key] = executor.submit(
+                        _run_scenario, name, sized_config, claim_paths
+                    ).result()
+                print(_format_result(key, results["scenarios"][key]))
+
+    return results
+
+
+def _format_result(name: str, result: dict[str, Any]) -> str:
+    calls = (
+        f" calls/claim={result['calls_per_claim']:7.1f}"
+        if "calls_per_claim" in result
+        else ""
+    )
+    return (
+        f"{name:20s} pages/sec={result['pages_per_sec']:9.1f} "
+        f"wall={result['wall_seconds']:7.2f}s peak_rss={result['peak_rss_mb']:7.1f}MB "
+        f"(self {result['self_peak_rss_mb']:7.1f}MB){calls}"
+    )
+
+
+def compare_results(base: dict[str, Any], current: dict[str, Any]) -> None:
+    """Prints the change in throughput, wall time and peak RSS per scenario."""
+
+    print(f"Compared to {base.get('commit')} ({base.get('timestamp')}):")
+    for name, result in current["scenarios"].items():
+        if (base_result := base["scenarios"].get(name)) is None:
+            continue
+        print(
+            f"{name:20s} pages/sec {result['pages_per_sec'] / base_result['pages_per_sec']:5.2f}x "
+            f"wall {result['wall_seconds'] / base_result['wall_seconds']:5.2f}x "
+            f"peak_rss {result['peak_rss_mb'] - base_result['peak_rss_mb']:+7.1f}MB"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--claims", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument(
+        "--page-counts",
+        type=int,
+        nargs="+",
+        help="run the scenarios once per pages per claim instead of --pages",
+    )
+    parser.add_argument("--keyword-density", type=float, default=0.2)
+    parser.add_argument("--extraction-workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument(
+        "--max-pages-in-flight",
+        type=int,
+        help="run end_to_end in memory-bounded mode with this many pending pages per claim",
+    )
+    parser.add_argument(
+        "--requests-per-minute", type=float, default=UNTHROTTLED_REQUESTS_PER_MINUTE
+    )
+    parser.add_argument(
+        "--tokens-per-minute", type=float, default=UNTHROTTLED_TOKENS_PER_MINUTE
+    )
+    parser.add_argument("--latency-median", type=float, default=0.05)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--yes-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare")
+    args = parser.parse_args()
+
+    config = BenchmarkConfig(
+        claims=args.claims,
+        pages=args.pages,
+        keyword_density=args.keyword_density,
+        extraction_workers=args.extraction_workers,
+        threads=args.threads,
+        max_pages_in_flight=args.max_pages_in_flight,
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        stub=StubChatConfig(
+            latency_median=args.latency_median,
+            latency_sigma=args.latency_sigma,
+            error_rate=args.error_rate,
+            yes_ratio=args.yes_ratio,
+            seed=args.seed,
+        ),
+        seed=args.seed,
+    )
+    results = run_benchmarks(config, args.scenarios, args.page_counts)
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare_results(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
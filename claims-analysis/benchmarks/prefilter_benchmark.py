@@ -0,0 +1,140 @@
+"""Micro-benchmark of the page prefilter: per-processor keyword regexes vs the PrefilterEngine.
+
+Run from the claims-analysis folder:
+    python -m benchmarks.prefilter_benchmark --pages 2000 --repeats 5
+"""
+
+import argparse
+import random
+import re
+from time import perf_counter
+from typing import Callable
+
+from claims_analysis.constants import (
+    ALL_VIOLATION_TYPES,
+    EXCLUDED_ITEMS_VIOLATION_TYPES,
+    GLOBAL_EXCLUDED_KEYWORDS,
+    PAIR_CLAUSE_VIOLATION_TYPES,
+    RCV_PROPERTY_VIOLATION_TYPES,
+)
+from claims_analysis.prefilter import PrefilterEngine
+
+FILLER_WORDS = (
+    "drywall remove replace insulation baseboard paint flooring carpet pad labor "
+    "material tax overhead profit depreciation quantity unit total acv rcv line item "
+    "kitchen bedroom bathroom living room hallway sq ft lf ea hr water damage flood"
+).split()
+
+KEYWORD_PHRASES = [
+    "pool pump",
+    "hot tub",
+    "patio furniture",
+    "secondary residence",
+    "shed 120.00 rcv",
+    "upper cabinets",
+    "coverage h",
+]
+
+
+def make_pages(
+    n_pages: int, words_per_page: int, hit_rate: float, seed: int
+) -> list[str]:
+    """Creates synthetic estimate-like pages where roughly hit_rate of pages contain a keyword."""
+
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(n_pages):
+        words = rng.choices(FILLER_WORDS, k=words_per_page)
+        if rng.random() < hit_rate:
+            words.insert(rng.randrange(len(words)), rng.choice(KEYWORD_PHRASES))
+        pages.append(" ".join(words))
+    return pages
+
+
+def _legacy_words_exist_in_text(keywords: list[str], corpus: str) -> bool:
+    """The original utils.words_exist_in_text, which re-joins the pattern on every call."""
+
+    pattern = "|".join(r"\b{}\b".format(word) for word in keywords)
+    return bool(re.search(pattern, corpus, flags=re.IGNORECASE | re.DOTALL))
+
+
+def legacy_prefilter(pages: list[str]) -> list[list[bool]]:
+    """Per page, per processor: required keywords, then the global excluded keywords."""
+
+    processor_keywords = [
+        list({kw for vt in viol_types for kw in vt.keywords})
+        for viol_types in [
+            EXCLUDED_ITEMS_VIOLATION_TYPES,
+            RCV_PROPERTY_VIOLATION_TYPES,
+            PAIR_CLAUSE_VIOLATION_TYPES,
+        ]
+    ]
+    return [
+        [
+            _legacy_words_exist_in_text(keywords, page)
+            and not _legacy_words_exist_in_text(GLOBAL_EXCLUDED_KEYWORDS, page)
+            for keywords in processor_keywords
+        ]
+        for page in pages
+    ]
+
+
+def engine_prefilter(pages: list[str]) -> list[list[bool]]:
+    """Single scan per page with the compiled engine, then dispatch per processor."""
+
+    engine = PrefilterEngine(ALL_VIOLATION_TYPES)
+    processor_type_names = [
+        {vt.name for vt in viol_types}
+        for viol_types in [
+            EXCLUDED_ITEMS_VIOLATION_TYPES,
+            RCV_PROPERTY_VIOLATION_TYPES,
+            PAIR_CLAUSE_VIOLATION_TYPES,
+        ]
+    ]
+    return [
+        [page_match.matches_any(names) for names in processor_type_names]
+        for page_match in engine.scan_pages(pages)
+    ]
+
+
+def time_pages_per_sec(
+    func: Callable[[list[str]], list[list[bool]]], pages: list[str], repeats: int
+) -> float:
+    """Best-of-repeats throughput in pages per second."""
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = perf_counter()
+        func(pages)
+        best = min(best, perf_counter() - start)
+    return len(pages) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--hit-rate", type=float, default=0.2)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, args.words_per_page, args.hit_rate, args.seed)
+
+    # Both paths must dispatch exactly the same (page, processor) pairs
+    assert legacy_prefilter(pages) == engine_prefilter(pages)
+
+    legacy = time_pages_per_sec(legacy_prefilter, pages, args.repeats)
+    engine = time_pages_per_sec(engine_prefilter, pages, args.repeats)
+
+    print(
+        f"pages={args.pages} words/page={args.words_per_page} hit_rate={args.hit_rate}"
+    )
+    print(f"legacy per-processor regex: {legacy:10.0f} pages/sec")
+    print(
+        f"prefilter engine:           {engine:10.0f} pages/sec ({engine / legacy:.2f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Local stand-in for ChatOpenAI so the pipeline can be benchmarked without API calls."""
+
+import random
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+from time import sleep
+from typing import Iterator
+from unittest import mock
+
+import openai
+from langchain.schema import AIMessage, BaseMessage
+
+from claims_analysis.constants import SUMMARIZATION_PROMPT, YES_DELIMITER
+
+# Labelled violation lines of the combined prompt, "- <name>: <description>"
+_COMBINED_LABEL = re.compile(r"^- (\w+): ", flags=re.MULTILINE)
+
+
+@dataclass
+class StubChatConfig:
+    """Behaviour of the stub model.
+
+    Attributes:
+        latency_median: median seconds per call; latencies are log-normally distributed
+        latency_sigma: sigma of the log-normal latency, 0 for a fixed latency
+        error_rate: fraction of calls that raise a retryable API error
+        yes_ratio: fraction of classification calls answered with a violation instead of NONE
+        seed: seed for latencies and errors; verdicts only depend on the request text
+    """
+
+    latency_median: float = 0.5
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    yes_ratio: float = 0.2
+    seed: int = 0
+
+
+class StubCallCounter:
+    """Thread-safe count of calls and raised errors across all stub instances."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, error: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += error
+
+
+class StubChatModel:
+    """Callable with ChatOpenAI's call signature, model_name and temperature.
+
+    Verdicts are a deterministic function of the request, so repeated runs and the
+    response cache see the same answers; latencies and errors are drawn at random.
+    """
+
+    def __init__(
+        self,
+        config: StubChatConfig,
+        counter: StubCallCounter,
+        temperature: float = 0,
+        model_name: str = "gpt-3.5-turbo",
+        **kwargs,
+    ):
+        self.config = config
+        self.temperature = temperature
+        self.model_name = model_name
+        self._counter = counter
+        self._rng = random.Random(config.seed)
+
+    def _is_yes(self, sys_message: str, page_text: str) -> bool:
+        request_hash = zlib.crc32(f"{sys_message}\0{page_text}".encode("utf-8"))
+        return request_hash / 2**32 < self.config.yes_ratio
+
+    def _respond(self, sys_message: str, page_text: str) -> str:
+        if sys_message == SUMMARIZATION_PROMPT:
+            return "Possible violations flagged in the claim are: stub summary."
+        if not self._is_yes(sys_message, page_text):
+            return "NONE"
+
+        summary = f"stub verdict for '{page_text[:30]}'"
+        if labels := _COMBINED_LABEL.findall(sys_message):
+            return "\n".join(f"{YES_DELIMITER} {label}: {summary}" for label in labels)
+        return f"{YES_DELIMITER} {summary}"
+
+    def __call__(self, messages: list[BaseMessage]) -> AIMessage:
+        latency = self.config.latency_median * self._rng.lognormvariate(
+            0, self.config.latency_sigma
+        )
+        is_error = self._rng.random() < self.config.error_rate
+        sleep(latency)
+        self._counter.record(is_error)
+        if is_error:
+            raise openai.error.APIError("stub API error")
+
+        return AIMessage(
+            content=self._respond(messages[0].content, messages[-1].content)
+        )
+
+
+@contextmanager
+def patch_chat_model(config: StubChatConfig) -> Iterator[StubCallCounter]:
+    """Replaces the ChatOpenAI clients of the page processors and summarization with the stub.
+
+    Yields the counter shared by every stub created while the patch is active.
+    """
+
+    counter = StubCallCounter()
+    factory = partial(StubChatModel, config, counter)
+    with mock.patch(
+        "claims_analysis.page_processing.new_chat_model", factory
+    ), mock.patch("claims_analysis.summarization.new_chat_model", factory):
+        yield counter
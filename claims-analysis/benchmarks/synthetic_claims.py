@@ -0,0 +1,129 @@
+"""Generates synthetic claim PDFs for benchmarking without the private claim files.
+
+Pages look like flood estimate line items; keyword_density is the fraction of pages
+that contain one of the prefilter keyword phrases, i.e. the pages that will be sent
+to the model.
+
+Run from the claims-analysis folder:
+    python -m benchmarks.synthetic_claims out/claims --claims 5 --pages 200 --keyword-density 0.2
+"""
+
+import argparse
+import os
+import random
+
+from benchmarks.prefilter_benchmark import FILLER_WORDS, KEYWORD_PHRASES
+
+WORDS_PER_LINE = 12
+LINES_PER_PAGE = 40
+
+
+def _escape_pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_claim_pages(n_pages: int, keyword_density: float, seed: int) -> list[str]:
+    """Creates estimate-like page texts, one string with newline separated lines per page."""
+
+    rng = random.Random(seed)
+    pages = []
+    for page_no in range(1, n_pages + 1):
+        tokens = rng.choices(FILLER_WORDS, k=WORDS_PER_LINE * (LINES_PER_PAGE - 2))
+        if rng.random() < keyword_density:
+            # Phrases are inserted as one token so they are never split across lines
+            tokens.insert(rng.randrange(len(tokens)), rng.choice(KEYWORD_PHRASES))
+
+        lines = [f"Claim estimate page {page_no}"]
+        lines += [
+            " ".join(tokens[start : start + WORDS_PER_LINE])
+            for start in range(0, len(tokens), WORDS_PER_LINE)
+        ]
+        lines.append(
+            f"Total RCV {rng.uniform(100, 50000):,.2f} ACV {rng.uniform(50, 40000):,.2f}"
+        )
+        pages.append("\n".join(lines))
+    return pages
+
+
+def write_claim_pdf(path: str, pages: list[str]) -> None:
+    """Writes a minimal uncompressed PDF with one Helvetica text page per entry of pages."""
+
+    n_pages = len(pages)
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and its content stream per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{4 + 2 * idx} 0 R" for idx in range(n_pages)), n_pages
+        ).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for idx, page in enumerate(pages):
+        text_ops = " ".join(
+            f"({_escape_pdf_text(line)}) Tj T*" for line in page.split("\n")
+        )
+        content = f"BT /F1 9 Tf 36 760 Td 11 TL {text_ops} ET".encode("latin-1")
+        objects.append(
+            (
+                "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * idx} 0 R >>"
+            ).encode()
+        )
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+        )
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for obj_no, obj in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (obj_no, obj)
+
+    xref_offset = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref_offset,
+    )
+
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def generate_claims(
+    out_dir: str,
+    n_claims: int,
+    n_pages: int,
+    keyword_density: float,
+    seed: int = 0,
+) -> list[str]:
+    """Writes n_claims synthetic claim PDFs to out_dir and returns their paths."""
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for claim_idx in range(n_claims):
+        path = os.path.join(out_dir, f"synthetic_claim_{claim_idx:03d}.pdf")
+        write_claim_pdf(
+            path, make_claim_pages(n_pages, keyword_density, seed + claim_idx)
+        )
+        paths.append(path)
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--claims", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--keyword-density", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate_claims(
+        args.out_dir, args.claims, args.pages, args.keyword_density, args.seed
+    )
+    print(f"Wrote {len(paths)} claims of {args.pages} pages to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
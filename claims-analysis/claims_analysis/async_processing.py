@@ -0,0 +1,284 @@
+import asyncio
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterator, Optional, TypeVar
+
+from claims_analysis import metrics
+from claims_analysis.constants import (
+    EXTRACTION_WINDOW_PAGES,
+    EXTRACTION_WORKERS,
+    MAX_CLAIMS_IN_FLIGHT,
+    MAX_IN_FLIGHT_REQUESTS,
+    ClassificationMode,
+    ExtendedCoverage,
+)
+from claims_analysis.page_processing import (
+    PageProcessor,
+    Violation,
+    build_processors,
+    classify_page,
+    route_page,
+)
+from claims_analysis.prefilter import PrefilterEngine, get_prefilter_engine
+from claims_analysis.summarization import ClaimSummary, summarize_claim
+from claims_analysis.text_store import iter_claim_pages
+
+T = TypeVar("T")
+
+
+class _ClaimBatchRunner:
+    """Runs the claims of a batch concurrently on one event loop.
+
+    Every model call holds one of `max_in_flight` request slots across claim boundaries,
+    while extraction, prefiltering and routing run in their own pool. With
+    max_pages_in_flight set, claims are processed in memory-bounded windows.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_claims_in_flight: int,
+        call_executor: Executor,
+        extract_executor: Executor,
+        classification_mode: ClassificationMode,
+        snippet_width: Optional[int],
+        max_pages_in_flight: Optional[int] = None,
+    ):
+        self._request_slots = asyncio.Semaphore(max_in_flight)
+        self._claim_slots = asyncio.Semaphore(max_claims_in_flight)
+        self._call_executor = call_executor
+        self._extract_executor = extract_executor
+        self._classification_mode = classification_mode
+        self._snippet_width = snippet_width
+        self._max_pages_in_flight = max_pages_in_flight
+
+    async def _call(self, func: Callable[..., T], *args) -> T:
+        """Runs a blocking model call in the call pool once a request slot is free."""
+
+        # Queue wait covers both waiting for a request slot and for a pool thread
+        func = metrics.track_queue_wait("executor_wait_seconds", func)
+        async with self._request_slots:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._call_executor, func, *args
+            )
+
+    async def _classify(
+        self,
+        claim_path: str,
+        page_no: int,
+        processor: PageProcessor,
+        page: str,
+        matched_type_names: set[str],
+        page_slots: Optional[asyncio.Semaphore] = None,
+    ) -> list[Violation]:
+        try:
+            findings = await self._call(
+                classify_page, processor, claim_path, page_no, page, matched_type_names
+            )
+        finally:
+            if page_slots is not None:
+                page_slots.release()
+        for _, reason in findings:
+            logging.info(
+                f"Found violation in {claim_path} on page {page_no} with reason: {reason}"
+            )
+        return [
+            Violation(
+                filepath=claim_path,
+                page_no=page_no,
+                issue_desc=reason,
+                violation_type=violation_type,
+            )
+            for violation_type, reason in findings
+        ]
+
+    @staticmethod
+    def _extract_and_route(
+        page_iter: Iterator[str],
+        window: Optional[int],
+        first_page_no: int,
+        engine: PrefilterEngine,
+        processors: list[PageProcessor],
+    ) -> list[tuple[int, str, set[str], list[PageProcessor]]]:
+        """Extracts the next window of pages and routes each one; runs in the extract pool.
+
+        Returns:
+            (page number, page text, matched violation types, processors to send it to)
+            of each page, including pages that go to no processor
+        """
+
+        routed = []
+        for page_no, page in enumerate(islice(page_iter, window), first_page_no):
+            page_match = engine.scan_page(page, page_no)
+            routed.append(
+                (
+                    page_no,
+                    page,
+                    page_match.matched_types,
+                    route_page(page, page_match, processors),
+                )
+            )
+        return routed
+
+    async def process_claim(
+        self, claim_path: str, extended_coverages: list[ExtendedCoverage]
+    ) -> tuple[list[Violation], ClaimSummary]:
+        """Processes a single claim; returns the same results as process_single_claim."""
+
+        # Claim slots bound how many claims hold their page text in memory at once
+        async with self._claim_slots:
+            bounded = self._max_pages_in_flight is not None
+            page_iter = iter_claim_pages(
+                claim_path,
+                workers=EXTRACTION_WORKERS,
+                window_pages=EXTRACTION_WINDOW_PAGES if bounded else None,
+            )
+            # Unbounded claims are extracted in one go, bounded ones a window at a time
+            window = EXTRACTION_WINDOW_PAGES if bounded else None
+            page_slots = (
+                asyncio.Semaphore(self._max_pages_in_flight) if bounded else None
+            )
+
+            engine = get_prefilter_engine()
+            processors = build_processors(
+                extended_coverages, self._classification_mode, self._snippet_width
+            )
+            pages_total = 0
+            pages_processed: set[int] = set()
+            classifications: list[asyncio.Future[list[Violation]]] = []
+
+            while pages := await asyncio.get_running_loop().run_in_executor(
+                self._extract_executor,
+                self._extract_and_route,
+                page_iter,
+                window,
+                pages_total + 1,
+                engine,
+                processors,
+            ):
+                for page_no, page, matched_types, page_processors in pages:
+                    for processor in page_processors:
+                        pages_processed.add(page_no)
+                        if page_slots is not None:
+                            await page_slots.acquire()
+                        classifications.append(
+                            asyncio.ensure_future(
+                                self._classify(
+                                    claim_path,
+                                    page_no,
+                                    processor,
+                                    page,
+                                    matched_types,
+                                    page_slots,
+                                )
+                            )
+                        )
+                pages_total += len(pages)
+                del pages
+
+            # gather keeps submission order, which matches the order of the thread pool path
+            violations = [
+                violation
+                for page_violations in await asyncio.gather(*classifications)
+                for violation in page_violations
+            ]
+            logging.info(
+                f"Finished {claim_path}. Processed {len(pages_processed)} pages out of "
+                f"{pages_total}: {pages_processed}"
+            )
+
+        claim_summary = await self._call(
+            summarize_claim, claim_path, violations, pages_total, len(pages_processed)
+        )
+        return violations, claim_summary
+
+
+async def process_claims_concurrently(
+    claim_paths: list[str],
+    extended_coverage_dict: dict[str, list[ExtendedCoverage]] = {},
+    max_in_flight: int = MAX_IN_FLIGHT_REQUESTS,
+    max_claims_in_flight: int = MAX_CLAIMS_IN_FLIGHT,
+    classification_mode: ClassificationMode = ClassificationMode.Split,
+    snippet_width: Optional[int] = None,
+    max_pages_in_flight: Optional[int] = None,
+    on_claim_done: Optional[
+        Callable[[int, list[Violation], ClaimSummary], None]
+    ] = None,
+) -> list[tuple[list[Violation], ClaimSummary]]:
+    """Processes many claims concurrently under one global limit of in-flight model calls.
+
+    Args:
+        claim_paths: the paths of the claim PDF files
+        extended_coverage_dict: mapping from claims_path to extended coverages that were purchased
+        max_in_flight: maximum number of model calls in flight across all claims
+        max_claims_in_flight: maximum number of claims being extracted or classified at once
+        classification_mode: whether pages are sent once per prompt family or once overall
+        snippet_width: if set, only windows around the keyword hits are sent, see PageProcessor
+        max_pages_in_flight: if set, claims are processed in memory-bounded mode with at most
+            this many page classifications pending per claim
+        on_claim_done: called on the event loop with the index in claim_paths, violations and
+            summary of each claim as soon as it completes, e.g. to checkpoint it
+
+    Returns:
+        the violations and summary of each claim, in the order of claim_paths
+    """
+
+    async def process_claim(
+        runner: _ClaimBatchRunner, claim_idx: int, claim_path: str
+    ) -> tuple[list[Violation], ClaimSummary]:
+        violations, claim_summary = await runner.process_claim(
+            claim_path, extended_coverage_dict.get(claim_path, [])
+        )
+        if on_claim_done is not None:
+            on_claim_done(claim_idx, violations, claim_summary)
+        return violations, claim_summary
+
+    with ThreadPoolExecutor(
+        max_workers=max_in_flight
+    ) as call_executor, ThreadPoolExecutor(
+        max_workers=max_claims_in_flight
+    ) as extract_executor:
+        runner = _ClaimBatchRunner(
+            max_in_flight,
+            max_claims_in_flight,
+            call_executor,
+            extract_executor,
+            classification_mode,
+            snippet_width,
+            max_pages_in_flight,
+        )
+        return await asyncio.gather(
+            *(
+                process_claim(runner, claim_idx, claim_path)
+                for claim_idx, claim_path in enumerate(claim_paths)
+            )
+        )
+
+
+def run_claims_concurrently(
+    claim_paths: list[str],
+    extended_coverage_dict: dict[str, list[ExtendedCoverage]] = {},
+    max_in_flight: int = MAX_IN_FLIGHT_REQUESTS,
+    max_claims_in_flight: int = MAX_CLAIMS_IN_FLIGHT,
+    classification_mode: ClassificationMode = ClassificationMode.Split,
+    snippet_width: Optional[int] = None,
+    max_pages_in_flight: Optional[int] = None,
+    on_claim_done: Optional[
+        Callable[[int, list[Violation], ClaimSummary], None]
+    ] = None,
+) -> list[tuple[list[Violation], ClaimSummary]]:
+    """Synchronous wrapper around process_claims_concurrently."""
+
+    return asyncio.run(
+        process_claims_concurrently(
+            claim_paths,
+            extended_coverage_dict,
+            max_in_flight,
+            max_claims_in_flight,
+            classification_mode,
+            snippet_width,
+            max_pages_in_flight,
+            on_claim_done,
+        )
+    )
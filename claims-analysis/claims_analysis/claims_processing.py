@@ -1,29 +1,59 @@
 import logging
 import os
+from dataclasses import asdict, dataclass
+from time import time
+from typing import Optional
 
-import openai
-import pandas as pd
-from dotenv import load_dotenv
-
-from claims_analysis.constants import THREADS, ExtendedCoverage
-from claims_analysis.page_processing import Violation, process_claim_pages
-from claims_analysis.summarization import ClaimSummary, summarize_results
-from claims_analysis.utils import convert_pdf_to_page_list, log_timer, setup_logging
+from claims_analysis.constants import (
+    CONCURRENCY_CEILING,
+    CONCURRENCY_FLOOR,
+    EXTRACTION_WINDOW_PAGES,
+    EXTRACTION_WORKERS,
+    MAX_IN_FLIGHT_REQUESTS,
+    REQUESTS_PER_MINUTE,
+    THREADS,
+    TOKENS_PER_MINUTE,
+    ClassificationMode,
+    ExtendedCoverage,
+    OutputFormat,
+)
+from claims_analysis.dedup import configure_page_deduplicator
+from claims_analysis.metrics import configure_metrics
+from claims_analysis.outputs import make_result_writer
+from claims_analysis.page_processing import (
+    PROCESSOR_REGISTRY,
+    ClaimPageStream,
+    Violation,
+    process_claim_pages,
+)
+from claims_analysis.rate_limiting import (
+    AdaptiveConcurrencyLimiter,
+    configure_request_scheduler,
+    get_request_scheduler,
+)
+from claims_analysis.response_cache import configure_response_cache
+from claims_analysis.run_journal import RunJournal, configure_run_journal
+from claims_analysis.summarization import ClaimSummary, summarize_claim
+from claims_analysis.text_store import configure_text_store, iter_claim_pages
+from claims_analysis.triage import configure_page_triage, load_thresholds
+from claims_analysis.utils import log_timer, setup_logging
 
 CLAIMS_DIR = None
 OUTPUTS_DIR = None
 LOGS_DIR = None
+CACHE_DIR = None
 
 
 @log_timer
 def __configure_file_paths(is_cloud_run: bool, config_data_parameters: dict):
-    """Configure OPENAI_API_KEY, Claims, Outputs and Logs folder paths
+    """Configure OPENAI_API_KEY, Claims, Outputs, Logs and Cache folder paths
 
     Args:
         is_cloud_run (bool): True in case the execution started from the Google Colab Notebook, otherwise False.
         config_data_parameters (dict): A dictionary containing OPENAI_API_KEY, Claims, Outputs and Logs folder paths.
+            CACHE_DIR is optional and defaults to a "cache" folder next to the outputs folder.
     """
-    global CLAIMS_DIR, OUTPUTS_DIR, LOGS_DIR
+    global CLAIMS_DIR, OUTPUTS_DIR, LOGS_DIR, CACHE_DIR
 
     if is_cloud_run:
 
@@ -34,8 +64,16 @@ def __configure_file_paths(is_cloud_run: bool, config_data_parameters: dict):
         CLAIMS_DIR = config_data_parameters["CLAIMS_DIR"]
         OUTPUTS_DIR = config_data_parameters["OUTPUTS_DIR"]
         LOGS_DIR = config_data_parameters["LOGS_DIR"]
+        CACHE_DIR = config_data_parameters.get(
+            "CACHE_DIR",
+            os.path.join(os.path.dirname(os.path.normpath(OUTPUTS_DIR)), "cache"),
+        )
 
     else:
+        # Only needed for local runs; imported here to keep the module quick to import
+        import openai
+        from dotenv import load_dotenv
+
         # Setup API key locally
         load_dotenv()
         openai.api_key = os.getenv("OPENAI_API_KEY")
@@ -44,37 +82,143 @@ def __configure_file_paths(is_cloud_run: bool, config_data_parameters: dict):
         CLAIMS_DIR = "claims/"
         OUTPUTS_DIR = "outputs/"
         LOGS_DIR = "logs/"
+        CACHE_DIR = "cache/"
+
+    os.makedirs(OUTPUTS_DIR, exist_ok=True)
+    os.makedirs(LOGS_DIR, exist_ok=True)
+
+
+@dataclass(frozen=True)
+class RunOptions:
+    """Settings of a batch run, see process_claims.
+
+    Attributes:
+        streaming: classify pages as they are extracted instead of after the whole claim
+        use_cache: answer repeated page requests from the response cache under CACHE_DIR
+        use_text_store: reuse page text extracted by earlier runs, stored under CACHE_DIR
+        concurrent_claims: process claims concurrently instead of one by one
+        requests_per_minute: request budget that model calls are paced under
+        tokens_per_minute: token budget that model calls are paced under
+        classification_mode: one call per prompt family (split) or per page (combined)
+        snippet_width: if set, send windows of this many characters around keyword hits
+        deduplicate_pages: reuse the verdict of the first copy of near-duplicate pages
+        collect_metrics: write stage timings and counters to OUTPUTS_DIR/<run_id>_metrics.json
+        resume: continue an interrupted run of the same run_id and settings from its journal
+        keep_journal: keep the journal after the run finishes, e.g. for calibrate-triage
+        output_format: file format of the violations and summaries
+        include_page_text: add the text of the flagged page to each violation row
+        threads: concurrent model calls per claim when claims are processed one by one
+        triage: skip model calls that the local triage scores as clearly negative
+        triage_thresholds_path: JSON file of per violation type triage thresholds
+        max_pages_in_flight: if set, bound memory to this many pending page calls per claim
+        adaptive_concurrency: adjust the model calls in flight from latency, errors and 429s
+        concurrency_floor: lowest adaptive limit of model calls in flight
+        concurrency_ceiling: highest adaptive limit of model calls in flight
+    """
+
+    streaming: bool = True
+    use_cache: bool = True
+    use_text_store: bool = True
+    concurrent_claims: bool = False
+    requests_per_minute: float = REQUESTS_PER_MINUTE
+    tokens_per_minute: float = TOKENS_PER_MINUTE
+    classification_mode: ClassificationMode = ClassificationMode.Split
+    snippet_width: Optional[int] = None
+    deduplicate_pages: bool = False
+    collect_metrics: bool = True
+    resume: bool = False
+    keep_journal: bool = False
+    output_format: OutputFormat = OutputFormat.Csv
+    include_page_text: bool = False
+    threads: int = THREADS
+    triage: bool = False
+    triage_thresholds_path: Optional[str] = None
+    max_pages_in_flight: Optional[int] = None
+    adaptive_concurrency: bool = False
+    concurrency_floor: int = CONCURRENCY_FLOOR
+    concurrency_ceiling: int = CONCURRENCY_CEILING
 
 
 @log_timer
 def process_single_claim(
-    claim_path: str, extended_coverages: list[ExtendedCoverage] = []
+    claim_path: str,
+    extended_coverages: list[ExtendedCoverage] = [],
+    streaming: bool = True,
+    classification_mode: ClassificationMode = ClassificationMode.Split,
+    snippet_width: Optional[int] = None,
+    threads: int = THREADS,
+    max_pages_in_flight: Optional[int] = None,
 ) -> tuple[list[Violation], ClaimSummary]:
-    """Read claim, get violations, and summarization for a single claim."""
+    """Read claim, get violations, and summarization for a single claim.
+
+    Args:
+        claim_path: path to the claim PDF file
+        extended_coverages: list of extended coverages that the policyholder has bought
+        streaming: if True, pages are classified as they are extracted so model calls overlap
+            with PDF parsing; otherwise the full claim is extracted before any call is made.
+            Both modes return identical results.
+        classification_mode: whether pages are sent to the LLM once per prompt family (split) or
+            once with all matched violation types in a single prompt (combined)
+        snippet_width: if set, only windows of this many characters around each keyword hit are
+            sent to the LLM instead of the whole page
+        threads: number of concurrent model calls for the claim's pages; with an adaptive
+            concurrency limiter configured the pool is sized for its ceiling instead
+        max_pages_in_flight: if set, the claim is processed in memory-bounded mode: extraction
+            works through windows of EXTRACTION_WINDOW_PAGES pages and at most this many page
+            classifications are pending at once, so memory stays flat however many pages the
+            claim has. Implies streaming; results are unchanged.
+    """
 
-    # Read the claim
-    pages = convert_pdf_to_page_list(claim_path)
+    if (limiter := get_request_scheduler().concurrency_limiter) is not None:
+        # The limiter decides how many of the pool's threads may call the model
+        threads = limiter.ceiling
 
-    # Get all violations and the page numbers queried
-    violations, pages_processed = process_claim_pages(
-        claim_path, pages, threads=THREADS, extended_coverages=extended_coverages
-    )
+    if streaming or max_pages_in_flight is not None:
+        # Pages flow from the PDF straight into the prefilter and the thread pool
+        start_time = time()
+        stream = ClaimPageStream(
+            claim_path,
+            iter_claim_pages(
+                claim_path,
+                workers=EXTRACTION_WORKERS,
+                window_pages=(
+                    EXTRACTION_WINDOW_PAGES if max_pages_in_flight is not None else None
+                ),
+            ),
+            threads=threads,
+            extended_coverages=extended_coverages,
+            classification_mode=classification_mode,
+            snippet_width=snippet_width,
+            max_pages_in_flight=max_pages_in_flight,
+        )
+        for violation_idx, _ in enumerate(stream):
+            if violation_idx == 0:
+                logging.info(
+                    f"First violation for {claim_path} after {time() - start_time:.2f}s"
+                )
+        violations = stream.violations
+        pages_total = stream.pages_total
+        pages_processed = list(stream.pages_processed)
+    else:
+        # Read the claim; large claims are extracted in parallel across processes
+        pages = list(iter_claim_pages(claim_path, workers=EXTRACTION_WORKERS))
+        pages_total = len(pages)
 
-    # Summarize the information for the claim
-    summary_text = (
-        summarize_results(violations) if len(violations) > 0 else "No violations found."
-    )
+        # Get all violations and the page numbers queried
+        violations, pages_processed = process_claim_pages(
+            claim_path,
+            pages,
+            threads=threads,
+            extended_coverages=extended_coverages,
+            classification_mode=classification_mode,
+            snippet_width=snippet_width,
+        )
 
-    claim_summary = ClaimSummary(
-        filepath=claim_path,
-        pages_total=len(pages),
-        pages_processed=len(pages_processed),
-        pages_flagged=len(violations),
-        summary=summary_text,
+    # Summarize the information for the claim
+    claim_summary = summarize_claim(
+        claim_path, violations, pages_total, len(pages_processed)
     )
 
-    logging.info(f"Summary for {claim_path}:\n{summary_text}")
-
     return violations, claim_summary
 
 
@@ -85,12 +229,13 @@ def process_claims(
     run_id: str,
     claim_paths: list[str] = [],
     extended_coverage_dict: dict[str, list[ExtendedCoverage]] = {},
+    options: RunOptions = RunOptions(),
 ) -> None:
     """Processes a list of claims and outputs their violations and summaries to csv files.
 
     Main entrypoint for processing claims. First we apply the PageProcessor to identify
     potential violations in each claim then all violations are summarized. We save the
-    violations and the summaries as .csv files.
+    violations and the summary of each claim as soon as it's done.
 
     Args:
         is_cloud_run: True in case the execution started from the Google Colab Notebook, otherwise False.
@@ -99,35 +244,200 @@ def process_claims(
         claim_paths: the paths of the files to be processed; if none are provided then
             all .pdf files in the CLAIMS_DIR will be processed.
         extended_coverage_dict: mapping from claims_path to extended coverages that were purchased
+        options: settings of the run, see RunOptions
     """
 
     __configure_file_paths(is_cloud_run, config_data_parameters)
 
     log_path = os.path.join(LOGS_DIR, run_id + ".log")
-    setup_logging(log_path=log_path)
-    logging.info(f"Starting run {run_id}...")
+    setup_logging(log_path=log_path, append=options.resume)
+    metrics_recorder = configure_metrics(options.collect_metrics)
+    page_mode = (
+        f"snippets of {options.snippet_width} chars"
+        if options.snippet_width is not None
+        else "full pages"
+    )
+    logging.info(
+        f"Starting run {run_id} with {options.classification_mode.value} page classification "
+        f"on {page_mode}..."
+    )
+
+    response_cache = configure_response_cache(
+        os.path.join(CACHE_DIR, "responses.sqlite") if options.use_cache else None
+    )
+    text_store = configure_text_store(
+        os.path.join(CACHE_DIR, "page_text") if options.use_text_store else None
+    )
+    # openai and requests are only needed once a run starts, not to import the module
+    from claims_analysis.http_client import get_http_client_pool
+
+    concurrency_limiter = (
+        AdaptiveConcurrencyLimiter(
+            MAX_IN_FLIGHT_REQUESTS if options.concurrent_claims else options.threads,
+            options.concurrency_floor,
+            options.concurrency_ceiling,
+        )
+        if options.adaptive_concurrency
+        else None
+    )
+    request_scheduler = configure_request_scheduler(
+        options.requests_per_minute,
+        options.tokens_per_minute,
+        concurrency_limiter=concurrency_limiter,
+    )
+    page_deduplicator = configure_page_deduplicator(options.deduplicate_pages)
+    page_triage = configure_page_triage(
+        options.triage,
+        (
+            load_thresholds(options.triage_thresholds_path)
+            if options.triage_thresholds_path
+            else {}
+        ),
+    )
+    if (http_client_pool := get_http_client_pool()) is not None:
+        http_client_pool.start_run()
+
+    output_base = os.path.join(OUTPUTS_DIR, run_id)
+    journal_path = output_base + "_journal.jsonl"
 
-    # Get list of all claims in claims directory if paths are not explicitly provided
-    if not claim_paths:
+    # Get list of all claims in claims directory if paths are not explicitly provided. A resumed
+    # run keeps the claims and order it was started with.
+    if not claim_paths and not (options.resume and os.path.exists(journal_path)):
         claim_paths = [
             os.path.join(CLAIMS_DIR, file)
             for file in os.listdir(CLAIMS_DIR)
             if file.endswith(".pdf")
         ]
+    # Settings that change the results; a run can only be resumed with the same settings
+    result_settings = {
+        "classification_mode": options.classification_mode.value,
+        "snippet_width": options.snippet_width,
+        "deduplicate_pages": options.deduplicate_pages,
+        "triage": page_triage.thresholds if page_triage is not None else None,
+        "extended_coverages": {
+            path: [coverage.value for coverage in coverages]
+            for path, coverages in extended_coverage_dict.items()
+        },
+    }
+    journal = configure_run_journal(
+        RunJournal(
+            journal_path, run_id, result_settings, claim_paths, resume=options.resume
+        )
+    )
+    claim_paths = journal.claim_paths
     logging.info(f"All claims to be processed: {claim_paths}.")
 
-    all_violations: list[Violation] = []
-    all_summaries: list[ClaimSummary] = []
+    result_writer = make_result_writer(
+        options.output_format,
+        output_base,
+        options.include_page_text,
+        include_violation_type=options.classification_mode
+        == ClassificationMode.Combined,
+    )
 
-    for claim_path in claim_paths:
-        extended_coverages = extended_coverage_dict.get(claim_path, [])
-        violations, summary = process_single_claim(claim_path, extended_coverages)
-        all_violations.extend(violations)
-        all_summaries.append(summary)
-        logging.info("---------------------------------------------\n")
+    def finish_claim(
+        claim_idx: int, violations: list[Violation], summary: ClaimSummary
+    ) -> None:
+        """Checkpoints a completed claim and writes its rows."""
 
-    # Save the results
-    output_base = os.path.join(OUTPUTS_DIR, run_id)
-    pd.DataFrame(all_violations).to_csv(output_base + "_violations.csv", index=False)
-    pd.DataFrame(all_summaries).to_csv(output_base + "_summary.csv", index=False)
+        journal.record_claim(
+            claim_paths[claim_idx],
+            [asdict(violation) for violation in violations],
+            asdict(summary),
+        )
+        result_writer.write_claim(claim_idx, violations, summary)
+
+    finished = False
+    try:
+        # Write the results of claims completed before the run was interrupted
+        remaining_claim_idxs = []
+        for claim_idx, claim_path in enumerate(claim_paths):
+            if (completed := journal.completed_claim(claim_path)) is None:
+                remaining_claim_idxs.append(claim_idx)
+                continue
+            result_writer.write_claim(
+                claim_idx,
+                [Violation(**row) for row in completed["violations"]],
+                ClaimSummary(**completed["summary"]),
+            )
+        if len(remaining_claim_idxs) < len(claim_paths):
+            logging.info(
+                f"Skipping {len(claim_paths) - len(remaining_claim_idxs)} claims completed "
+                f"before the run was resumed"
+            )
+
+        if options.concurrent_claims:
+            from claims_analysis.async_processing import run_claims_concurrently
+
+            run_claims_concurrently(
+                [claim_paths[claim_idx] for claim_idx in remaining_claim_idxs],
+                extended_coverage_dict,
+                max_in_flight=(
+                    concurrency_limiter.ceiling
+                    if concurrency_limiter is not None
+                    else MAX_IN_FLIGHT_REQUESTS
+                ),
+                classification_mode=options.classification_mode,
+                snippet_width=options.snippet_width,
+                max_pages_in_flight=options.max_pages_in_flight,
+                on_claim_done=lambda idx, violations, summary: finish_claim(
+                    remaining_claim_idxs[idx], violations, summary
+                ),
+            )
+        else:
+            for claim_idx in remaining_claim_idxs:
+                claim_path = claim_paths[claim_idx]
+                extended_coverages = extended_coverage_dict.get(claim_path, [])
+                violations, summary = process_single_claim(
+                    claim_path,
+                    extended_coverages,
+                    streaming=options.streaming,
+                    classification_mode=options.classification_mode,
+                    snippet_width=options.snippet_width,
+                    threads=options.threads,
+                    max_pages_in_flight=options.max_pages_in_flight,
+                )
+                finish_claim(claim_idx, violations, summary)
+                logging.info("---------------------------------------------\n")
+        finished = True
+    finally:
+        result_writer.close()
+        # An interrupted run keeps its journal to be resumed
+        journal.close(remove=finished and not options.keep_journal)
+        configure_run_journal(None)
+        configure_response_cache(None)
+
+    if metrics_recorder is not None:
+        metrics_recorder.write(
+            output_base + "_metrics.json",
+            run_id=run_id,
+            claims=len(claim_paths),
+            classification_mode=options.classification_mode.value,
+            snippet_width=options.snippet_width,
+            streaming=options.streaming,
+            concurrent_claims=options.concurrent_claims,
+            max_pages_in_flight=options.max_pages_in_flight,
+            concurrency=(
+                concurrency_limiter.summary()
+                if concurrency_limiter is not None
+                else {"mode": "fixed", "threads": options.threads}
+            ),
+        )
+
+    request_scheduler.log_stats()
+    if concurrency_limiter is not None:
+        concurrency_limiter.log_stats()
+    PROCESSOR_REGISTRY.log_stats()
+    if http_client_pool is not None:
+        http_client_pool.log_stats()
+    if page_deduplicator is not None:
+        page_deduplicator.log_stats()
+    if page_triage is not None:
+        page_triage.log_stats()
+    if response_cache is not None:
+        response_cache.log_stats()
+    if text_store is not None:
+        text_store.log_stats()
+    if metrics_recorder is not None:
+        metrics_recorder.log_stats()
     logging.info("Done.")
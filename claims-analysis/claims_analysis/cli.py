@@ -0,0 +1,475 @@
+import argparse
+import json
+import logging
+import os
+from time import perf_counter
+from typing import TYPE_CHECKING, Optional
+
+from claims_analysis.constants import (
+    CONCURRENCY_CEILING,
+    CONCURRENCY_FLOOR,
+    EXTRACTION_WORKERS,
+    MAX_PAGES_IN_FLIGHT,
+    THREADS,
+    ClassificationMode,
+    ExtendedCoverage,
+    OutputFormat,
+)
+from claims_analysis.prompts import parse_extended_coverage
+
+if TYPE_CHECKING:
+    from claims_analysis.corpus_index import CorpusIndex
+
+
+def _list_pdfs(claims_dir: str) -> list[str]:
+    """Returns the paths of all .pdf files in claims_dir."""
+    return [
+        os.path.join(claims_dir, file)
+        for file in sorted(os.listdir(claims_dir))
+        if file.endswith(".pdf")
+    ]
+
+
+def _resolve_claim_paths(paths: list[str]) -> list[str]:
+    """Expands folders in paths into the claim PDFs they contain."""
+
+    claim_paths = []
+    for path in paths:
+        claim_paths.extend(_list_pdfs(path) if os.path.isdir(path) else [path])
+    return claim_paths
+
+
+def _load_extended_coverages(path: Optional[str]) -> dict[str, list[ExtendedCoverage]]:
+    """Reads a JSON object mapping claim paths to the extended coverages bought for them."""
+
+    if path is None:
+        return {}
+    with open(path) as file:
+        mapping = json.load(file)
+    return {
+        claim_path: [parse_extended_coverage(coverage) for coverage in coverages]
+        for claim_path, coverages in mapping.items()
+    }
+
+
+def _run(args: argparse.Namespace) -> None:
+    """Processes the claims, or only estimates the model calls with --dry-run."""
+
+    claim_paths = _resolve_claim_paths(args.claims)
+    extended_coverage_dict = _load_extended_coverages(args.extended_coverages)
+    classification_mode = ClassificationMode(args.classification_mode)
+
+    if args.dry_run:
+        from claims_analysis.dry_run import dry_run
+
+        dry_run(
+            claim_paths,
+            extended_coverage_dict,
+            classification_mode=classification_mode,
+            snippet_width=args.snippet_width,
+        )
+        return
+
+    from claims_analysis.claims_processing import RunOptions, process_claims
+
+    process_claims(
+        is_cloud_run=False,
+        config_data_parameters={},
+        run_id=args.run_id,
+        claim_paths=claim_paths,
+        extended_coverage_dict=extended_coverage_dict,
+        options=RunOptions(
+            concurrent_claims=args.concurrent_claims,
+            classification_mode=classification_mode,
+            snippet_width=args.snippet_width,
+            resume=args.resume,
+            keep_journal=args.keep_journal,
+            output_format=OutputFormat(args.output_format),
+            threads=args.threads,
+            use_cache=not args.no_cache,
+            use_text_store=not args.no_text_store,
+            deduplicate_pages=args.deduplicate_pages,
+            include_page_text=args.include_page_text,
+            triage=args.triage or args.triage_thresholds is not None,
+            triage_thresholds_path=args.triage_thresholds,
+            max_pages_in_flight=args.max_pages_in_flight,
+            adaptive_concurrency=args.adaptive_concurrency,
+            concurrency_floor=args.concurrency_floor,
+            concurrency_ceiling=args.concurrency_ceiling,
+        ),
+    )
+
+
+def _calibrate_triage(args: argparse.Namespace) -> None:
+    """Fits triage thresholds to past runs and reports what they would have skipped."""
+
+    from claims_analysis.triage import (
+        calibrate_thresholds,
+        collect_samples,
+        evaluate_thresholds,
+        load_thresholds,
+        save_thresholds,
+    )
+
+    samples = collect_samples(args.journals)
+    current = load_thresholds(args.thresholds) if args.thresholds else {}
+    calibrated = {**current, **calibrate_thresholds(samples, args.target_recall)}
+
+    for label, thresholds in [("current", current), ("calibrated", calibrated)]:
+        evaluation = evaluate_thresholds(samples, thresholds)
+        logging.info(
+            f"{label} thresholds {thresholds}: {evaluation.skipped} of "
+            f"{evaluation.calls} calls skipped, {evaluation.missed} of "
+            f"{evaluation.flagged} flagged calls missed, recall {evaluation.recall:.3f}, "
+            f"skip precision {evaluation.skip_precision:.3f}"
+        )
+    if args.output:
+        save_thresholds(args.output, calibrated)
+        logging.info(f"Wrote calibrated triage thresholds to {args.output}")
+
+
+def _warm_text_store(args: argparse.Namespace) -> None:
+    """Extracts every PDF in the claims folder into the page text store."""
+
+    from claims_analysis.text_store import PageTextStore
+
+    pdf_paths = _list_pdfs(args.claims_dir)
+    store = PageTextStore(args.store_dir)
+    added = store.warm(pdf_paths, workers=args.workers)
+    logging.info(
+        f"Added {added} of {len(pdf_paths)} claims from {args.claims_dir} to {args.store_dir}"
+    )
+
+
+def _open_corpus_index(args: argparse.Namespace) -> "CorpusIndex":
+    from claims_analysis.corpus_index import CorpusIndex
+    from claims_analysis.text_store import PageTextStore
+
+    return CorpusIndex(args.index, PageTextStore(args.store_dir))
+
+
+def _index_corpus(args: argparse.Namespace) -> None:
+    """Adds the claim PDFs that aren't indexed yet to the corpus index."""
+
+    index = _open_corpus_index(args)
+    claim_paths = _resolve_claim_paths(args.claims)
+    added = index.update(claim_paths, workers=args.workers)
+    files, documents, pages = index.stats()
+    logging.info(
+        f"Added {added} of {len(claim_paths)} claims to {args.index}, which now holds "
+        f"{files} files ({documents} distinct) with {pages} pages"
+    )
+    index.close()
+
+
+def _search_corpus(args: argparse.Namespace) -> None:
+    """Lists the pages of every indexed claim matching any of the keywords."""
+
+    index = _open_corpus_index(args)
+    started_at = perf_counter()
+    results = index.search(args.keywords)
+    elapsed = perf_counter() - started_at
+    for path, page_nos in results.items():
+        logging.info(f"{path}: {len(page_nos)} pages {page_nos}")
+    files, _, pages = index.stats()
+    logging.info(
+        f"{sum(len(page_nos) for page_nos in results.values())} pages in {len(results)} "
+        f"of {files} claims ({pages} pages) match {args.keywords}, searched in "
+        f"{elapsed:.2f}s"
+    )
+    index.close()
+
+
+def _estimate_rule_change(args: argparse.Namespace) -> None:
+    """Estimates the model calls a proposed rule change adds or removes over the corpus."""
+
+    from claims_analysis.corpus_index import (
+        RuleSet,
+        estimate_rule_change,
+        log_rule_change,
+    )
+
+    with open(args.rule_change) as file:
+        proposed = RuleSet.current().with_changes(json.load(file))
+    index = _open_corpus_index(args)
+    started_at = perf_counter()
+    estimate = estimate_rule_change(
+        index,
+        proposed,
+        extended_coverage_dict=_load_extended_coverages(args.extended_coverages),
+        classification_mode=ClassificationMode(args.classification_mode),
+    )
+    log_rule_change(estimate)
+    logging.info(f"Estimated in {perf_counter() - started_at:.2f}s")
+    index.close()
+
+
+def _diff_runs(args: argparse.Namespace) -> None:
+    """Compares the flagged pages of two runs' violation files."""
+
+    from claims_analysis.run_diff import diff_violations, log_diff_summary
+
+    diff = diff_violations(args.base, args.other)
+    log_diff_summary(diff)
+    if args.output:
+        diff.to_csv(args.output, index=False)
+        logging.info(f"Wrote page level diff to {args.output}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="claims-analysis", description="Claims Processing with LLMs"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # Options of the components a run is built from
+    component_options = argparse.ArgumentParser(add_help=False)
+    component_options.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="call the model for every page instead of reusing cached responses",
+    )
+    component_options.add_argument(
+        "--no-text-store",
+        action="store_true",
+        help="parse every PDF instead of reusing page text stored by content hash",
+    )
+    component_options.add_argument(
+        "--deduplicate-pages",
+        action="store_true",
+        help="reuse the verdict of the first copy of exact and near-duplicate pages",
+    )
+    component_options.add_argument(
+        "--include-page-text",
+        action="store_true",
+        help="add the text of the flagged page to each violation row",
+    )
+
+    run_parser = subparsers.add_parser(
+        "run",
+        help="find and summarize the violations of a batch of claims",
+        parents=[component_options],
+    )
+    run_parser.add_argument(
+        "claims", nargs="+", help="claim PDFs, or folders whose PDFs are all processed"
+    )
+    run_parser.add_argument(
+        "--run-id",
+        default="cli_run",
+        help="names the log, output, journal and metrics files (default: %(default)s)",
+    )
+    run_parser.add_argument(
+        "--extended-coverages",
+        metavar="JSON_FILE",
+        help='JSON object mapping claim paths to bought coverages, e.g. {"claims/a.pdf": '
+        '["CoverageH"]}',
+    )
+    run_parser.add_argument(
+        "--threads",
+        type=int,
+        default=THREADS,
+        help="concurrent model calls per claim (default: %(default)s)",
+    )
+    run_parser.add_argument(
+        "--adaptive-concurrency",
+        action="store_true",
+        help="adjust the model calls in flight from observed latency, errors and 429s "
+        "instead of keeping --threads fixed",
+    )
+    run_parser.add_argument(
+        "--concurrency-floor",
+        type=int,
+        default=CONCURRENCY_FLOOR,
+        help="lowest adaptive limit of model calls in flight (default: %(default)s)",
+    )
+    run_parser.add_argument(
+        "--concurrency-ceiling",
+        type=int,
+        default=CONCURRENCY_CEILING,
+        help="highest adaptive limit of model calls in flight (default: %(default)s)",
+    )
+    run_parser.add_argument(
+        "--classification-mode",
+        choices=[mode.value for mode in ClassificationMode],
+        default=ClassificationMode.Split.value,
+        help="one call per prompt family or one combined call per page "
+        "(default: %(default)s)",
+    )
+    run_parser.add_argument(
+        "--snippet-width",
+        type=int,
+        help="send windows of this many characters around keyword hits, not whole pages",
+    )
+    run_parser.add_argument(
+        "--concurrent-claims",
+        action="store_true",
+        help="process the claims concurrently instead of one by one",
+    )
+    run_parser.add_argument(
+        "--output-format",
+        choices=[output_format.value for output_format in OutputFormat],
+        default=OutputFormat.Csv.value,
+        help="file format of the violations and summaries (default: %(default)s)",
+    )
+    run_parser.add_argument(
+        "--resume", action="store_true", help="continue an interrupted run of --run-id"
+    )
+    run_parser.add_argument(
+        "--keep-journal",
+        action="store_true",
+        help="keep the run's journal once it finishes, e.g. for calibrate-triage",
+    )
+    run_parser.add_argument(
+        "--max-pages-in-flight",
+        type=int,
+        nargs="?",
+        const=MAX_PAGES_IN_FLIGHT,
+        help="memory-bounded mode for very large claims: extract in page windows and keep "
+        f"at most this many page classifications pending per claim ({MAX_PAGES_IN_FLIGHT} "
+        "if no value is given)",
+    )
+    run_parser.add_argument(
+        "--triage",
+        action="store_true",
+        help="score prefiltered pages locally and skip calls that look clearly negative",
+    )
+    run_parser.add_argument(
+        "--triage-thresholds",
+        metavar="JSON_FILE",
+        help="per violation type triage thresholds from calibrate-triage; implies --triage",
+    )
+    run_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only report prefilter hits and the estimated model calls and tokens",
+    )
+    run_parser.set_defaults(func=_run)
+
+    warm_parser = subparsers.add_parser(
+        "warm-text-store",
+        help="extract the page text of every claim PDF in a folder ahead of a run",
+    )
+    warm_parser.add_argument("claims_dir", help="folder with the claim PDFs")
+    warm_parser.add_argument(
+        "--store-dir",
+        default=os.path.join("cache", "page_text"),
+        help="page text store folder (default: %(default)s)",
+    )
+    warm_parser.add_argument(
+        "--workers",
+        type=int,
+        default=EXTRACTION_WORKERS,
+        help="processes used to extract large PDFs (default: %(default)s)",
+    )
+    warm_parser.set_defaults(func=_warm_text_store)
+
+    index_options = argparse.ArgumentParser(add_help=False)
+    index_options.add_argument(
+        "--index",
+        default=os.path.join("cache", "corpus_index.sqlite"),
+        help="corpus index database (default: %(default)s)",
+    )
+    index_options.add_argument(
+        "--store-dir",
+        default=os.path.join("cache", "page_text"),
+        help="page text store the index reads page text from (default: %(default)s)",
+    )
+
+    index_parser = subparsers.add_parser(
+        "index-corpus",
+        parents=[index_options],
+        help="add claim PDFs to the corpus index used by search-corpus and rule-impact",
+    )
+    index_parser.add_argument(
+        "claims", nargs="+", help="claim PDFs, or folders whose PDFs are all indexed"
+    )
+    index_parser.add_argument(
+        "--workers",
+        type=int,
+        default=EXTRACTION_WORKERS,
+        help="processes used to extract large PDFs (default: %(default)s)",
+    )
+    index_parser.set_defaults(func=_index_corpus)
+
+    search_parser = subparsers.add_parser(
+        "search-corpus",
+        parents=[index_options],
+        help="list the indexed pages matching any of a set of keywords or regexes",
+    )
+    search_parser.add_argument(
+        "keywords", nargs="+", help="keyword patterns, as in a violation type"
+    )
+    search_parser.set_defaults(func=_search_corpus)
+
+    rule_parser = subparsers.add_parser(
+        "rule-impact",
+        parents=[index_options],
+        help="estimate the model calls a violation type change adds or removes",
+    )
+    rule_parser.add_argument(
+        "rule_change",
+        help="JSON file of changed, added and removed violation types, see "
+        "corpus_index.RuleSet.with_changes",
+    )
+    rule_parser.add_argument(
+        "--extended-coverages",
+        metavar="JSON_FILE",
+        help="JSON object mapping claim paths to bought coverages",
+    )
+    rule_parser.add_argument(
+        "--classification-mode",
+        choices=[mode.value for mode in ClassificationMode],
+        default=ClassificationMode.Split.value,
+        help="count one call per prompt family or one per page (default: %(default)s)",
+    )
+    rule_parser.set_defaults(func=_estimate_rule_change)
+
+    diff_parser = subparsers.add_parser(
+        "diff-runs",
+        help="compare the flagged pages of two runs, e.g. full-page vs snippet mode",
+    )
+    diff_parser.add_argument(
+        "base", help="violations file (.csv or .parquet) of the reference run"
+    )
+    diff_parser.add_argument("other", help="violations file of the run to compare")
+    diff_parser.add_argument("--output", help="optional csv to write the page diff to")
+    diff_parser.set_defaults(func=_diff_runs)
+
+    triage_parser = subparsers.add_parser(
+        "calibrate-triage",
+        help="fit the triage thresholds to the model verdicts of past runs without triage",
+    )
+    triage_parser.add_argument(
+        "journals",
+        nargs="+",
+        help="<run_id>_journal.jsonl files of past runs made with --keep-journal",
+    )
+    triage_parser.add_argument(
+        "--target-recall",
+        type=float,
+        default=1.0,
+        help="fraction of the model's flags every type must keep (default: %(default)s)",
+    )
+    triage_parser.add_argument(
+        "--thresholds",
+        metavar="JSON_FILE",
+        help="thresholds to compare against and to keep for types without flags",
+    )
+    triage_parser.add_argument("--output", help="JSON file to write the thresholds to")
+    triage_parser.set_defaults(func=_calibrate_triage)
+
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,86 @@ from typing import Optional
 # Number of threads for processing pages within a single claim
 THREADS = 8
 
+# Limits for processing many claims concurrently: model calls in flight across all claims, and
+# number of claims being extracted or classified at the same time
+MAX_IN_FLIGHT_REQUESTS = 32
+MAX_CLAIMS_IN_FLIGHT = 8
+
+# Adaptive concurrency: the limit of model calls in flight moves between CONCURRENCY_FLOOR and
+# CONCURRENCY_CEILING. It is re-evaluated after every `limit` completed calls: one more slot when
+# the window was healthy, CONCURRENCY_BACKOFF_RATIO times fewer on a 429, on more than
+# CONCURRENCY_MAX_ERROR_RATE failed calls, or on a mean latency above CONCURRENCY_LATENCY_TOLERANCE
+# times the lowest latency seen
+CONCURRENCY_FLOOR = 2
+CONCURRENCY_CEILING = 4 * THREADS
+CONCURRENCY_BACKOFF_RATIO = 0.5
+CONCURRENCY_MAX_ERROR_RATE = 0.05
+CONCURRENCY_LATENCY_TOLERANCE = 2.0
+
+# Keep-alive connections to the OpenAI API kept open by the shared HTTP client
+HTTP_POOL_MAXSIZE = max(THREADS, MAX_IN_FLIGHT_REQUESTS, CONCURRENCY_CEILING)
+
+# Number of processes for extracting page text from large claim PDFs
+EXTRACTION_WORKERS = 4
+
+# Claims with at least this many pages have their text extracted by EXTRACTION_WORKERS processes
+PARALLEL_EXTRACTION_MIN_PAGES = 40
+
+# Memory-bounded mode for very large claims: (page, prompt) classifications submitted but not
+# yet completed per claim, and pages extracted per PDF reader window or extraction shard
+MAX_PAGES_IN_FLIGHT = 2 * THREADS
+EXTRACTION_WINDOW_PAGES = 50
+
+# OpenAI account limits that model requests are paced under, plus retries of failed requests with
+# jittered exponential backoff starting at RETRY_BASE_BACKOFF seconds and capped at RETRY_MAX_BACKOFF
+REQUESTS_PER_MINUTE = 3500
+TOKENS_PER_MINUTE = 90000
+REQUEST_MAX_RETRIES = 6
+RETRY_BASE_BACKOFF = 1.0
+RETRY_MAX_BACKOFF = 60.0
+
+# Completion tokens assumed per request when estimating token usage for rate limiting, and the
+# rough number of characters per token of English text that prompt tokens are estimated with
+COMPLETION_TOKENS_ESTIMATE = 100
+CHARS_PER_TOKEN = 4
+
+# Size limit of the on-disk cache of page classification responses; least recently used entries are evicted
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Cache hits whose access times are held in memory before they are written to the cache in one commit
+RESPONSE_CACHE_ACCESS_BATCH = 256
+
+# Snippet mode sends only windows of this many characters on each side of a keyword hit instead of
+# the whole page; windows are joined with SNIPPET_SEPARATOR
+SNIPPET_WIDTH = 300
+SNIPPET_SEPARATOR = "\n...\n"
+
+# Minimum number of rows per parquet row group; rows are buffered up to this many before being
+# written at the next claim boundary, which bounds the memory of the output stage
+PARQUET_ROW_GROUP_ROWS = 5000
+
+# Near-duplicate page detection: pages whose word shingles (SHINGLE_SIZE words) have an estimated
+# Jaccard similarity of at least NEAR_DUPLICATE_THRESHOLD reuse the first page's verdict. Similarity is
+# estimated from MINHASH_PERMUTATIONS MinHash values, indexed in MINHASH_BANDS LSH bands.
+NEAR_DUPLICATE_THRESHOLD = 0.9
+SHINGLE_SIZE = 5
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+
+# Local triage in front of the model: a currency amount or negation phrase counts as related
+# to a keyword hit within TRIAGE_PROXIMITY_CHARS characters, and a (page, violation type) whose
+# estimated probability of a violation is below the type's threshold is not sent to the model.
+TRIAGE_PROXIMITY_CHARS = 150
+TRIAGE_DEFAULT_THRESHOLD = 0.1
+TRIAGE_NEGATION_PHRASES = [
+    "not covered",
+    "no coverage",
+    "not included",
+    "excluded",
+    "denied",
+    "not claimed",
+]
+
 # Ignore all pages that have any of these keywords since they're usually extended coverage pages
 GLOBAL_EXCLUDED_KEYWORDS = ["coverage f", "coverage g", "coverage h", "coverage i"]
 
@@ -60,6 +140,24 @@ upper cabinets. Omit any monetary values.
 Remember your job is to detect ONLY those specific violations and nothing else.
 """
 
+# Single prompt covering all violation types, used when pages are classified in one call each
+COMBINED_TEMPLATE = """\
+You are an expert flood insurance adjuster. Pages of a claim will be fed to you one at a time and your job is \
+to detect ONLY the following possible policy violations, each given as 'label: description':
+{violation_descriptions}
+Ignore all other possible violations. Keep in mind that:
+    - Items are only violations when they are being claimed, so there's usually monetary value like RCV, ACV, \
+damages, or price associated with the item
+    - Just mentioning an item isn't enough, for example statements like "the policyholder did not purchase coverage \
+for pools" or "pool and patio damages are not covered" are not violations and should not be flagged
+    - Lower cabinets and lower cabinetry by themselves are not a policy violation
+After each page of the claim is fed to you, respond with either:
+    - 'NONE', if none of the above violations are detected, which is common
+    - one line for each violation from the above list that is detected, in the form \
+'{yes_delimiter} label: summary', where label is the label of the violation exactly as given above and summary \
+is a short summary (1-3 sentences) of the page and how it mentions the violation. Omit any monetary values.
+"""
+
 # Prompt for summarization
 SUMMARIZATION_PROMPT = """\
 You are an expert flood insurance adjuster responsible for summarizing some of the possible reasons for why a claim may be \
@@ -79,6 +177,19 @@ class ExtendedCoverage(Enum):
     CoverageI = "Temporary Living Expenses"
 
 
+# File format of the violations and summary outputs of a run
+class OutputFormat(Enum):
+    Csv = "csv"
+    Parquet = "parquet"
+
+
+# How pages are sent to the LLM: once per prompt family (excluded items, RCV property, pair clause)
+# or once per page with all matched violation types merged into a single prompt
+class ClassificationMode(Enum):
+    Split = "split"
+    Combined = "combined"
+
+
 # Prompt descriptions and keywords for violation types
 @dataclass
 class ViolationType:
@@ -126,3 +237,21 @@ PAIR_CLAUSE_VIOLATION_TYPES = [
         extended_coverage=None,
     ),
 ]
+
+# All violation types known to the prefilter engine
+ALL_VIOLATION_TYPES = (
+    EXCLUDED_ITEMS_VIOLATION_TYPES
+    + RCV_PROPERTY_VIOLATION_TYPES
+    + PAIR_CLAUSE_VIOLATION_TYPES
+)
+
+# Prompt families of split classification mode, each sent to the LLM as its own request:
+# excluded items (pool, patio), RCV with non-covered properties and the pair and set clause
+PROMPT_FAMILIES = [
+    (EXCLUDED_ITEMS_TEMPLATE, EXCLUDED_ITEMS_VIOLATION_TYPES),
+    (RCV_PROPERTY_TEMPLATE, RCV_PROPERTY_VIOLATION_TYPES),
+    (PAIR_CLAUSE_TEMPLATE, PAIR_CLAUSE_VIOLATION_TYPES),
+]
+
+# Names of the PROMPT_FAMILIES, in the same order, used to refer to them in rule change files
+PROMPT_FAMILY_NAMES = ["excluded_items", "rcv_property", "pair_clause"]
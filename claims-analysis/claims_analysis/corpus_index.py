@@ -0,0 +1,519 @@
+import logging
+import os
+import re
+import sqlite3
+from array import array
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field, replace
+from time import perf_counter
+from typing import Any, Iterable, Optional
+
+from claims_analysis.constants import (
+    GLOBAL_EXCLUDED_KEYWORDS,
+    PROMPT_FAMILIES,
+    PROMPT_FAMILY_NAMES,
+    ClassificationMode,
+    ExtendedCoverage,
+    ViolationType,
+)
+from claims_analysis.prefilter import (
+    PageMatch,
+    PrefilterEngine,
+    fold_page_text,
+    required_literals,
+)
+from claims_analysis.prompts import filter_violation_types, parse_extended_coverage
+from claims_analysis.text_store import PageTextStore, StoredClaimText, hash_file
+from claims_analysis.utils import iter_pdf_pages
+
+# Index terms are the folded runs of word characters of a page
+_TERM_PATTERN = re.compile(r"\w+")
+# Page numbers of a posting are stored as a blob of unsigned ints
+_PAGES_TYPECODE = "I"
+# Terms looked up per query when resolving the ids of a document's terms
+_TERM_BATCH_SIZE = 500
+
+
+@dataclass
+class RuleSet:
+    """The violation types a run looks for, grouped into prompt families, and the global
+    excluded keywords.
+
+    Attributes:
+        families: violation types of each prompt family, keyed by the names in PROMPT_FAMILY_NAMES
+        excluded_keywords: keywords that rule out a page entirely
+    """
+
+    families: dict[str, list[ViolationType]]
+    excluded_keywords: list[str] = field(
+        default_factory=lambda: list(GLOBAL_EXCLUDED_KEYWORDS)
+    )
+
+    @classmethod
+    def current(cls) -> "RuleSet":
+        """The rules in constants, i.e. what a run does today."""
+
+        return cls(
+            families={
+                name: list(violation_types)
+                for name, (_, violation_types) in zip(
+                    PROMPT_FAMILY_NAMES, PROMPT_FAMILIES
+                )
+            }
+        )
+
+    @property
+    def violation_types(self) -> list[ViolationType]:
+        return [vt for types in self.families.values() for vt in types]
+
+    def with_changes(self, changes: dict[str, Any]) -> "RuleSet":
+        """Returns a copy of the rules with a proposed change applied.
+
+        changes holds violation_types to add or change (a new type needs "family" and
+        "keywords"), removed_types, and excluded_keywords replacing the global ones.
+        """
+
+        families = {name: list(types) for name, types in self.families.items()}
+        removed = set(changes.get("removed_types", []))
+
+        for spec in changes.get("violation_types", []):
+            existing_family, existing = next(
+                (
+                    (family, vt)
+                    for family, types in families.items()
+                    for vt in types
+                    if vt.name == spec["name"]
+                ),
+                (None, None),
+            )
+            fields = {
+                key: spec[key] for key in ["prompt_desc", "keywords"] if key in spec
+            }
+            if "extended_coverage" in spec:
+                fields["extended_coverage"] = (
+                    parse_extended_coverage(spec["extended_coverage"])
+                    if spec["extended_coverage"]
+                    else None
+                )
+
+            family = spec.get("family", existing_family)
+            if family not in families:
+                raise ValueError(
+                    f"Unknown prompt family {family} for {spec['name']}, expected one "
+                    f"of {PROMPT_FAMILY_NAMES}"
+                )
+            if existing is not None:
+                updated = replace(existing, **fields)
+                if family == existing_family:
+                    types = families[family]
+                    types[types.index(existing)] = updated
+                    continue
+                families[existing_family].remove(existing)
+            else:
+                updated = ViolationType(
+                    name=spec["name"],
+                    prompt_desc=fields.get("prompt_desc", spec["name"]),
+                    keywords=fields["keywords"],
+                    extended_coverage=fields.get("extended_coverage"),
+                )
+            families[family].append(updated)
+
+        return RuleSet(
+            families={
+                name: [vt for vt in types if vt.name not in removed]
+                for name, types in families.items()
+            },
+            excluded_keywords=list(
+                changes.get("excluded_keywords", self.excluded_keywords)
+            ),
+        )
+
+    def count_calls(
+        self,
+        page_match: PageMatch,
+        extended_coverages: list[ExtendedCoverage],
+        classification_mode: ClassificationMode,
+    ) -> int:
+        """Number of classification calls a run would make for a page with these rules."""
+
+        type_names = [
+            {vt.name for vt in filter_violation_types(types, extended_coverages)}
+            for types in self.families.values()
+        ]
+        if classification_mode == ClassificationMode.Combined:
+            return int(page_match.matches_any(set().union(*type_names)))
+        return sum(page_match.matches_any(names) for names in type_names)
+
+
+class CorpusIndex:
+    """On-disk inverted index over the extracted page text of every claim seen so far.
+
+    Pages are looked up by the literals a keyword requires and confirmed with its compiled
+    pattern, so results are exactly what the prefilter would report.
+
+    Attributes:
+        path: path to the SQLite database file
+        text_store: store the page text is read from when confirming candidates
+    """
+
+    def __init__(self, path: str, text_store: PageTextStore):
+        self.path = path
+        self.text_store = text_store
+
+        if index_dir := os.path.dirname(path):
+            os.makedirs(index_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "doc_id INTEGER PRIMARY KEY, content_hash TEXT UNIQUE NOT NULL, "
+            "pages INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, doc_id INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS terms ("
+            "term_id INTEGER PRIMARY KEY, term TEXT UNIQUE NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term_id INTEGER NOT NULL, doc_id INTEGER NOT NULL, pages BLOB NOT NULL, "
+            "PRIMARY KEY (term_id, doc_id)) WITHOUT ROWID;"
+        )
+        self._conn.commit()
+
+    def update(self, pdf_paths: Iterable[str], workers: int = 1) -> int:
+        """Indexes the PDFs whose content isn't in the index yet; returns how many were added.
+
+        Files that no longer exist are dropped from the index's file list.
+
+        Args:
+            pdf_paths: paths to claim PDF files, e.g. every PDF in CLAIMS_DIR
+            workers: number of extraction processes for PDFs not in the text store yet
+        """
+
+        added = 0
+        for pdf_path in pdf_paths:
+            content_hash = hash_file(pdf_path)
+            row = self._conn.execute(
+                "SELECT doc_id FROM documents WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            if row is None:
+                started_at = perf_counter()
+                doc_id = self._add_document(
+                    content_hash, self.text_store.iter_pages(pdf_path, workers=workers)
+                )
+                added += 1
+                logging.info(
+                    f"Indexed {pdf_path} in {perf_counter() - started_at:.2f}s"
+                )
+            else:
+                doc_id = row[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, doc_id) VALUES (?, ?)",
+                (pdf_path, doc_id),
+            )
+            self._conn.commit()
+
+        for (path,) in self._conn.execute("SELECT path FROM files").fetchall():
+            if not os.path.exists(path):
+                self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        self._conn.commit()
+        return added
+
+    def _add_document(self, content_hash: str, pages: Iterable[str]) -> int:
+        term_pages: dict[str, array] = defaultdict(lambda: array(_PAGES_TYPECODE))
+        pages_total = 0
+        for page_no, page_text in enumerate(pages, 1):
+            for term in set(_TERM_PATTERN.findall(fold_page_text(page_text))):
+                term_pages[term].append(page_no)
+            pages_total = page_no
+
+        doc_id = self._conn.execute(
+            "INSERT INTO documents (content_hash, pages) VALUES (?, ?)",
+            (content_hash, pages_total),
+        ).lastrowid
+        terms = list(term_pages)
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO terms (term) VALUES (?)",
+            ((term,) for term in terms),
+        )
+        for start in range(0, len(terms), _TERM_BATCH_SIZE):
+            batch = terms[start : start + _TERM_BATCH_SIZE]
+            term_ids = self._conn.execute(
+                f"SELECT term_id, term FROM terms WHERE term IN "
+                f"({','.join('?' * len(batch))})",
+                batch,
+            ).fetchall()
+            self._conn.executemany(
+                "INSERT INTO postings (term_id, doc_id, pages) VALUES (?, ?, ?)",
+                (
+                    (term_id, doc_id, term_pages[term].tobytes())
+                    for term_id, term in term_ids
+                ),
+            )
+        self._conn.commit()
+        return doc_id
+
+    def files(self) -> list[tuple[str, int]]:
+        """The (path, document id) of every indexed file, in path order."""
+        return self._conn.execute(
+            "SELECT path, doc_id FROM files ORDER BY path"
+        ).fetchall()
+
+    def stats(self) -> tuple[int, int, int]:
+        """Number of indexed files, distinct documents and pages."""
+
+        files = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        documents, pages = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(pages), 0) FROM documents "
+            "WHERE doc_id IN (SELECT doc_id FROM files)"
+        ).fetchone()
+        return files, documents, pages
+
+    def _pages_with_piece(self, piece: str) -> dict[int, set[int]]:
+        """Pages of each document holding a term that contains piece."""
+
+        pages: dict[int, set[int]] = defaultdict(set)
+        for doc_id, blob in self._conn.execute(
+            "SELECT p.doc_id, p.pages FROM terms t "
+            "JOIN postings p ON p.term_id = t.term_id WHERE instr(t.term, ?) > 0",
+            (piece,),
+        ):
+            pages[doc_id].update(array(_PAGES_TYPECODE, blob))
+        return pages
+
+    def _all_pages(self) -> dict[int, set[int]]:
+        return {
+            doc_id: set(range(1, pages + 1))
+            for doc_id, pages in self._conn.execute(
+                "SELECT doc_id, pages FROM documents "
+                "WHERE doc_id IN (SELECT doc_id FROM files)"
+            )
+        }
+
+    def candidate_pages(self, keywords: Iterable[str]) -> dict[int, set[int]]:
+        """Pages of each document that may match any of the keyword patterns.
+
+        Every page matching one of the keywords is included; pages that contain the
+        keyword's literals without matching the pattern itself are removed later, when
+        candidates are confirmed against the page text.
+        """
+
+        piece_pages: dict[str, dict[int, set[int]]] = {}
+        candidates: dict[int, set[int]] = defaultdict(set)
+        for keyword in keywords:
+            literals = required_literals(keyword)
+            if not literals:
+                return self._all_pages()
+
+            # Runs may cross word boundaries, e.g. "coverage f", so each word of a run
+            # has to be in some term of the page
+            keyword_pages: Optional[dict[int, set[int]]] = None
+            for piece in {piece for literal in literals for piece in literal.split()}:
+                if piece not in piece_pages:
+                    piece_pages[piece] = self._pages_with_piece(piece)
+                pages = piece_pages[piece]
+                keyword_pages = (
+                    dict(pages)
+                    if keyword_pages is None
+                    else {
+                        doc_id: doc_pages & pages[doc_id]
+                        for doc_id, doc_pages in keyword_pages.items()
+                        if doc_id in pages
+                    }
+                )
+            for doc_id, doc_pages in (keyword_pages or {}).items():
+                candidates[doc_id] |= doc_pages
+        return candidates
+
+    def _open_text(self, doc_id: int) -> StoredClaimText:
+        """Opens a document's page text, extracting it again if it left the text store."""
+
+        (content_hash,) = self._conn.execute(
+            "SELECT content_hash FROM documents WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        if (stored := self.text_store.get_by_hash(content_hash)) is None:
+            (path,) = self._conn.execute(
+                "SELECT path FROM files WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+            self.text_store.put(path, iter_pdf_pages(path))
+            stored = self.text_store.get_by_hash(content_hash)
+        return stored
+
+    def scan(self, rules: RuleSet) -> dict[int, dict[int, PageMatch]]:
+        """Runs the rules' prefilter over the corpus.
+
+        Returns:
+            for each document, the page matches of the pages where at least one violation
+            type was found, keyed by page number
+        """
+
+        engine = PrefilterEngine(rules.violation_types, rules.excluded_keywords)
+        candidates = self.candidate_pages(
+            keyword for vt in rules.violation_types for keyword in vt.keywords
+        )
+
+        indexed_doc_ids = {doc_id for _, doc_id in self.files()}
+        matches: dict[int, dict[int, PageMatch]] = {}
+        for doc_id, page_nos in candidates.items():
+            # Documents of deleted files stay in the postings but aren't reported
+            if not page_nos or doc_id not in indexed_doc_ids:
+                continue
+            stored = self._open_text(doc_id)
+            try:
+                doc_matches = {
+                    page_no: page_match
+                    for page_no in sorted(page_nos)
+                    if (
+                        page_match := engine.scan_page(stored.page(page_no), page_no)
+                    ).matched_types
+                }
+            finally:
+                stored.close()
+            if doc_matches:
+                matches[doc_id] = doc_matches
+        return matches
+
+    def search(self, keywords: list[str]) -> dict[str, list[int]]:
+        """Returns the pages of each indexed claim matching any of the keyword patterns.
+
+        Keywords are matched exactly like violation type keywords, standalone and ignoring
+        case, and the global excluded keywords are not applied.
+        """
+
+        rules = RuleSet(
+            families={
+                "query": [
+                    ViolationType(
+                        name="query",
+                        prompt_desc="",
+                        keywords=keywords,
+                        extended_coverage=None,
+                    )
+                ]
+            },
+            excluded_keywords=[],
+        )
+        matches = self.scan(rules)
+        return {
+            path: sorted(matches[doc_id])
+            for path, doc_id in self.files()
+            if doc_id in matches
+        }
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+@dataclass
+class RuleChangeEstimate:
+    """Difference in prefilter hits and model calls between two rule sets over the corpus.
+
+    Attributes:
+        claims: number of indexed claims
+        pages: number of pages in those claims
+        calls_before: classification calls a run over the corpus makes with the current rules
+        calls_after: classification calls with the proposed rules
+        pages_added: pages only the proposed rules send to the model
+        pages_removed: pages only the current rules send to the model
+        hits_before: pages matching each violation type with the current rules
+        hits_after: pages matching each violation type with the proposed rules
+        claim_call_deltas: change in calls of every claim whose calls change
+    """
+
+    claims: int = 0
+    pages: int = 0
+    calls_before: int = 0
+    calls_after: int = 0
+    pages_added: int = 0
+    pages_removed: int = 0
+    hits_before: Counter = field(default_factory=Counter)
+    hits_after: Counter = field(default_factory=Counter)
+    claim_call_deltas: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def calls_delta(self) -> int:
+        return self.calls_after - self.calls_before
+
+
+def estimate_rule_change(
+    index: CorpusIndex,
+    proposed: RuleSet,
+    current: Optional[RuleSet] = None,
+    extended_coverage_dict: dict[str, list[ExtendedCoverage]] = {},
+    classification_mode: ClassificationMode = ClassificationMode.Split,
+) -> RuleChangeEstimate:
+    """Estimates how many model calls a rule change adds or removes over the indexed corpus.
+
+    Calls are counted like a dry run counts them, i.e. one per (page, prompt) the prefilter
+    routes a page to, so cache hits, duplicate pages and triage aren't accounted for.
+
+    Args:
+        index: the corpus to estimate over
+        proposed: the rules after the change, e.g. RuleSet.current().with_changes(...)
+        current: the rules before the change, RuleSet.current() if not given
+        extended_coverage_dict: mapping from claim path to extended coverages that were
+            purchased, applied to both rule sets
+        classification_mode: whether pages are sent once per prompt family or once overall
+    """
+
+    current = current or RuleSet.current()
+    before = index.scan(current)
+    after = index.scan(proposed)
+
+    estimate = RuleChangeEstimate()
+    estimate.claims, _, estimate.pages = index.stats()
+    for path, doc_id in index.files():
+        coverages = extended_coverage_dict.get(path, [])
+        doc_before = before.get(doc_id, {})
+        doc_after = after.get(doc_id, {})
+        claim_before = claim_after = 0
+        for page_no in doc_before.keys() | doc_after.keys():
+            page_calls = [
+                (
+                    rules.count_calls(
+                        page_matches[page_no], coverages, classification_mode
+                    )
+                    if page_no in page_matches
+                    else 0
+                )
+                for rules, page_matches in [
+                    (current, doc_before),
+                    (proposed, doc_after),
+                ]
+            ]
+            claim_before += page_calls[0]
+            claim_after += page_calls[1]
+            estimate.pages_added += page_calls[0] == 0 and page_calls[1] > 0
+            estimate.pages_removed += page_calls[0] > 0 and page_calls[1] == 0
+
+        estimate.hits_before.update(
+            name
+            for page_match in doc_before.values()
+            for name in page_match.matched_types
+        )
+        estimate.hits_after.update(
+            name
+            for page_match in doc_after.values()
+            for name in page_match.matched_types
+        )
+        estimate.calls_before += claim_before
+        estimate.calls_after += claim_after
+        if claim_after != claim_before:
+            estimate.claim_call_deltas[path] = claim_after - claim_before
+    return estimate
+
+
+def log_rule_change(estimate: RuleChangeEstimate) -> None:
+    """Logs the call delta of a rule change in total, per violation type and per claim."""
+
+    logging.info(
+        f"Rule change over {estimate.claims} claims ({estimate.pages} pages): "
+        f"{estimate.calls_before} -> {estimate.calls_after} classification calls "
+        f"({estimate.calls_delta:+d}), {estimate.pages_added} pages added, "
+        f"{estimate.pages_removed} pages removed"
+    )
+    for name in sorted(estimate.hits_before.keys() | estimate.hits_after.keys()):
+        before, after = estimate.hits_before[name], estimate.hits_after[name]
+        logging.info(f"Prefilter hits for {name}: {before} -> {after} pages")
+    for path, delta in sorted(
+        estimate.claim_call_deltas.items(), key=lambda item: -abs(item[1])
+    ):
+        logging.info(f"{path}: {delta:+d} calls")
@@ -0,0 +1,221 @@
+import hashlib
+import logging
+import threading
+import zlib
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+
+from claims_analysis.constants import (
+    MINHASH_BANDS,
+    MINHASH_PERMUTATIONS,
+    NEAR_DUPLICATE_THRESHOLD,
+    SHINGLE_SIZE,
+)
+
+# Mersenne prime modulus for the MinHash permutations; hashes and coefficients are below it so
+# that a * hash + b stays within uint64
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def normalize_page(page_text: str) -> str:
+    """Casefolds the page and collapses whitespace so layout-only differences don't matter."""
+    return " ".join(page_text.casefold().split())
+
+
+@dataclass
+class PageFingerprint:
+    """Exact and near-duplicate fingerprints of a page.
+
+    Attributes:
+        exact_hash: hash of the normalized page text
+        minhash: MinHash signature over the word shingles of the page
+    """
+
+    exact_hash: str
+    minhash: np.ndarray
+
+    def similarity(self, other: "PageFingerprint") -> float:
+        """Estimated Jaccard similarity of the two pages' shingle sets."""
+        return float(np.mean(self.minhash == other.minhash))
+
+
+class MinHasher:
+    """Computes MinHash signatures of word shingles with fixed random permutations."""
+
+    def __init__(
+        self,
+        num_permutations: int = MINHASH_PERMUTATIONS,
+        shingle_size: int = SHINGLE_SIZE,
+        seed: int = 0,
+    ):
+        rng = np.random.default_rng(seed)
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, _MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+
+    def fingerprint(self, page_text: str) -> PageFingerprint:
+        normalized = normalize_page(page_text)
+        words = normalized.split(" ")
+        shingles = {
+            " ".join(words[idx : idx + self.shingle_size])
+            for idx in range(max(len(words) - self.shingle_size + 1, 1))
+        }
+        hashes = np.fromiter(
+            (
+                zlib.crc32(shingle.encode("utf-8")) % _MERSENNE_PRIME
+                for shingle in shingles
+            ),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        # (permutations x shingles) matrix of permuted hashes, minimum per permutation
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME
+        return PageFingerprint(
+            exact_hash=hashlib.sha1(normalized.encode("utf-8")).hexdigest(),
+            minhash=permuted.min(axis=1),
+        )
+
+
+@dataclass
+class DedupStats:
+    unique: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+
+    @property
+    def calls_saved(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+
+class PageDeduplicator:
+    """Reuses the model response of the first copy of exact and near-duplicate pages.
+
+    Near-duplicates are found with MinHash LSH across the batch. Responses are only shared
+    within a namespace, i.e. the same prompt and model settings.
+
+    Attributes:
+        threshold: estimated Jaccard similarity at or above which two pages are near-duplicates
+        stats: counts of unique pages and reused responses
+    """
+
+    def __init__(
+        self,
+        threshold: float = NEAR_DUPLICATE_THRESHOLD,
+        num_bands: int = MINHASH_BANDS,
+        hasher: Optional[MinHasher] = None,
+    ):
+        self.threshold = threshold
+        self.stats = DedupStats()
+
+        self._hasher = hasher or MinHasher()
+        self._num_bands = num_bands
+        self._lock = threading.Lock()
+        # Responses of representative pages, by namespace and exact hash
+        self._responses: dict[tuple[str, str], Future[str]] = {}
+        self._fingerprints: dict[tuple[str, str], PageFingerprint] = {}
+        # LSH buckets: (namespace, band index, band values) -> representative exact hashes
+        self._buckets: dict[tuple[str, int, bytes], list[str]] = {}
+
+    def _bands(self, fingerprint: PageFingerprint) -> list[bytes]:
+        return [
+            band.tobytes()
+            for band in np.array_split(fingerprint.minhash, self._num_bands)
+        ]
+
+    def _find_representative(
+        self, namespace: str, fingerprint: PageFingerprint
+    ) -> Optional[str]:
+        """Returns the exact hash of an indexed near-duplicate of the page, if any."""
+
+        for band_idx, band in enumerate(self._bands(fingerprint)):
+            for candidate in self._buckets.get((namespace, band_idx, band), []):
+                candidate_fp = self._fingerprints[(namespace, candidate)]
+                if fingerprint.similarity(candidate_fp) >= self.threshold:
+                    return candidate
+        return None
+
+    def get_or_compute(
+        self, namespace: str, page_text: str, compute: Callable[[], str]
+    ) -> str:
+        """Returns the response for the page, reusing the response of a duplicate page.
+
+        Args:
+            namespace: identifies the prompt and model settings the response belongs to
+            page_text: the text sent to the model
+            compute: sends the request and returns the response content; only called for
+                pages that don't duplicate an earlier page
+        """
+
+        fingerprint = self._hasher.fingerprint(page_text)
+
+        is_first_copy = False
+        with self._lock:
+            representative = fingerprint.exact_hash
+            if (namespace, representative) in self._responses:
+                self.stats.exact_duplicates += 1
+                pending = self._responses[(namespace, representative)]
+            elif near_duplicate := self._find_representative(namespace, fingerprint):
+                self.stats.near_duplicates += 1
+                pending = self._responses[(namespace, near_duplicate)]
+            else:
+                # First copy of this page: register a pending response for duplicates to wait on
+                pending = Future()
+                key = (namespace, representative)
+                self._responses[key] = pending
+                self._fingerprints[key] = fingerprint
+                for band_idx, band in enumerate(self._bands(fingerprint)):
+                    self._buckets.setdefault((namespace, band_idx, band), []).append(
+                        representative
+                    )
+                self.stats.unique += 1
+                is_first_copy = True
+
+        if is_first_copy:
+            return self._compute_representative(pending, compute)
+
+        try:
+            return pending.result()
+        except Exception:
+            # The first copy's request failed; don't let that fail its duplicates too
+            return compute()
+
+    def _compute_representative(
+        self, pending: Future[str], compute: Callable[[], str]
+    ) -> str:
+        try:
+            response = compute()
+        except Exception as error:
+            pending.set_exception(error)
+            raise
+        pending.set_result(response)
+        return response
+
+    def log_stats(self) -> None:
+        """Logs how many model calls were saved by reusing duplicate pages' responses."""
+
+        stats = self.stats
+        logging.info(
+            f"Page deduplication: {stats.unique} unique requests, {stats.exact_duplicates} "
+            f"exact and {stats.near_duplicates} near duplicates reused, "
+            f"{stats.calls_saved} calls saved"
+        )
+
+
+_ACTIVE_DEDUPLICATOR: Optional[PageDeduplicator] = None
+
+
+def configure_page_deduplicator(enabled: bool) -> Optional[PageDeduplicator]:
+    """Starts a fresh batch-wide deduplication index, or disables deduplication."""
+
+    global _ACTIVE_DEDUPLICATOR
+
+    _ACTIVE_DEDUPLICATOR = PageDeduplicator() if enabled else None
+    return _ACTIVE_DEDUPLICATOR
+
+
+def get_page_deduplicator() -> Optional[PageDeduplicator]:
+    """Returns the active deduplicator, or None if deduplication is disabled."""
+    return _ACTIVE_DEDUPLICATOR
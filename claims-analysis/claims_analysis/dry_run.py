@@ -0,0 +1,183 @@
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from claims_analysis.constants import (
+    ALL_VIOLATION_TYPES,
+    CHARS_PER_TOKEN,
+    COMBINED_TEMPLATE,
+    COMPLETION_TOKENS_ESTIMATE,
+    PROMPT_FAMILIES,
+    ClassificationMode,
+    ExtendedCoverage,
+    ViolationType,
+)
+from claims_analysis.prefilter import get_prefilter_engine
+from claims_analysis.prompts import (
+    combined_description,
+    filter_violation_types,
+    render_system_prompt,
+)
+from claims_analysis.text_store import iter_claim_pages
+
+
+@dataclass
+class ClaimEstimate:
+    """Prefilter hits and estimated model usage of a single claim.
+
+    Attributes:
+        filepath: path to the claim PDF file
+        pages_total: number of pages in the claim
+        pages_matched: number of pages that would be sent to at least one prompt
+        prefilter_hits: number of pages matching each violation type's keywords
+        excluded_pages: number of pages ruled out by the global excluded keywords
+        calls: estimated classification calls, i.e. matching (page, prompt) pairs
+        prompt_tokens: estimated prompt tokens of those calls
+        completion_tokens: estimated completion tokens of those calls
+    """
+
+    filepath: str
+    pages_total: int = 0
+    pages_matched: int = 0
+    prefilter_hits: Counter = field(default_factory=Counter)
+    excluded_pages: int = 0
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+def _estimate_call_tokens(system_prompt: str, page_text: str) -> int:
+    return (len(system_prompt) + len(page_text)) // CHARS_PER_TOKEN
+
+
+def estimate_claim(
+    claim_path: str,
+    extended_coverages: list[ExtendedCoverage] = [],
+    classification_mode: ClassificationMode = ClassificationMode.Split,
+    snippet_width: Optional[int] = None,
+) -> ClaimEstimate:
+    """Runs the prefilter over a claim and estimates the model calls a run would make.
+
+    Cache hits and duplicate pages aren't accounted for, so the estimate is an upper bound.
+
+    Args:
+        claim_path: path to the claim PDF file
+        extended_coverages: list of extended coverages that the policyholder has bought
+        classification_mode: whether pages are sent once per prompt family or once overall
+        snippet_width: if set, only windows around the keyword hits are counted as sent
+    """
+
+    engine = get_prefilter_engine()
+    estimate = ClaimEstimate(filepath=claim_path)
+
+    if classification_mode == ClassificationMode.Combined:
+        combined_types = filter_violation_types(ALL_VIOLATION_TYPES, extended_coverages)
+        prompts: list[tuple[str, list[ViolationType]]] = (
+            [(COMBINED_TEMPLATE, combined_types)] if combined_types else []
+        )
+    else:
+        prompts = [
+            (template, filt_types)
+            for template, violation_types in PROMPT_FAMILIES
+            if (
+                filt_types := filter_violation_types(
+                    violation_types, extended_coverages
+                )
+            )
+        ]
+    split_prompts = {
+        template: render_system_prompt(
+            template, [vt.prompt_desc for vt in violation_types]
+        )
+        for template, violation_types in prompts
+    }
+
+    for page_no, page_text in enumerate(iter_claim_pages(claim_path), 1):
+        estimate.pages_total = page_no
+        page_match = engine.scan_page(page_text, page_no)
+        estimate.prefilter_hits.update(page_match.matched_types)
+        if page_match.is_excluded:
+            estimate.excluded_pages += 1
+
+        page_matched = False
+        for template, violation_types in prompts:
+            type_names = {vt.name for vt in violation_types}
+            if not page_match.matches_any(type_names):
+                continue
+            page_matched = True
+
+            if classification_mode == ClassificationMode.Combined:
+                type_names &= page_match.matched_types
+                system_prompt = render_system_prompt(
+                    template,
+                    [
+                        combined_description(vt)
+                        for vt in violation_types
+                        if vt.name in type_names
+                    ],
+                )
+            else:
+                system_prompt = split_prompts[template]
+
+            sent_text = (
+                page_text
+                if snippet_width is None
+                else engine.extract_snippets(page_text, type_names, snippet_width)
+            )
+            estimate.calls += 1
+            estimate.prompt_tokens += _estimate_call_tokens(system_prompt, sent_text)
+            estimate.completion_tokens += COMPLETION_TOKENS_ESTIMATE
+
+        estimate.pages_matched += page_matched
+
+    return estimate
+
+
+def dry_run(
+    claim_paths: Iterable[str],
+    extended_coverage_dict: dict[str, list[ExtendedCoverage]] = {},
+    classification_mode: ClassificationMode = ClassificationMode.Split,
+    snippet_width: Optional[int] = None,
+) -> list[ClaimEstimate]:
+    """Estimates every claim of a run and logs the per-claim and total estimates.
+
+    Args:
+        claim_paths: paths to the claim PDF files
+        extended_coverage_dict: the extended coverages bought for each claim path
+        classification_mode: whether pages are sent once per prompt family or once overall
+        snippet_width: if set, only windows around the keyword hits are counted as sent
+    """
+
+    estimates = []
+    for claim_path in claim_paths:
+        estimate = estimate_claim(
+            claim_path,
+            extended_coverage_dict.get(claim_path, []),
+            classification_mode,
+            snippet_width,
+        )
+        estimates.append(estimate)
+        logging.info(
+            f"{claim_path}: {estimate.pages_matched} of {estimate.pages_total} pages "
+            f"matched, {estimate.excluded_pages} excluded, {estimate.calls} calls, "
+            f"~{estimate.prompt_tokens + estimate.completion_tokens} tokens, hits "
+            f"{dict(sorted(estimate.prefilter_hits.items()))}"
+        )
+
+    total_hits: Counter = sum((e.prefilter_hits for e in estimates), Counter())
+    total_calls = sum(e.calls for e in estimates)
+    prompt_tokens = sum(e.prompt_tokens for e in estimates)
+    completion_tokens = sum(e.completion_tokens for e in estimates)
+    logging.info(
+        f"Dry run of {len(estimates)} claims ({classification_mode.value} mode): "
+        f"{sum(e.pages_matched for e in estimates)} of "
+        f"{sum(e.pages_total for e in estimates)} pages matched, {total_calls} "
+        f"classification calls, ~{prompt_tokens} prompt and ~{completion_tokens} "
+        f"completion tokens, plus up to "
+        f"{sum(e.calls > 0 for e in estimates)} summarization calls"
+    )
+    for name, hits in total_hits.most_common():
+        logging.info(f"Prefilter hits for {name}: {hits} pages")
+
+    return estimates
@@ -0,0 +1,116 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+
+from claims_analysis.constants import HTTP_POOL_MAXSIZE
+
+
+@dataclass
+class ConnectionStats:
+    """HTTP requests sent through the pool and the connections opened for them."""
+
+    requests: int = 0
+    connections_opened: int = 0
+
+    @property
+    def connections_reused(self) -> int:
+        return max(self.requests - self.connections_opened, 0)
+
+
+class _PooledSession(requests.Session):
+    """Session that outlives the callers closing it.
+
+    openai closes and replaces each thread's session every few minutes; with a shared
+    session that would drop every pooled connection, so close is a no-op and the pool
+    is only torn down by shutdown.
+    """
+
+    def close(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        super().close()
+
+
+class HttpClientPool:
+    """Process-wide HTTP connection pool shared by every model client.
+
+    Replaces openai's session per thread, so all threads reuse the same keep-alive connections.
+
+    Attributes:
+        session: the shared session that openai sends its requests with
+    """
+
+    def __init__(self, pool_maxsize: int = HTTP_POOL_MAXSIZE):
+        self.session = _PooledSession()
+        # Enough connections per host for every request that can be in flight at once
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._adapter = adapter
+        self._run_baseline = ConnectionStats()
+
+    def connection_stats(self) -> ConnectionStats:
+        """Totals over the lifetime of the pool."""
+
+        stats = ConnectionStats()
+        # The pool container only supports locked access by key, not iteration
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            if (pool := pools.get(key)) is None:
+                continue
+            stats.requests += pool.num_requests
+            stats.connections_opened += pool.num_connections
+        return stats
+
+    def start_run(self) -> None:
+        """Starts counting the connection stats of a new run."""
+        self._run_baseline = self.connection_stats()
+
+    def run_stats(self) -> ConnectionStats:
+        """Stats since the last start_run."""
+
+        total = self.connection_stats()
+        return ConnectionStats(
+            requests=total.requests - self._run_baseline.requests,
+            connections_opened=total.connections_opened
+            - self._run_baseline.connections_opened,
+        )
+
+    def log_stats(self) -> None:
+        """Logs how many of the run's requests reused a pooled connection."""
+
+        stats = self.run_stats()
+        logging.info(
+            f"HTTP client pool: {stats.requests} requests, {stats.connections_opened} "
+            f"connections opened, {stats.connections_reused} reused"
+        )
+
+
+_ACTIVE_POOL: Optional[HttpClientPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_http_client_pool() -> Optional[HttpClientPool]:
+    """Returns the process-wide pool, installing it as openai's session on first use.
+
+    Returns None if the installed openai doesn't send its requests with requests sessions.
+    """
+
+    global _ACTIVE_POOL
+
+    with _POOL_LOCK:
+        if _ACTIVE_POOL is None:
+            if not hasattr(openai, "requestssession"):
+                logging.warning(
+                    "openai client doesn't support a shared session, connections aren't pooled"
+                )
+                return None
+            _ACTIVE_POOL = HttpClientPool()
+            openai.requestssession = _ACTIVE_POOL.session
+        return _ACTIVE_POOL
@@ -0,0 +1,187 @@
+import json
+import logging
+import math
+import threading
+from contextlib import nullcontext
+from time import perf_counter
+from typing import Any, Callable, ContextManager, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Percentiles reported for every distribution in the metrics file
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list of values."""
+
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class MetricsRecorder:
+    """Collects per-stage counters and distributions (durations, token counts) for a run.
+
+    Attributes:
+        started_at: perf_counter value when the recorder was created
+        counters: running totals, e.g. prefilter hits per violation type or cache hits
+        samples: individual observations per metric, e.g. the latency of each model call
+    """
+
+    def __init__(self):
+        self.started_at = perf_counter()
+        self.counters: dict[str, float] = {}
+        self.samples: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            self.samples.setdefault(name, []).append(value)
+
+    def summary(self) -> dict[str, Any]:
+        """Returns the counters and the count, total, mean, percentiles and max of each metric."""
+
+        with self._lock:
+            counters = dict(self.counters)
+            samples = {name: sorted(values) for name, values in self.samples.items()}
+
+        distributions = {}
+        for name, values in sorted(samples.items()):
+            total = sum(values)
+            distributions[name] = {
+                "count": len(values),
+                "total": total,
+                "mean": total / len(values),
+                **{f"p{pct}": percentile(values, pct) for pct in PERCENTILES},
+                "max": values[-1],
+            }
+
+        return {
+            "wall_seconds": perf_counter() - self.started_at,
+            "counters": dict(sorted(counters.items())),
+            "distributions": distributions,
+        }
+
+    def write(self, path: str, **run_info: Any) -> None:
+        """Writes the summary as JSON, prefixed with run_info such as the run id."""
+
+        with open(path, "w") as f:
+            json.dump({**run_info, **self.summary()}, f, indent=2)
+        logging.info(f"Wrote run metrics to {path}")
+
+    def log_stats(self) -> None:
+        """Logs the p50 / p95 / p99 of the timing metrics."""
+
+        for name, stats in self.summary()["distributions"].items():
+            if name.endswith("_seconds"):
+                logging.info(
+                    f"{name}: n={stats['count']} p50={stats['p50']:.3f}s "
+                    f"p95={stats['p95']:.3f}s p99={stats['p99']:.3f}s"
+                )
+
+
+class _Span:
+    """Context manager recording its elapsed time under name."""
+
+    __slots__ = ("_recorder", "_name", "_started_at")
+
+    def __init__(self, recorder: MetricsRecorder, name: str):
+        self._recorder = recorder
+        self._name = name
+
+    def __enter__(self) -> "_Span":
+        self._started_at = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._recorder.observe(self._name, perf_counter() - self._started_at)
+
+
+_NULL_SPAN = nullcontext()
+
+# Recorder of the current run; None disables metrics collection
+_ACTIVE_RECORDER: Optional[MetricsRecorder] = None
+
+
+def configure_metrics(enabled: bool) -> Optional[MetricsRecorder]:
+    """Starts a fresh recorder for the run, or disables metrics collection."""
+
+    global _ACTIVE_RECORDER
+
+    _ACTIVE_RECORDER = MetricsRecorder() if enabled else None
+    return _ACTIVE_RECORDER
+
+
+def get_metrics() -> Optional[MetricsRecorder]:
+    """Returns the active recorder, or None if metrics are disabled."""
+    return _ACTIVE_RECORDER
+
+
+def span(name: str) -> ContextManager:
+    """Times the with block as a sample of name, e.g. span("summarization_seconds")."""
+
+    if _ACTIVE_RECORDER is None:
+        return _NULL_SPAN
+    return _Span(_ACTIVE_RECORDER, name)
+
+
+def observe(name: str, value: float) -> None:
+    """Records one sample of the distribution name."""
+
+    if _ACTIVE_RECORDER is not None:
+        _ACTIVE_RECORDER.observe(name, value)
+
+
+def count(name: str, value: float = 1) -> None:
+    """Adds value to the counter name."""
+
+    if _ACTIVE_RECORDER is not None:
+        _ACTIVE_RECORDER.count(name, value)
+
+
+def timed_iter(name: str, iterable: Iterable[T]) -> Iterator[T]:
+    """Yields from iterable, recording how long each item took to produce.
+
+    Only the time spent inside the iterable is measured, not the consumer's time between
+    items, so wrapping a page generator gives the extraction time of each page.
+    """
+
+    if _ACTIVE_RECORDER is None:
+        yield from iterable
+        return
+
+    iterator = iter(iterable)
+    try:
+        while True:
+            started_at = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            observe(name, perf_counter() - started_at)
+            yield item
+    finally:
+        # Release the source, e.g. a stored claim's memory map, if we're closed early
+        if hasattr(iterator, "close"):
+            iterator.close()
+
+
+def track_queue_wait(name: str, func: Callable[..., T]) -> Callable[..., T]:
+    """Wraps func to record the time from this call until func starts, e.g. in a pool queue."""
+
+    if _ACTIVE_RECORDER is None:
+        return func
+
+    submitted_at = perf_counter()
+
+    def run(*args: Any, **kwargs: Any) -> T:
+        observe(name, perf_counter() - submitted_at)
+        return func(*args, **kwargs)
+
+    return run
@@ -0,0 +1,246 @@
+import dataclasses
+import logging
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, TextIO
+
+from claims_analysis.constants import PARQUET_ROW_GROUP_ROWS, OutputFormat
+from claims_analysis.page_processing import Violation
+from claims_analysis.summarization import ClaimSummary
+from claims_analysis.text_store import read_claim_pages
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Extra violations column holding the text of the flagged page when page text is included
+PAGE_TEXT_COLUMN = "page_text"
+
+# Violations column only written for combined classification, see Violation.violation_type
+VIOLATION_TYPE_COLUMN = "violation_type"
+
+
+class ResultWriter(ABC):
+    """Writes the violation and summary rows of each claim as soon as it's done.
+
+    Claims finishing out of order are held back, so rows are always in claim order.
+    Subclasses implement the file format.
+
+    Attributes:
+        include_page_text: whether violation rows carry the text of their flagged page
+        include_violation_type: whether violation rows carry their violation type
+    """
+
+    def __init__(
+        self, include_page_text: bool = False, include_violation_type: bool = False
+    ):
+        self.include_page_text = include_page_text
+        self.include_violation_type = include_violation_type
+        self._next_claim_idx = 0
+        self._pending: dict[int, tuple[list[Violation], ClaimSummary]] = {}
+
+    def write_claim(
+        self, claim_idx: int, violations: list[Violation], summary: ClaimSummary
+    ) -> None:
+        """Writes the rows of the claim_idx-th claim once all earlier claims are written.
+
+        Args:
+            claim_idx: position of the claim in the run's claim order
+            violations: the claim's violations
+            summary: the claim's summary
+        """
+
+        self._pending[claim_idx] = (violations, summary)
+        while self._next_claim_idx in self._pending:
+            violations, summary = self._pending.pop(self._next_claim_idx)
+            self._write_rows(
+                self._build_violation_rows(summary.filepath, violations), summary
+            )
+            self._next_claim_idx += 1
+
+    def _build_violation_rows(
+        self, claim_path: str, violations: list[Violation]
+    ) -> list[dict[str, Any]]:
+        rows = [dataclasses.asdict(violation) for violation in violations]
+        if not self.include_violation_type:
+            for row in rows:
+                del row[VIOLATION_TYPE_COLUMN]
+        if self.include_page_text and rows:
+            page_texts = read_claim_pages(claim_path, {row["page_no"] for row in rows})
+            for row in rows:
+                row[PAGE_TEXT_COLUMN] = page_texts[row["page_no"]]
+        return rows
+
+    @abstractmethod
+    def _write_rows(
+        self, violation_rows: list[dict[str, Any]], summary: ClaimSummary
+    ) -> None:
+        """Writes the violation rows and the summary of the next claim in order."""
+
+    def close(self) -> None:
+        if self._pending:
+            logging.warning(
+                f"Closing output with {len(self._pending)} claims waiting on claim "
+                f"{self._next_claim_idx}"
+            )
+
+
+class CsvResultWriter(ResultWriter):
+    """Appends rows to <output_base>_violations.csv and <output_base>_summary.csv."""
+
+    def __init__(
+        self,
+        output_base: str,
+        include_page_text: bool = False,
+        include_violation_type: bool = False,
+    ):
+        super().__init__(include_page_text, include_violation_type)
+        self.violations_path = output_base + "_violations.csv"
+        self.summary_path = output_base + "_summary.csv"
+
+        self._violations_file = open(self.violations_path, "w", newline="")
+        self._summary_file = open(self.summary_path, "w", newline="")
+        self._headers_written: set[TextIO] = set()
+
+    def _append_rows(self, file: TextIO, rows: list[Any]) -> None:
+        import pandas as pd
+
+        if not rows:
+            return
+        pd.DataFrame(rows).to_csv(
+            file, header=file not in self._headers_written, index=False
+        )
+        self._headers_written.add(file)
+
+    def _write_rows(
+        self, violation_rows: list[dict[str, Any]], summary: ClaimSummary
+    ) -> None:
+        self._append_rows(self._violations_file, violation_rows)
+        self._append_rows(self._summary_file, [summary])
+        self._violations_file.flush()
+        self._summary_file.flush()
+
+    def close(self) -> None:
+        """Closes the files; a file without rows gets the same content pandas writes for it."""
+
+        import pandas as pd
+
+        super().close()
+        for file in [self._violations_file, self._summary_file]:
+            if file not in self._headers_written:
+                pd.DataFrame([]).to_csv(file, index=False)
+            file.close()
+
+
+def _arrow_type(python_type: type) -> Any:
+    import pyarrow as pa
+
+    return {str: pa.string(), int: pa.int64(), float: pa.float64()}[python_type]
+
+
+def arrow_schema(
+    row_type: type,
+    extra_string_columns: list[str] = [],
+    omitted_fields: list[str] = [],
+) -> Any:
+    """Arrow schema with a column per field of the row_type dataclass, in field order."""
+
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            pa.field(field.name, _arrow_type(field.type), nullable=False)
+            for field in dataclasses.fields(row_type)
+            if field.name not in omitted_fields
+        ]
+        + [pa.field(name, pa.string()) for name in extra_string_columns]
+    )
+
+
+class ParquetResultWriter(ResultWriter):
+    """Writes rows to <output_base>_violations.parquet and <output_base>_summary.parquet.
+
+    Rows are written as a row group at the first claim boundary after row_group_rows rows.
+    Requires pyarrow.
+    """
+
+    def __init__(
+        self,
+        output_base: str,
+        include_page_text: bool = False,
+        include_violation_type: bool = False,
+        row_group_rows: int = PARQUET_ROW_GROUP_ROWS,
+    ):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise ImportError(
+                "Writing parquet output requires pyarrow, e.g. `pip install pyarrow`"
+            ) from error
+
+        super().__init__(include_page_text, include_violation_type)
+        self.violations_path = output_base + "_violations.parquet"
+        self.summary_path = output_base + "_summary.parquet"
+        self.row_group_rows = row_group_rows
+
+        self._violations_schema = arrow_schema(
+            Violation,
+            [PAGE_TEXT_COLUMN] if include_page_text else [],
+            [] if include_violation_type else [VIOLATION_TYPE_COLUMN],
+        )
+        self._summary_schema = arrow_schema(ClaimSummary)
+        self._violations_writer = pq.ParquetWriter(
+            self.violations_path, self._violations_schema
+        )
+        self._summary_writer = pq.ParquetWriter(self.summary_path, self._summary_schema)
+        self._violation_rows: list[dict[str, Any]] = []
+        self._summary_rows: list[dict[str, Any]] = []
+
+    def _flush(self, min_rows: int = 1) -> None:
+        """Writes each buffer holding at least min_rows rows as a row group."""
+
+        import pyarrow as pa
+
+        for rows, writer, schema in [
+            (self._violation_rows, self._violations_writer, self._violations_schema),
+            (self._summary_rows, self._summary_writer, self._summary_schema),
+        ]:
+            if rows and len(rows) >= min_rows:
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                rows.clear()
+
+    def _write_rows(
+        self, violation_rows: list[dict[str, Any]], summary: ClaimSummary
+    ) -> None:
+        self._violation_rows.extend(violation_rows)
+        self._summary_rows.append(dataclasses.asdict(summary))
+        self._flush(min_rows=self.row_group_rows)
+
+    def close(self) -> None:
+        super().close()
+        self._flush()
+        self._violations_writer.close()
+        self._summary_writer.close()
+
+
+def make_result_writer(
+    output_format: OutputFormat,
+    output_base: str,
+    include_page_text: bool = False,
+    include_violation_type: bool = False,
+) -> ResultWriter:
+    """Returns the writer for the output format, writing files named <output_base>_*."""
+
+    if output_format == OutputFormat.Parquet:
+        return ParquetResultWriter(
+            output_base, include_page_text, include_violation_type
+        )
+    return CsvResultWriter(output_base, include_page_text, include_violation_type)
+
+
+def read_violations(path: str) -> "pd.DataFrame":
+    """Reads a _violations.csv or _violations.parquet file of a run."""
+
+    import pandas as pd
+
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
@@ -1,33 +1,71 @@
 import logging
-from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from dataclasses import dataclass
-from typing import Optional
-
-from langchain.chat_models import ChatOpenAI
-from langchain.schema import BaseMessage, HumanMessage, SystemMessage
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Optional
 
+from claims_analysis import metrics
 from claims_analysis.constants import (
-    EXCLUDED_ITEMS_TEMPLATE,
-    EXCLUDED_ITEMS_VIOLATION_TYPES,
-    GLOBAL_EXCLUDED_KEYWORDS,
-    PAIR_CLAUSE_TEMPLATE,
-    PAIR_CLAUSE_VIOLATION_TYPES,
-    RCV_PROPERTY_TEMPLATE,
-    RCV_PROPERTY_VIOLATION_TYPES,
+    ALL_VIOLATION_TYPES,
+    COMBINED_TEMPLATE,
+    PROMPT_FAMILIES,
     YES_DELIMITER,
+    ClassificationMode,
     ExtendedCoverage,
     ViolationType,
 )
-from claims_analysis.utils import words_exist_in_text
+from claims_analysis.dedup import get_page_deduplicator
+from claims_analysis.prefilter import PageMatch, get_prefilter_engine
+from claims_analysis.prompts import (
+    combined_description,
+    filter_violation_types,
+    render_system_prompt,
+)
+from claims_analysis.rate_limiting import get_request_scheduler
+from claims_analysis.response_cache import get_response_cache, make_cache_key
+from claims_analysis.run_journal import get_run_journal
+from claims_analysis.triage import get_page_triage
+
+if TYPE_CHECKING:
+    from langchain.chat_models import ChatOpenAI
+    from langchain.schema import BaseMessage, SystemMessage
 
 
 @dataclass
 class Violation:
-    """For storing individual occurences of violations."""
+    """For storing individual occurences of violations.
+
+    violation_type is the name of the flagged violation type. In split classification mode,
+    where one verdict answers for a whole prompt family, it lists the family's types that the
+    prefilter matched on the page, comma separated, and it is left out of the output files.
+    """
 
     filepath: str
     page_no: int
     issue_desc: str
+    violation_type: str = ""
+
+
+# A flagged violation of a page as (violation type, reason), see Violation.violation_type
+Finding = tuple[str, str]
+
+
+def new_chat_model(**kwargs: Any) -> "ChatOpenAI":
+    """Creates a langchain ChatOpenAI client with the given arguments.
+
+    langchain takes about a second to import, so it's only imported once the first model
+    client is built rather than with the package.
+    """
+
+    from langchain.chat_models import ChatOpenAI
+
+    return ChatOpenAI(**kwargs)
 
 
 class PageProcessor:
@@ -35,8 +73,7 @@ class PageProcessor:
 
     Attributes:
         chat: Interface to ChatGPT client for sending queries to API
-        required_keywords: A list of keywords to use for pre-filtering to determine if a
-            page should be processed or not.
+        violation_type_names: Names of the violation types handled by this processor.
         sys_message: The initial message to prepend to all requests to ChatGPT, i.e. the system prompt.
     """
 
@@ -45,6 +82,7 @@ class PageProcessor:
         sys_message_template: str,
         relevant_violation_types: list[ViolationType],
         temperature: float = 0,
+        snippet_width: Optional[int] = None,
     ):
         """Initializes the instance based on the list of relevant violation types.
 
@@ -53,41 +91,44 @@ class PageProcessor:
             relevant_violation_types: List of ViolationType containing description and relevant key words.
             temperature: Parameter between 0 and 1 controlling the randomness / creativity of the output.
                 Closer to 0 makes the response more deterministic.
+            snippet_width: if set, find_violations only sends windows of this many characters
+                around the keyword hits on the page instead of the whole page.
         """
-        self.chat = ChatOpenAI(
-            temperature=temperature, model_name="gpt-3.5-turbo", client=None
+        # Retries are handled by the request scheduler, which can see the rate limits
+        self.chat = new_chat_model(
+            temperature=temperature,
+            model_name="gpt-3.5-turbo",
+            client=None,
+            max_retries=1,
         )
 
-        # Construct the base system message from the relevant violation types and save the keywords
-        keywords_set: set[str] = set()
-        violation_prompts: list[str] = []
+        # Construct the base system message from the relevant violation types. Which pages
+        # are sent to the processor is decided by the prefilter engine from their keywords.
+        self.violation_type_names = {vt.name for vt in relevant_violation_types}
 
-        for violation_type in relevant_violation_types:
-            violation_prompts.append(violation_type.prompt_desc)
-            keywords_set.update(violation_type.keywords)
-        self.required_keywords = list(keywords_set)
+        self.snippet_width = snippet_width
+        self._sys_message_template = sys_message_template
+        self.sys_message = self._render_sys_message(relevant_violation_types)
 
-        violation_descriptions = "".join(
-            "- " + desc + "\n" for desc in violation_prompts
-        )
-        self.sys_message = SystemMessage(
-            content=sys_message_template.format(
-                violation_descriptions=violation_descriptions,
-                yes_delimiter=YES_DELIMITER,
-            )
-        )
+    def _describe_violation_type(self, violation_type: ViolationType) -> str:
+        """The line describing a violation type in the system prompt."""
+        return violation_type.prompt_desc
 
-    def meets_prefilter_criteria(self, page_text: str) -> bool:
-        """Basic filter for ruling out pages that don't need to be processed."""
+    def _render_sys_message(
+        self, violation_types: list[ViolationType]
+    ) -> "SystemMessage":
+        """Fills in the system prompt template with the given violation types."""
 
-        # Terms that must be present to consider page
-        if not words_exist_in_text(self.required_keywords, page_text):
-            return False
+        from langchain.schema import SystemMessage
 
-        # Terms that must not be present to consider page; mostly terms in extended coverage doc
-        return not words_exist_in_text(GLOBAL_EXCLUDED_KEYWORDS, page_text)
+        return SystemMessage(
+            content=render_system_prompt(
+                self._sys_message_template,
+                [self._describe_violation_type(vt) for vt in violation_types],
+            )
+        )
 
-    def _process_response(self, raw_response: BaseMessage) -> Optional[str]:
+    def _process_response(self, raw_response: "BaseMessage") -> Optional[str]:
         """Processes the response from LLM and returns a reason if there is one."""
 
         if raw_response.content.startswith(YES_DELIMITER):
@@ -98,22 +139,457 @@ class PageProcessor:
 
     def process_page(self, page_text: str) -> Optional[str]:
         """Takes in a page and runs the LLM and returns a violation reason if there is one."""
+        return self._process_response(self._get_response(self.sys_message, page_text))
+
+    def find_violations(
+        self, page_text: str, matched_type_names: Optional[set[str]] = None
+    ) -> list[Finding]:
+        """Returns the violations found on the page, one per flagged violation.
+
+        Args:
+            page_text: the text of the page
+            matched_type_names: the violation types the prefilter matched on the page; the
+                split prompt families always ask about all of their violation types, so they
+                only label their verdict with them.
+        """
+
+        reason = self.process_page(
+            self._prepare_page(page_text, self.violation_type_names)
+        )
+        if not reason:
+            return []
+        type_names = self.violation_type_names & (matched_type_names or set())
+        return [(",".join(sorted(type_names or self.violation_type_names)), reason)]
+
+    def _prepare_page(self, page_text: str, type_names: Iterable[str]) -> str:
+        """Returns the text to send for the page: the whole page or its snippets."""
+
+        if self.snippet_width is None:
+            return page_text
+        return get_prefilter_engine().extract_snippets(
+            page_text, type_names, self.snippet_width
+        )
+
+    def _get_response(
+        self, sys_message: "SystemMessage", page_text: str
+    ) -> "BaseMessage":
+        """Returns the LLM response for the page, reusing the response of duplicate pages."""
+
+        from langchain.schema import AIMessage
+
+        deduplicator = get_page_deduplicator()
+        if deduplicator is None:
+            return self._get_unique_response(sys_message, page_text)
+
+        namespace = make_cache_key(
+            sys_message.content, "", self.chat.model_name, self.chat.temperature
+        )
+        content = deduplicator.get_or_compute(
+            namespace,
+            page_text,
+            lambda: self._get_unique_response(sys_message, page_text).content,
+        )
+        return AIMessage(content=content)
+
+    def _get_unique_response(
+        self, sys_message: "SystemMessage", page_text: str
+    ) -> "BaseMessage":
+        """Returns the LLM response for the page, from the response cache if there is one."""
+
+        from langchain.schema import AIMessage
+
+        cache = get_response_cache()
+        if cache is None:
+            return self._query(sys_message, page_text)
+
+        cache_key = make_cache_key(
+            sys_message.content,
+            page_text,
+            self.chat.model_name,
+            self.chat.temperature,
+        )
+        if (cached_content := cache.get(cache_key)) is not None:
+            return AIMessage(content=cached_content)
+
+        response = self._query(sys_message, page_text)
+        cache.put(cache_key, response.content)
+        return response
+
+    def _query(self, sys_message: "SystemMessage", page_text: str) -> "BaseMessage":
+        """Sends the page to the LLM through the request scheduler and returns its raw response."""
+
+        from langchain.schema import HumanMessage
+
+        messages = [sys_message, HumanMessage(content=page_text)]
+        return get_request_scheduler().call(
+            self.chat, messages, label="page_classification"
+        )
+
+
+class CombinedPageProcessor(PageProcessor):
+    """Processor asking about every matched violation type of a page in a single call.
+
+    The model answers with one labelled verdict per flagged type.
+    """
+
+    def __init__(
+        self,
+        relevant_violation_types: list[ViolationType],
+        temperature: float = 0,
+        snippet_width: Optional[int] = None,
+    ):
+        """Initializes the instance based on the list of relevant violation types.
+
+        Args:
+            relevant_violation_types: List of ViolationType containing description and relevant key words.
+            temperature: Parameter between 0 and 1 controlling the randomness / creativity of the output.
+            snippet_width: see PageProcessor
+        """
+        super().__init__(
+            COMBINED_TEMPLATE, relevant_violation_types, temperature, snippet_width
+        )
+        self._violation_types = relevant_violation_types
+        self._sys_messages = {frozenset(self.violation_type_names): self.sys_message}
+
+    def _describe_violation_type(self, violation_type: ViolationType) -> str:
+        return combined_description(violation_type)
+
+    def _sys_message_for(self, type_names: frozenset[str]) -> "SystemMessage":
+        """Returns the system prompt covering only the given violation types."""
+
+        if (sys_message := self._sys_messages.get(type_names)) is None:
+            sys_message = self._render_sys_message(
+                [vt for vt in self._violation_types if vt.name in type_names]
+            )
+            self._sys_messages[type_names] = sys_message
+        return sys_message
+
+    def _process_combined_response(
+        self, raw_response: "BaseMessage", type_names: frozenset[str]
+    ) -> list[Finding]:
+        """Parses one '<YES_DELIMITER> <name>: <reason>' line per flagged violation type.
+
+        Lines labelled with a violation type the page wasn't asked about are logged and
+        dropped, and so are repeated verdicts for the same type. An unlabelled line is
+        taken as the verdict of the only type asked about, if there is just one.
+        """
+
+        findings = []
+        for line in raw_response.content.splitlines():
+            line = line.strip()
+            if not line.startswith(YES_DELIMITER):
+                continue
+
+            name, _, reason = line[len(YES_DELIMITER) :].partition(":")
+            name = name.strip()
+            if name not in type_names and len(type_names) == 1:
+                # e.g. "YES: pool pump on the patio", the model left out the label
+                (name,) = type_names
+                reason = line[len(YES_DELIMITER) :]
+            if name not in type_names:
+                logging.warning(f"Dropping verdict with unexpected label: {line}")
+                metrics.count("combined_unexpected_labels")
+                continue
+            if any(name == flagged for flagged, _ in findings):
+                logging.warning(f"Dropping repeated verdict for {name}: {line}")
+                continue
+            findings.append((name, reason.strip()))
+
+        return findings
+
+    def find_violations(
+        self, page_text: str, matched_type_names: Optional[set[str]] = None
+    ) -> list[Finding]:
+        type_names = frozenset(
+            self.violation_type_names & matched_type_names
+            if matched_type_names is not None
+            else self.violation_type_names
+        )
+        sys_message = self._sys_message_for(type_names)
+        page_text = self._prepare_page(page_text, type_names)
+        return self._process_combined_response(
+            self._get_response(sys_message, page_text), type_names
+        )
+
+
+def classify_page(
+    processor: PageProcessor,
+    claim_path: str,
+    page_no: int,
+    page_text: str,
+    matched_type_names: Optional[set[str]] = None,
+) -> list[Finding]:
+    """Runs processor.find_violations on a page, checkpointing the verdict in the run journal.
+
+    When a resumed run's journal already has the page's verdict for this processor, it is
+    returned without calling the model.
+    """
+
+    journal = get_run_journal()
+    if journal is None:
+        return processor.find_violations(page_text, matched_type_names)
 
-        messages = [self.sys_message, HumanMessage(content=page_text)]
-        response = self.chat(messages)
+    processor_key = ",".join(sorted(processor.violation_type_names))
+    if (
+        findings := journal.page_findings(claim_path, processor_key, page_no)
+    ) is not None:
+        return findings
 
-        return self._process_response(response)
+    findings = processor.find_violations(page_text, matched_type_names)
+    journal.record_page(claim_path, processor_key, page_no, findings)
+    return findings
 
 
-def _filter_violation_types(
-    violation_types: list[ViolationType], extended_coverages: list[ExtendedCoverage]
-) -> list[ViolationType]:
-    """Remove the violation types that the extended coverages cover."""
-    return [
-        violation_type
-        for violation_type in violation_types
-        if violation_type.extended_coverage not in extended_coverages
+class ProcessorRegistry:
+    """Process-wide registry of page processors, shared by all claims and runs.
+
+    Attributes:
+        built: number of processors constructed
+        reused: number of times an existing processor was handed out
+    """
+
+    def __init__(self):
+        self.built = 0
+        self.reused = 0
+        self._processors: dict[tuple, PageProcessor] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        sys_message_template: Optional[str],
+        violation_types: list[ViolationType],
+        snippet_width: Optional[int] = None,
+    ) -> PageProcessor:
+        """Returns the processor for the prompt template and filtered violation types.
+
+        Args:
+            sys_message_template: prompt template of a split processor, or None for the
+                combined processor
+            violation_types: the violation types left after filtering by extended coverage
+            snippet_width: see PageProcessor
+        """
+
+        key = (
+            sys_message_template,
+            tuple(violation_type.name for violation_type in violation_types),
+            snippet_width,
+        )
+        with self._lock:
+            if (processor := self._processors.get(key)) is not None:
+                self.reused += 1
+                return processor
+
+            if sys_message_template is None:
+                processor = CombinedPageProcessor(
+                    violation_types, snippet_width=snippet_width
+                )
+            else:
+                processor = PageProcessor(
+                    sys_message_template=sys_message_template,
+                    relevant_violation_types=violation_types,
+                    snippet_width=snippet_width,
+                )
+            self._processors[key] = processor
+            self.built += 1
+            return processor
+
+    def log_stats(self) -> None:
+        logging.info(
+            f"Processor registry: {self.built} processors built, {self.reused} reused"
+        )
+
+
+PROCESSOR_REGISTRY = ProcessorRegistry()
+
+
+def build_processors(
+    extended_coverages: list[ExtendedCoverage],
+    classification_mode: ClassificationMode = ClassificationMode.Split,
+    snippet_width: Optional[int] = None,
+) -> list[PageProcessor]:
+    """Returns the processors for the violation types that still apply to a claim.
+
+    In split mode there is one processor per prompt family; in combined mode a single
+    processor covers all violation types. Processors come from PROCESSOR_REGISTRY, so
+    claims with the same extended coverages share them.
+    """
+
+    if classification_mode == ClassificationMode.Combined:
+        filt_types = filter_violation_types(ALL_VIOLATION_TYPES, extended_coverages)
+        return (
+            [PROCESSOR_REGISTRY.get(None, filt_types, snippet_width)]
+            if filt_types
+            else []
+        )
+
+    processors: list[PageProcessor] = []
+
+    for prompt_template, viol_types in PROMPT_FAMILIES:
+        if filt_types := filter_violation_types(viol_types, extended_coverages):
+            processors.append(
+                PROCESSOR_REGISTRY.get(prompt_template, filt_types, snippet_width)
+            )
+
+    return processors
+
+
+def route_page(
+    page_text: str, page_match: PageMatch, processors: list[PageProcessor]
+) -> list[PageProcessor]:
+    """Returns the processors a page should be sent to.
+
+    A processor gets the page if the prefilter matched one of its violation types and,
+    when the triage stage is enabled, the triage scores one of them above its threshold.
+    """
+
+    candidates = [
+        processor
+        for processor in processors
+        if page_match.matches_any(processor.violation_type_names)
     ]
+    if (triage := get_page_triage()) is None or not candidates:
+        return candidates
+
+    decisions = triage.select(
+        page_text,
+        page_match.matched_types,
+        [processor.violation_type_names for processor in candidates],
+    )
+    return [processor for processor, keep in zip(candidates, decisions) if keep]
+
+
+class ClaimPageStream:
+    """Streaming pipeline that classifies pages of a claim as they arrive.
+
+    Iterating over the stream yields violations as their calls complete. With
+    max_pages_in_flight set, pages are only pulled while fewer submissions are pending.
+
+    Attributes:
+        path: path to the claim PDF file
+        pages_total: number of pages pulled from `pages` so far
+        pages_processed: page numbers that were sent to at least one processor
+    """
+
+    def __init__(
+        self,
+        path: str,
+        pages: Iterable[str],
+        extended_coverages: list[ExtendedCoverage] = [],
+        threads: int = 2,
+        classification_mode: ClassificationMode = ClassificationMode.Split,
+        snippet_width: Optional[int] = None,
+        max_pages_in_flight: Optional[int] = None,
+    ):
+        """Initializes the stream; no work is done until it is iterated over.
+
+        Args:
+            path: path to the claim PDF file
+            pages: the text of the claim pages in page order, e.g. a generator over the PDF
+            extended_coverages: list of extended coverages that the policyholder has bought
+            threads: number of concurrent workers for processing pages by Processors
+            classification_mode: whether pages are sent once per prompt family or once overall
+            snippet_width: if set, only windows around the keyword hits are sent, see PageProcessor
+            max_pages_in_flight: if set, at most this many (page, processor) classifications are
+                pending at once; None submits every page as soon as it's extracted
+        """
+        self.path = path
+        self.pages_total = 0
+        self.pages_processed: set[int] = set()
+
+        self._pages = pages
+        self._extended_coverages = extended_coverages
+        self._threads = threads
+        self._classification_mode = classification_mode
+        self._snippet_width = snippet_width
+        self._max_pages_in_flight = max_pages_in_flight
+
+        # Maps each pending future to its submission index and page number
+        self._pending: dict[Future[list[Finding]], tuple[int, int]] = {}
+        # Violations keyed by the submission index of their request, for batch ordering
+        self._violations: dict[int, list[Violation]] = {}
+
+    @property
+    def violations(self) -> list[Violation]:
+        """Violations found so far, in the same order as the batch path would return them."""
+        return [
+            violation
+            for idx in sorted(self._violations)
+            for violation in self._violations[idx]
+        ]
+
+    def _collect(self, futures: Iterable[Future[list[Finding]]]) -> Iterator[Violation]:
+        """Yields a violation for each flagged violation of the completed futures."""
+
+        for future in futures:
+            submission_idx, page_no = self._pending.pop(future)
+            violations = [
+                Violation(
+                    filepath=self.path,
+                    page_no=page_no,
+                    issue_desc=reason,
+                    violation_type=violation_type,
+                )
+                for violation_type, reason in future.result()
+            ]
+            self._violations[submission_idx] = violations
+            for violation in violations:
+                logging.info(
+                    f"Found violation on page {page_no} with reason: {violation.issue_desc}"
+                )
+                yield violation
+
+    def __iter__(self) -> Iterator[Violation]:
+        logging.info(
+            f"Starting processing for claim {self.path} with {self._threads} threads..."
+        )
+
+        engine = get_prefilter_engine()
+        processors = build_processors(
+            self._extended_coverages, self._classification_mode, self._snippet_width
+        )
+
+        submission_idx = 0
+
+        # Submit the pages to processor. Although all threads land on 1 CPU in Pyhton, this will offer a speedup
+        # since we're bottlenecked by each network request and processing by ChatGPT, not our own internal processing.
+        with ThreadPoolExecutor(max_workers=self._threads) as exec:
+            for page_no, page in enumerate(self._pages, 1):
+                self.pages_total = page_no
+                page_match = engine.scan_page(page, page_no)
+                for processor in route_page(page, page_match, processors):
+                    self.pages_processed.add(page_no)
+                    future = exec.submit(
+                        metrics.track_queue_wait(
+                            "executor_wait_seconds", classify_page
+                        ),
+                        processor,
+                        self.path,
+                        page_no,
+                        page,
+                        page_match.matched_types,
+                    )
+                    self._pending[future] = (submission_idx, page_no)
+                    submission_idx += 1
+
+                # Wait for a free slot before pulling the next page into memory
+                while (
+                    self._max_pages_in_flight is not None
+                    and len(self._pending) >= self._max_pages_in_flight
+                ):
+                    done, _ = wait(self._pending, return_when=FIRST_COMPLETED)
+                    yield from self._collect(done)
+
+                # Hand back anything that finished while this page was being extracted
+                yield from self._collect(
+                    [future for future in self._pending if future.done()]
+                )
+
+            yield from self._collect(as_completed(list(self._pending)))
+
+        logging.info(
+            f"Finished {self.path}. Processed {len(self.pages_processed)} pages out of "
+            f"{self.pages_total}: {self.pages_processed}"
+        )
 
 
 def process_claim_pages(
@@ -121,6 +597,8 @@ def process_claim_pages(
     pages: list[str],
     extended_coverages: list[ExtendedCoverage] = [],
     threads: int = 2,
+    classification_mode: ClassificationMode = ClassificationMode.Split,
+    snippet_width: Optional[int] = None,
 ) -> tuple[list[Violation], list[int]]:
     """Processes pages and returns a list of violations and page numbers that were processed.
 
@@ -129,59 +607,17 @@ def process_claim_pages(
         pages: the list of text of the claim pages
         extended_coverages: list of extended coverages that the policyholder has bought
         threads: number of concurrent workers for processing pages by Processors
+        classification_mode: whether pages are sent once per prompt family or once overall
+        snippet_width: if set, only windows around the keyword hits are sent, see PageProcessor
 
     Returns:
         a list of potential violations and the total number of pages processed
     """
 
-    logging.info(f"Starting processing for claim {path} with {threads} threads...")
-
-    processors: list[PageProcessor] = []
-
-    for prompt_template, viol_types in [
-        # For excluded items (pool, patio)
-        (EXCLUDED_ITEMS_TEMPLATE, EXCLUDED_ITEMS_VIOLATION_TYPES),
-        # For RCV with non-covered properties
-        (RCV_PROPERTY_TEMPLATE, RCV_PROPERTY_VIOLATION_TYPES),
-        # For items covered under the pair and set clause
-        (PAIR_CLAUSE_TEMPLATE, PAIR_CLAUSE_VIOLATION_TYPES),
-    ]:
-        if filt_types := _filter_violation_types(viol_types, extended_coverages):
-            processors.append(
-                PageProcessor(
-                    sys_message_template=prompt_template,
-                    relevant_violation_types=filt_types,
-                )
-            )
-
-    pages_processed: set[int] = set()
-    violations: list[Violation] = []
-
-    # This is a list of tuples where the first element is the page number and the second element is a future of the
-    # chat gpt result.
-    page_processing_future: list[tuple[int, Future[Optional[str]]]] = []
-
-    # Submit the pages to processor. Although all threads land on 1 CPU in Pyhton, this will offer a speedup
-    # since we're bottlenecked by each network request and processing by ChatGPT, not our own internal processing.
-    with ThreadPoolExecutor(max_workers=threads) as exec:
-        for page_no, page in enumerate(pages, 1):
-            for processor in processors:
-                if processor.meets_prefilter_criteria(page):
-                    pages_processed.add(page_no)
-                    page_processing_future.append(
-                        (page_no, exec.submit(processor.process_page, page))
-                    )
-
-    # Collect the results
-    for page_no, future in page_processing_future:
-        if reason := future.result():
-            violations.append(
-                Violation(filepath=path, page_no=page_no, issue_desc=reason)
-            )
-            logging.info(f"Found violation on page {page_no} with reason: {reason}")
-
-    logging.info(
-        f"Finished {path}. Processed {len(pages_processed)} pages out of {len(pages)}: {pages_processed}"
+    stream = ClaimPageStream(
+        path, pages, extended_coverages, threads, classification_mode, snippet_width
     )
+    for _ in stream:
+        pass
 
-    return violations, list(pages_processed)
+    return stream.violations, list(stream.pages_processed)
@@ -0,0 +1,235 @@
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from claims_analysis import metrics
+from claims_analysis.constants import (
+    ALL_VIOLATION_TYPES,
+    GLOBAL_EXCLUDED_KEYWORDS,
+    SNIPPET_SEPARATOR,
+    ViolationType,
+)
+
+# Flags shared by all prefilter patterns
+PATTERN_FLAGS = re.IGNORECASE | re.DOTALL
+
+# Characters that IGNORECASE matches to an ASCII letter but casefold does not fold to it
+_FOLD_FIXES = str.maketrans({"\u0130": "i", "\u0131": "i"})
+
+
+def compile_keywords(keywords: Iterable[str]) -> re.Pattern:
+    """Compiles keywords into a single pattern matching any of them standalone."""
+
+    return re.compile(
+        "|".join(r"\b{}\b".format(word) for word in keywords), flags=PATTERN_FLAGS
+    )
+
+
+def fold_page_text(page_text: str) -> str:
+    """Casefolds a page so that it contains every ASCII literal an IGNORECASE match needs."""
+    return page_text.translate(_FOLD_FIXES).casefold()
+
+
+def required_literals(keyword: str) -> Optional[list[str]]:
+    """Returns casefolded literal runs that every match of the keyword pattern must contain.
+
+    Only ASCII letters, digits and spaces form runs, see fold_page_text. Returns None if
+    no literal is guaranteed, e.g. with a top-level alternation.
+    """
+
+    runs: list[str] = []
+    run = ""
+    i = 0
+    while i < len(keyword):
+        char = keyword[i]
+        if char == "|":
+            return None
+        if char.isascii() and (char.isalnum() or char == " "):
+            run += char
+            i += 1
+            continue
+        if char in "?*{" and run:
+            run = run[:-1]
+        runs.append(run)
+        run = ""
+        if char == "\\":
+            i += 2
+        elif char == "[":
+            # A "]" straight after the opening "[" or "[^" is part of the class
+            start = i + 2 if keyword[i + 1] == "^" else i + 1
+            i = keyword.index("]", start + 1) + 1
+        elif char == "(":
+            depth = 0
+            while True:
+                if keyword[i] == "\\":
+                    i += 1
+                elif keyword[i] == "(":
+                    depth += 1
+                elif keyword[i] == ")":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                i += 1
+            i += 1
+        elif char == "{":
+            i = keyword.index("}", i) + 1
+        else:
+            i += 1
+    runs.append(run)
+    return [run.casefold() for run in runs if run]
+
+
+class _CompiledKeyword:
+    """A keyword pattern together with the literals that must be present for it to match."""
+
+    def __init__(self, keyword: str):
+        self.keyword = keyword
+        self.pattern = compile_keywords([keyword])
+        self.literals = required_literals(keyword)
+
+    def search(self, page_text: str, folded_text: str) -> bool:
+        if self.literals is not None and not all(
+            literal in folded_text for literal in self.literals
+        ):
+            return False
+        return bool(self.pattern.search(page_text))
+
+
+@dataclass
+class PageMatch:
+    """Prefilter result for a single page.
+
+    Attributes:
+        page_no: 1-based page number within the claim
+        matched_types: names of the violation types whose keywords were found on the page
+        excluded_keywords: global excluded keywords found on the page
+    """
+
+    page_no: int
+    matched_types: set[str] = field(default_factory=set)
+    excluded_keywords: list[str] = field(default_factory=list)
+
+    @property
+    def is_excluded(self) -> bool:
+        return len(self.excluded_keywords) > 0
+
+    def matches_any(self, type_names: Iterable[str]) -> bool:
+        """True if the page is not excluded and matches at least one of the given types."""
+        return not self.is_excluded and not self.matched_types.isdisjoint(type_names)
+
+
+class PrefilterEngine:
+    """Compiled keyword prefilter over all violation types.
+
+    Only keywords whose required literals are all on the page are confirmed with their
+    pattern, so results are identical to `utils.words_exist_in_text`.
+
+    Attributes:
+        violation_types: the violation types the engine was built from, keyed by name
+        excluded_keywords: the keywords that rule out a page entirely
+    """
+
+    def __init__(
+        self,
+        violation_types: list[ViolationType],
+        excluded_keywords: list[str] = GLOBAL_EXCLUDED_KEYWORDS,
+    ):
+        self.violation_types = {vt.name: vt for vt in violation_types}
+        self.excluded_keywords = list(excluded_keywords)
+
+        self._type_keywords = {
+            vt.name: [_CompiledKeyword(keyword) for keyword in vt.keywords]
+            for vt in violation_types
+        }
+        self._excluded_keywords = [
+            _CompiledKeyword(keyword) for keyword in self.excluded_keywords
+        ]
+
+    def scan_page(self, page_text: str, page_no: int = 0) -> PageMatch:
+        """Returns the violation types and excluded keywords found on a single page."""
+
+        with metrics.span("prefilter_page_seconds"):
+            folded_text = fold_page_text(page_text)
+            page_match = PageMatch(
+                page_no=page_no,
+                matched_types={
+                    name
+                    for name, keywords in self._type_keywords.items()
+                    if any(
+                        keyword.search(page_text, folded_text) for keyword in keywords
+                    )
+                },
+                excluded_keywords=[
+                    keyword.keyword
+                    for keyword in self._excluded_keywords
+                    if keyword.search(page_text, folded_text)
+                ],
+            )
+
+        for name in page_match.matched_types:
+            metrics.count(f"prefilter_hits.{name}")
+        if page_match.is_excluded:
+            metrics.count("prefilter_excluded_pages")
+        return page_match
+
+    def scan_pages(self, pages: Iterable[str]) -> list[PageMatch]:
+        """Returns the page x violation type match matrix for a claim, one row per page."""
+        return [
+            self.scan_page(page_text, page_no)
+            for page_no, page_text in enumerate(pages, 1)
+        ]
+
+    def match_spans(
+        self, page_text: str, type_names: Iterable[str]
+    ) -> list[tuple[int, int]]:
+        """Returns the (start, end) positions of every keyword hit of the given types."""
+
+        return sorted(
+            match.span()
+            for name in type_names
+            for keyword in self._type_keywords.get(name, [])
+            for match in keyword.pattern.finditer(page_text)
+        )
+
+    def extract_snippets(
+        self, page_text: str, type_names: Iterable[str], width: int
+    ) -> str:
+        """Cuts the page down to merged windows of width characters around the keyword hits.
+
+        A long hit gets windows around its start and its end. Returns the full page if there
+        are no hits.
+        """
+
+        windows: list[tuple[int, int]] = []
+        for start, end in self.match_spans(page_text, type_names):
+            if end - start > 2 * width:
+                windows.append((start - width, start + width))
+                windows.append((end - width, end + width))
+            else:
+                windows.append((start - width, end + width))
+
+        if not windows:
+            return page_text
+
+        merged: list[list[int]] = []
+        for start, end in sorted(windows):
+            start, end = max(start, 0), min(end, len(page_text))
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        return SNIPPET_SEPARATOR.join(page_text[start:end] for start, end in merged)
+
+
+_DEFAULT_ENGINE: Optional[PrefilterEngine] = None
+
+
+def get_prefilter_engine() -> PrefilterEngine:
+    """Returns the process-wide engine built from all violation types in constants."""
+
+    global _DEFAULT_ENGINE
+
+    if _DEFAULT_ENGINE is None:
+        _DEFAULT_ENGINE = PrefilterEngine(ALL_VIOLATION_TYPES)
+    return _DEFAULT_ENGINE
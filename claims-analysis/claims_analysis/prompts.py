@@ -0,0 +1,36 @@
+from claims_analysis.constants import YES_DELIMITER, ExtendedCoverage, ViolationType
+
+
+def parse_extended_coverage(coverage: str) -> ExtendedCoverage:
+    """Looks up an extended coverage by name, e.g. CoverageH, or by its value."""
+
+    if coverage in ExtendedCoverage.__members__:
+        return ExtendedCoverage[coverage]
+    return ExtendedCoverage(coverage)
+
+
+def filter_violation_types(
+    violation_types: list[ViolationType], extended_coverages: list[ExtendedCoverage]
+) -> list[ViolationType]:
+    """Remove the violation types that the extended coverages cover."""
+    return [
+        violation_type
+        for violation_type in violation_types
+        if violation_type.extended_coverage not in extended_coverages
+    ]
+
+
+def combined_description(violation_type: ViolationType) -> str:
+    """The labelled line describing a violation type in the combined prompt."""
+    return f"{violation_type.name}: {violation_type.prompt_desc}"
+
+
+def render_system_prompt(template: str, violation_descriptions: list[str]) -> str:
+    """Fills in a system prompt template with one bullet per violation description."""
+
+    return template.format(
+        violation_descriptions="".join(
+            "- " + description + "\n" for description in violation_descriptions
+        ),
+        yes_delimiter=YES_DELIMITER,
+    )
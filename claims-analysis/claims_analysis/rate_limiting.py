@@ -0,0 +1,486 @@
+import logging
+import random
+import threading
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from time import monotonic, sleep
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ContextManager,
+    Optional,
+    Sequence,
+    TypeVar,
+)
+
+from claims_analysis import metrics
+from claims_analysis.constants import (
+    CHARS_PER_TOKEN,
+    COMPLETION_TOKENS_ESTIMATE,
+    CONCURRENCY_BACKOFF_RATIO,
+    CONCURRENCY_CEILING,
+    CONCURRENCY_FLOOR,
+    CONCURRENCY_LATENCY_TOLERANCE,
+    CONCURRENCY_MAX_ERROR_RATE,
+    REQUEST_MAX_RETRIES,
+    REQUESTS_PER_MINUTE,
+    RETRY_BASE_BACKOFF,
+    RETRY_MAX_BACKOFF,
+    TOKENS_PER_MINUTE,
+)
+
+if TYPE_CHECKING:
+    from langchain.schema import BaseMessage
+
+T = TypeVar("T")
+
+
+@lru_cache(maxsize=None)
+def rate_limit_errors() -> tuple[type[Exception], ...]:
+    """The openai exceptions of a 429; openai is imported on first use, not with the module."""
+
+    import openai
+
+    # openai < 1.0 keeps its exceptions in openai.error, later versions at the top level
+    return (getattr(openai, "error", openai).RateLimitError,)
+
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> tuple[type[Exception], ...]:
+    """The openai exceptions of requests worth retrying, including rate_limit_errors."""
+
+    import openai
+
+    error_module = getattr(openai, "error", openai)
+    return rate_limit_errors() + tuple(
+        getattr(error_module, name)
+        for name in [
+            "APIError",
+            "APIConnectionError",
+            "ServiceUnavailableError",
+            "Timeout",
+            "APITimeoutError",
+        ]
+        if hasattr(error_module, name)
+    )
+
+
+def estimate_prompt_tokens(messages: Sequence["BaseMessage"]) -> int:
+    """Estimates the prompt tokens of a request from its text length."""
+
+    prompt_chars = sum(len(message.content) for message in messages)
+    return prompt_chars // CHARS_PER_TOKEN
+
+
+def estimate_tokens(messages: Sequence["BaseMessage"]) -> int:
+    """Estimates prompt plus completion tokens of a request from its text length."""
+    return estimate_prompt_tokens(messages) + COMPLETION_TOKENS_ESTIMATE
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate.
+
+    Callers reserve capacity up front and are told how long to wait for it, so requests
+    are spread evenly at the configured rate instead of bursting and then stalling.
+    """
+
+    def __init__(self, rate_per_minute: float, burst_seconds: float = 1.0):
+        self.rate = rate_per_minute / 60
+        self.capacity = self.rate * burst_seconds
+        self._level = self.capacity
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Takes amount from the bucket and returns the seconds to wait before using it."""
+
+        with self._lock:
+            now = monotonic()
+            self._level = min(
+                self.capacity, self._level + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._level -= amount
+            return max(0.0, -self._level / self.rate)
+
+
+@dataclass
+class SchedulerStats:
+    """Counters for the requests sent through a RequestScheduler."""
+
+    attempts: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    failures: int = 0
+    estimated_tokens: int = 0
+    queue_wait_seconds: float = 0
+    service_seconds: float = 0
+
+
+@dataclass
+class ConcurrencyDecision:
+    """A change of the in-flight limit made by an AdaptiveConcurrencyLimiter.
+
+    Attributes:
+        elapsed_seconds: seconds since the limiter was created
+        previous_limit: limit before the decision
+        limit: limit after the decision
+        reason: "increase", "rate_limited", "errors" or "latency"
+        mean_latency_seconds: mean call latency of the window the decision was based on
+        error_rate: fraction of failed calls in that window
+    """
+
+    elapsed_seconds: float
+    previous_limit: int
+    limit: int
+    reason: str
+    mean_latency_seconds: float
+    error_rate: float
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limits the model calls in flight, adjusting the limit with AIMD from observed calls.
+
+    Every `limit` completed calls, the limit rises by one, or is multiplied by
+    CONCURRENCY_BACKOFF_RATIO after failures or rising latency; a 429 backs off right away.
+
+    Attributes:
+        floor: lowest limit
+        ceiling: highest limit, and the number of workers the call pools are sized for
+        limit: current number of calls allowed in flight
+        history: every change of the limit, oldest first
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        floor: int = CONCURRENCY_FLOOR,
+        ceiling: int = CONCURRENCY_CEILING,
+    ):
+        if not 1 <= floor <= ceiling:
+            raise ValueError(f"Invalid concurrency range {floor}-{ceiling}")
+        self.floor = floor
+        self.ceiling = ceiling
+        self.limit = min(max(initial, floor), ceiling)
+        self.history: list[ConcurrencyDecision] = []
+
+        self._started_at = monotonic()
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        # Completions still expected from calls sent before the last decrease
+        self._cooldown = 0
+        # Lowest window latency, drifting up slowly so a permanently slower API is accepted
+        self._baseline_latency: Optional[float] = None
+        self._reset_window()
+
+    def _reset_window(self) -> None:
+        self._window_calls = 0
+        self._window_errors = 0
+        self._window_latency = 0.0
+
+    def acquire(self) -> None:
+        """Blocks until fewer than `limit` calls are in flight and takes a slot."""
+
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, latency: float, error: Optional[Exception] = None) -> None:
+        """Frees a slot and feeds the outcome of its call into the limit.
+
+        Args:
+            latency: service time of the call in seconds
+            error: the retryable error the call failed with, None if it succeeded
+        """
+
+        with self._condition:
+            self._in_flight -= 1
+            self._window_calls += 1
+            self._window_errors += error is not None
+            self._window_latency += latency
+            self._cooldown = max(self._cooldown - 1, 0)
+
+            if isinstance(error, rate_limit_errors()):
+                if not self._cooldown:
+                    self._decrease("rate_limited")
+            elif self._window_calls >= self.limit:
+                self._evaluate_window()
+            self._condition.notify_all()
+
+    def slot(self) -> ContextManager:
+        """Holds a slot for the with block, timing it and reporting retryable errors."""
+        return _LimiterSlot(self)
+
+    def _evaluate_window(self) -> None:
+        mean_latency = self._window_latency / self._window_calls
+        error_rate = self._window_errors / self._window_calls
+
+        if error_rate > CONCURRENCY_MAX_ERROR_RATE:
+            self._decrease("errors")
+        elif (
+            self._baseline_latency is not None
+            and mean_latency > CONCURRENCY_LATENCY_TOLERANCE * self._baseline_latency
+        ):
+            self._decrease("latency")
+        else:
+            self._change(min(self.limit + 1, self.ceiling), "increase")
+
+        if not error_rate:
+            self._baseline_latency = (
+                mean_latency
+                if self._baseline_latency is None
+                else min(
+                    mean_latency, 0.9 * self._baseline_latency + 0.1 * mean_latency
+                )
+            )
+        self._reset_window()
+
+    def _decrease(self, reason: str) -> None:
+        self._change(
+            max(int(self.limit * CONCURRENCY_BACKOFF_RATIO), self.floor), reason
+        )
+        self._cooldown = self._in_flight
+        self._reset_window()
+
+    def _change(self, limit: int, reason: str) -> None:
+        if limit == self.limit:
+            return
+        calls = max(self._window_calls, 1)
+        self.history.append(
+            ConcurrencyDecision(
+                elapsed_seconds=monotonic() - self._started_at,
+                previous_limit=self.limit,
+                limit=limit,
+                reason=reason,
+                mean_latency_seconds=self._window_latency / calls,
+                error_rate=self._window_errors / calls,
+            )
+        )
+        self.limit = limit
+        metrics.count(f"concurrency_decisions.{reason}")
+        metrics.observe("concurrency_limit", limit)
+
+    def summary(self) -> dict[str, Any]:
+        """Returns the range, current limit and decision history, for the run metrics."""
+
+        with self._condition:
+            return {
+                "mode": "adaptive",
+                "floor": self.floor,
+                "ceiling": self.ceiling,
+                "limit": self.limit,
+                "decisions": [asdict(decision) for decision in self.history],
+            }
+
+    def log_stats(self) -> None:
+        """Logs the final limit and how often it was raised and lowered."""
+
+        reasons: dict[str, int] = {}
+        for decision in self.history:
+            reasons[decision.reason] = reasons.get(decision.reason, 0) + 1
+        logging.info(
+            f"Adaptive concurrency: limit {self.limit} in [{self.floor}, {self.ceiling}] "
+            f"after {len(self.history)} changes {dict(sorted(reasons.items()))}"
+        )
+
+
+class _LimiterSlot:
+    """Context manager holding a slot of an AdaptiveConcurrencyLimiter."""
+
+    __slots__ = ("_limiter", "_started_at")
+
+    def __init__(self, limiter: AdaptiveConcurrencyLimiter):
+        self._limiter = limiter
+
+    def __enter__(self) -> "_LimiterSlot":
+        self._limiter.acquire()
+        self._started_at = monotonic()
+        return self
+
+    def __exit__(self, exc_type: Any, error: Any, traceback: Any) -> None:
+        # Only API errors say something about the load; anything else counts as a call
+        self._limiter.release(
+            monotonic() - self._started_at,
+            error if isinstance(error, retryable_errors()) else None,
+        )
+
+
+class RequestScheduler:
+    """Sends model requests under requests-per-minute and tokens-per-minute budgets.
+
+    Retryable errors are retried with jittered exponential backoff, and a 429 pauses every
+    request.
+
+    Attributes:
+        max_retries: number of times a failing request is retried before giving up
+        concurrency_limiter: adaptive limit of requests in flight, None for the fixed pools
+        stats: counters for the requests sent so far, keyed by the label of the call site
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = TOKENS_PER_MINUTE,
+        max_retries: int = REQUEST_MAX_RETRIES,
+        base_backoff: float = RETRY_BASE_BACKOFF,
+        max_backoff: float = RETRY_MAX_BACKOFF,
+        concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+    ):
+        self.max_retries = max_retries
+        self.concurrency_limiter = concurrency_limiter
+        self.stats: dict[str, SchedulerStats] = {}
+
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._base_backoff = base_backoff
+        self._max_backoff = max_backoff
+        self._pause_until = 0.0
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt."""
+        return random.uniform(
+            0, min(self._max_backoff, self._base_backoff * 2**attempt)
+        )
+
+    def call(
+        self,
+        func: Callable[[list["BaseMessage"]], T],
+        messages: list["BaseMessage"],
+        label: str = "request",
+    ) -> T:
+        """Sends the messages with func (usually a chat model) within the rate limits.
+
+        Args:
+            func: callable sending the messages, usually a chat model
+            messages: the messages of the request
+            label: name of the call site that the request is counted under in stats
+        """
+
+        tokens = estimate_tokens(messages)
+
+        limiter = self.concurrency_limiter
+
+        for attempt in range(self.max_retries + 1):
+            queued_at = monotonic()
+            wait = max(
+                self._requests.reserve(1),
+                self._tokens.reserve(tokens),
+                self._pause_until - queued_at,
+            )
+            if wait > 0:
+                sleep(wait)
+
+            # Waiting for an adaptive concurrency slot counts as queue wait
+            slot = limiter.slot() if limiter is not None else nullcontext()
+            try:
+                with slot:
+                    started_at = monotonic()
+                    result = func(messages)
+            except retryable_errors() as error:
+                self._record(label, queued_at, started_at, tokens, error=error)
+                if attempt == self.max_retries:
+                    with self._lock:
+                        self.stats[label].failures += 1
+                    raise
+
+                backoff = self._backoff(attempt)
+                logging.warning(
+                    f"Request failed with {type(error).__name__}, retrying in {backoff:.1f}s "
+                    f"(attempt {attempt + 1} of {self.max_retries})"
+                )
+                if isinstance(error, rate_limit_errors()):
+                    with self._lock:
+                        self._pause_until = max(
+                            self._pause_until, monotonic() + backoff
+                        )
+                else:
+                    sleep(backoff)
+                continue
+
+            self._record(label, queued_at, started_at, tokens)
+            metrics.observe(f"{label}_prompt_tokens", estimate_prompt_tokens(messages))
+            metrics.observe(
+                f"{label}_completion_tokens",
+                len(getattr(result, "content", "")) // CHARS_PER_TOKEN,
+            )
+            return result
+
+        raise AssertionError("unreachable")
+
+    def _record(
+        self,
+        label: str,
+        queued_at: float,
+        started_at: float,
+        tokens: int,
+        error: Optional[Exception] = None,
+    ) -> None:
+        queue_wait = started_at - queued_at
+        service = monotonic() - started_at
+        metrics.observe(f"{label}_queue_wait_seconds", queue_wait)
+        metrics.observe(f"{label}_latency_seconds", service)
+
+        with self._lock:
+            stats = self.stats.setdefault(label, SchedulerStats())
+            stats.attempts += 1
+            stats.estimated_tokens += tokens
+            stats.queue_wait_seconds += queue_wait
+            stats.service_seconds += service
+            if error is not None:
+                stats.errors += 1
+                metrics.count(f"{label}_errors")
+                if isinstance(error, rate_limit_errors()):
+                    stats.rate_limited += 1
+                    metrics.count(f"{label}_rate_limited")
+
+    def log_stats(self) -> None:
+        """Logs request counts, tokens per call and queue wait vs service time per label."""
+
+        for label, stats in self.stats.items():
+            attempts = max(stats.attempts, 1)
+            logging.info(
+                f"Request scheduler [{label}]: {stats.attempts} attempts, {stats.errors} "
+                f"errors ({stats.rate_limited} rate limited), {stats.failures} failed "
+                f"after retries, ~{stats.estimated_tokens / attempts:.0f} tokens per call. "
+                f"Mean queue wait {stats.queue_wait_seconds / attempts:.2f}s, mean call "
+                f"latency {stats.service_seconds / attempts:.2f}s"
+            )
+
+
+_ACTIVE_SCHEDULER: Optional[RequestScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def configure_request_scheduler(
+    requests_per_minute: float = REQUESTS_PER_MINUTE,
+    tokens_per_minute: float = TOKENS_PER_MINUTE,
+    max_retries: int = REQUEST_MAX_RETRIES,
+    concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+) -> RequestScheduler:
+    """Replaces the process-wide scheduler with one using the given limits."""
+
+    global _ACTIVE_SCHEDULER
+
+    with _SCHEDULER_LOCK:
+        _ACTIVE_SCHEDULER = RequestScheduler(
+            requests_per_minute,
+            tokens_per_minute,
+            max_retries,
+            concurrency_limiter=concurrency_limiter,
+        )
+        return _ACTIVE_SCHEDULER
+
+
+def get_request_scheduler() -> RequestScheduler:
+    """Returns the process-wide scheduler, creating one with the default limits if needed."""
+
+    global _ACTIVE_SCHEDULER
+
+    with _SCHEDULER_LOCK:
+        if _ACTIVE_SCHEDULER is None:
+            _ACTIVE_SCHEDULER = RequestScheduler()
+        return _ACTIVE_SCHEDULER
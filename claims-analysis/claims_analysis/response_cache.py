@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from time import time
+from typing import Optional
+
+from claims_analysis import metrics
+from claims_analysis.constants import (
+    RESPONSE_CACHE_ACCESS_BATCH,
+    RESPONSE_CACHE_MAX_BYTES,
+)
+
+
+def make_cache_key(
+    sys_message: str, page_text: str, model_name: str, temperature: float
+) -> str:
+    """Content hash identifying a single classification request."""
+
+    hasher = hashlib.sha256()
+    for part in [sys_message, page_text, model_name, repr(float(temperature))]:
+        encoded = part.encode("utf-8")
+        # Length-prefix each part so that the boundaries between parts are unambiguous
+        hasher.update(len(encoded).to_bytes(8, "little"))
+        hasher.update(encoded)
+    return hasher.hexdigest()
+
+
+class ResponseCache:
+    """On-disk cache of raw model responses backed by SQLite, with LRU eviction by size.
+
+    Safe to share between threads. Access times of hits are written in batches of
+    RESPONSE_CACHE_ACCESS_BATCH.
+
+    Attributes:
+        path: path to the SQLite database file
+        max_bytes: total size of cached responses above which the least recently used
+            entries are evicted
+        hits: number of lookups answered from the cache
+        misses: number of lookups that had to go to the API
+    """
+
+    def __init__(self, path: str, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        if cache_dir := os.path.dirname(path):
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # key -> last access time of hits not yet written to the database
+        self._pending_access: dict[str, float] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._conn.commit()
+        self._size_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached response for the key, or None if it isn't cached."""
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.count("response_cache_misses")
+                return None
+
+            self.hits += 1
+            metrics.count("response_cache_hits")
+            self._pending_access[key] = time()
+            if len(self._pending_access) >= RESPONSE_CACHE_ACCESS_BATCH:
+                self._flush_access()
+                self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """Stores a response and evicts least recently used entries if over max_bytes."""
+
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            old_row = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, response, size, time()),
+            )
+            self._size_bytes += size - (old_row[0] if old_row else 0)
+            self._pending_access.pop(key, None)
+            # Eviction order has to see the latest hits
+            self._flush_access()
+            self._evict()
+            self._conn.commit()
+
+    def _flush_access(self) -> None:
+        """Writes the batched access times of hits, without committing."""
+
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._pending_access.items()],
+            )
+            self._pending_access.clear()
+
+    def _evict(self) -> None:
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+
+        while self._size_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._size_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._size_bytes -= size
+
+    def log_stats(self) -> None:
+        """Logs the hit / miss counters for the run."""
+
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0
+        logging.info(
+            f"Response cache {self.path}: {self.hits} hits, {self.misses} misses "
+            f"({hit_rate:.0%} hit rate), {self._size_bytes / 1e6:.1f}MB cached"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
+
+
+# Cache used by PageProcessor.process_page; None disables caching
+_ACTIVE_CACHE: Optional[ResponseCache] = None
+
+
+def configure_response_cache(path: Optional[str]) -> Optional[ResponseCache]:
+    """Opens the cache at path and makes it the active cache; a path of None disables caching."""
+
+    global _ACTIVE_CACHE
+
+    if _ACTIVE_CACHE is not None:
+        _ACTIVE_CACHE.close()
+    _ACTIVE_CACHE = ResponseCache(path) if path is not None else None
+    return _ACTIVE_CACHE
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Returns the active cache, or None if caching is disabled."""
+    return _ACTIVE_CACHE
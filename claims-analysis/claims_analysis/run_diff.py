@@ -0,0 +1,68 @@
+import logging
+
+import pandas as pd
+
+from claims_analysis.outputs import read_violations
+
+# Columns identifying a flagged page across runs
+_PAGE_KEY = ["filepath", "page_no"]
+
+
+def diff_violations(base_path: str, other_path: str) -> pd.DataFrame:
+    """Compares the flagged pages of two runs, e.g. a full-page run and a snippet run.
+
+    Args:
+        base_path: _violations.csv or _violations.parquet of the reference run
+        other_path: violations file of the run being compared against it
+
+    Returns:
+        one row per (filepath, page_no) flagged in either run, with the issue descriptions
+        of each run joined by " | " and a `status` of "both", "base_only" or "other_only"
+    """
+
+    def flagged_pages(path: str) -> pd.DataFrame:
+        violations = read_violations(path)
+        return (
+            violations.groupby(_PAGE_KEY)["issue_desc"]
+            .agg(lambda descs: " | ".join(map(str, descs)))
+            .reset_index()
+        )
+
+    diff = flagged_pages(base_path).merge(
+        flagged_pages(other_path),
+        on=_PAGE_KEY,
+        how="outer",
+        suffixes=("_base", "_other"),
+        indicator="status",
+    )
+    diff["status"] = diff["status"].map(
+        {"both": "both", "left_only": "base_only", "right_only": "other_only"}
+    )
+    return diff.sort_values(_PAGE_KEY).reset_index(drop=True)
+
+
+def log_diff_summary(diff: pd.DataFrame) -> None:
+    """Logs how many flagged pages the runs agree on, overall and per claim."""
+
+    counts = diff["status"].value_counts()
+    both, base_only, other_only = (
+        counts.get(status, 0) for status in ["both", "base_only", "other_only"]
+    )
+    base_total = both + base_only
+    other_total = both + other_only
+    logging.info(
+        f"Flagged pages: {base_total} in base, {other_total} in other, {both} in both. "
+        f"Other run recovers {both / base_total if base_total else 1:.0%} of base pages; "
+        f"{other_only} pages are only flagged by the other run."
+    )
+
+    per_claim = diff.pivot_table(
+        index="filepath", columns="status", values="page_no", aggfunc="count"
+    ).fillna(0)
+    for filepath, row in per_claim.iterrows():
+        if row.get("base_only", 0) or row.get("other_only", 0):
+            logging.info(
+                f"{filepath}: {int(row.get('both', 0))} both, "
+                f"{int(row.get('base_only', 0))} base only, "
+                f"{int(row.get('other_only', 0))} other only"
+            )
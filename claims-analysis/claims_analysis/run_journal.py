@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Optional
+
+# Version of the journal record layout, checked when resuming
+JOURNAL_VERSION = 1
+
+
+def read_journal(path: str) -> list[dict[str, Any]]:
+    """Returns the complete records of a journal, starting with the run record.
+
+    A half written last record, e.g. of a run that is still going or crashed, is ignored.
+    """
+
+    with open(path, "rb") as f:
+        data = f.read()
+    complete = data.rfind(b"\n") + 1
+    return [json.loads(line) for line in data[:complete].decode("utf-8").splitlines()]
+
+
+class RunJournal:
+    """Append-only checkpoint journal of a run, one JSON record per line.
+
+    A record describing the run is followed by `page` and `claim` records as they complete,
+    which a resumed run replays. The journal is only needed until the run finishes, see close.
+
+    Attributes:
+        path: path of the journal file
+        claim_paths: the claims of the run in output order, as recorded when it started
+    """
+
+    def __init__(
+        self,
+        path: str,
+        run_id: str,
+        settings: dict[str, Any],
+        claim_paths: list[str],
+        resume: bool = False,
+    ):
+        """Starts a new journal at path, or reopens it to resume the run.
+
+        Args:
+            path: path of the journal file
+            run_id: id of the run
+            settings: run settings that affect the results; resuming with different settings
+                raises a ValueError since journaled verdicts would not match the new settings
+            claim_paths: the claims of the run; when resuming, an empty list resumes with the
+                claims the run was started with
+            resume: if True and the journal exists, completed work is loaded from it
+        """
+        self.path = path
+        self.claim_paths = claim_paths
+
+        self._lock = threading.Lock()
+        self._page_findings: dict[tuple[str, str, int], list[tuple[str, str]]] = {}
+        self._claims: dict[str, dict[str, Any]] = {}
+
+        if (
+            resume
+            and os.path.exists(path)
+            and self._load(run_id, settings, claim_paths)
+        ):
+            self._file = open(path, "a")
+            logging.info(
+                f"Resuming run {run_id} from {path}: {len(self._claims)} claims and "
+                f"{len(self._page_findings)} page verdicts already completed"
+            )
+        else:
+            self._file = open(path, "w")
+            self._append(
+                {
+                    "type": "run",
+                    "version": JOURNAL_VERSION,
+                    "run_id": run_id,
+                    "settings": settings,
+                    "claim_paths": claim_paths,
+                }
+            )
+
+    def _load(
+        self, run_id: str, settings: dict[str, Any], claim_paths: list[str]
+    ) -> bool:
+        """Loads the completed work from the journal; returns False if it has no header."""
+
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            # A crash can leave the last record half written; drop it before appending
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                logging.warning(f"Dropping truncated last record of {self.path}")
+                f.truncate(complete)
+        records = read_journal(self.path)
+        if not records:
+            return False
+
+        header = records[0]
+        if header.get("version") != JOURNAL_VERSION or header["run_id"] != run_id:
+            raise ValueError(f"{self.path} is not a journal of run {run_id}")
+        if header["settings"] != settings:
+            raise ValueError(
+                f"Can't resume run {run_id} with different settings: journal has "
+                f"{header['settings']}, got {settings}"
+            )
+        if claim_paths and claim_paths != header["claim_paths"]:
+            raise ValueError(f"Can't resume run {run_id} with different claims")
+        self.claim_paths = header["claim_paths"]
+
+        for record in records[1:]:
+            if record["type"] == "page":
+                key = (record["claim"], record["processor"], record["page_no"])
+                self._page_findings[key] = [
+                    tuple(finding) for finding in record["reasons"]
+                ]
+            elif record["type"] == "claim":
+                self._claims[record["claim"]] = record
+        return True
+
+    def _append(self, record: dict[str, Any]) -> None:
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def page_findings(
+        self, claim_path: str, processor_key: str, page_no: int
+    ) -> Optional[list[tuple[str, str]]]:
+        """Returns the journaled (type, reason) findings of a page, or None if not completed."""
+        return self._page_findings.get((claim_path, processor_key, page_no))
+
+    def record_page(
+        self,
+        claim_path: str,
+        processor_key: str,
+        page_no: int,
+        findings: list[tuple[str, str]],
+    ) -> None:
+        """Appends the verdict of a page for one processor."""
+
+        self._append(
+            {
+                "type": "page",
+                "claim": claim_path,
+                "processor": processor_key,
+                "page_no": page_no,
+                "reasons": findings,
+            }
+        )
+
+    def completed_claim(self, claim_path: str) -> Optional[dict[str, Any]]:
+        """Returns the journaled `violations` and `summary` rows of a completed claim, if any."""
+        return self._claims.get(claim_path)
+
+    def record_claim(
+        self,
+        claim_path: str,
+        violations: list[dict[str, Any]],
+        summary: dict[str, Any],
+    ) -> None:
+        """Appends a completed claim with its violation rows and summary row."""
+
+        record = {
+            "type": "claim",
+            "claim": claim_path,
+            "violations": violations,
+            "summary": summary,
+        }
+        self._append(record)
+        self._claims[claim_path] = record
+
+    def close(self, remove: bool = False) -> None:
+        """Closes the journal; remove deletes it, e.g. once the run has finished cleanly."""
+
+        self._file.close()
+        if remove:
+            os.remove(self.path)
+
+
+_ACTIVE_JOURNAL: Optional[RunJournal] = None
+
+
+def configure_run_journal(journal: Optional[RunJournal]) -> Optional[RunJournal]:
+    """Makes journal the active journal of the run; None disables journaling."""
+
+    global _ACTIVE_JOURNAL
+
+    _ACTIVE_JOURNAL = journal
+    return _ACTIVE_JOURNAL
+
+
+def get_run_journal() -> Optional[RunJournal]:
+    """Returns the active journal, or None if journaling is disabled."""
+    return _ACTIVE_JOURNAL
@@ -1,10 +1,15 @@
+import logging
 from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-from langchain.chat_models import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
-
+from claims_analysis import metrics
 from claims_analysis.constants import SUMMARIZATION_PROMPT
-from claims_analysis.page_processing import Violation
+from claims_analysis.page_processing import Violation, new_chat_model
+from claims_analysis.rate_limiting import get_request_scheduler
+
+if TYPE_CHECKING:
+    from langchain.chat_models import ChatOpenAI
 
 
 @dataclass
@@ -18,6 +23,16 @@ class ClaimSummary:
     summary: str
 
 
+@lru_cache(maxsize=None)
+def _get_summarization_chat(temperature: float) -> "ChatOpenAI":
+    """Model client for summaries, built once per temperature and shared by all claims."""
+
+    # Retries are handled by the request scheduler, which can see the rate limits
+    return new_chat_model(
+        temperature=temperature, model_name="gpt-3.5-turbo", client=None, max_retries=1
+    )
+
+
 def summarize_results(violations: list[Violation], temperature: float = 0) -> str:
     """Given page level results, create a summary of the potential reasons for policy violation."""
 
@@ -28,11 +43,36 @@ def summarize_results(violations: list[Violation], temperature: float = 0) -> st
     ]
     violations_str = "Potential violations: [" + ", ".join(simplified_violations) + "]"
 
+    from langchain.schema import HumanMessage, SystemMessage
+
     # Send to API for summary
-    chat = ChatOpenAI(temperature=temperature, model_name="gpt-3.5-turbo", client=None)
+    chat = _get_summarization_chat(temperature)
     messages = [
         SystemMessage(content=SUMMARIZATION_PROMPT),
         HumanMessage(content=violations_str),
     ]
 
-    return chat(messages).content
+    return get_request_scheduler().call(chat, messages, label="summarization").content
+
+
+def summarize_claim(
+    claim_path: str, violations: list[Violation], pages_total: int, pages_processed: int
+) -> ClaimSummary:
+    """Builds the summary of a claim, only calling the LLM if violations were found."""
+
+    with metrics.span("summarization_seconds"):
+        summary_text = (
+            summarize_results(violations)
+            if len(violations) > 0
+            else "No violations found."
+        )
+
+    logging.info(f"Summary for {claim_path}:\n{summary_text}")
+
+    return ClaimSummary(
+        filepath=claim_path,
+        pages_total=pages_total,
+        pages_processed=pages_processed,
+        pages_flagged=len(violations),
+        summary=summary_text,
+    )
@@ -0,0 +1,281 @@
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import struct
+import threading
+from typing import Iterable, Iterator, Optional
+
+from pypdf import PdfReader
+
+from claims_analysis import metrics
+from claims_analysis.utils import iter_pdf_pages
+
+# File layout: magic, page count N, N + 1 offsets into the data section, then the
+# utf-8 text of every page back to back. Page i is data[offsets[i]:offsets[i + 1]].
+_MAGIC = b"CLMTXT01"
+_COUNT_FORMAT = "<I"
+_OFFSET_FORMAT = "<Q"
+_HEADER_SIZE = len(_MAGIC) + struct.calcsize(_COUNT_FORMAT)
+_OFFSET_SIZE = struct.calcsize(_OFFSET_FORMAT)
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """Returns the sha256 hex digest of a file's contents."""
+
+    hasher = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class StoredClaimText:
+    """Memory-mapped page text of a single claim; pages are decoded only when read."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[: len(_MAGIC)] != _MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a page text file")
+
+        (self._num_pages,) = struct.unpack_from(_COUNT_FORMAT, self._mmap, len(_MAGIC))
+        self._data_start = _HEADER_SIZE + (self._num_pages + 1) * _OFFSET_SIZE
+
+    def __len__(self) -> int:
+        return self._num_pages
+
+    def _offset(self, idx: int) -> int:
+        return struct.unpack_from(
+            _OFFSET_FORMAT, self._mmap, _HEADER_SIZE + idx * _OFFSET_SIZE
+        )[0]
+
+    def page(self, page_no: int) -> str:
+        """Returns the text of a single page, numbered from 1."""
+
+        if not 1 <= page_no <= self._num_pages:
+            raise IndexError(f"Page {page_no} out of range 1-{self._num_pages}")
+        start = self._data_start + self._offset(page_no - 1)
+        stop = self._data_start + self._offset(page_no)
+        return self._mmap[start:stop].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for page_no in range(1, self._num_pages + 1):
+            yield self.page(page_no)
+
+    def close(self) -> None:
+        self._mmap.close()
+        self._file.close()
+
+
+class ClaimTextWriter:
+    """Writes a page text file one page at a time.
+
+    The header needs the offsets of all pages, so page text is spooled to a temporary data
+    file as it arrives and only the offsets are kept in memory. commit writes the header and
+    appends the spooled text, then replaces any existing file at path atomically.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._data_path = self._tmp_path + ".data"
+        self._data = open(self._data_path, "wb")
+        self._offsets = [0]
+
+    def add(self, page: str) -> None:
+        encoded = page.encode("utf-8")
+        self._data.write(encoded)
+        self._offsets.append(self._offsets[-1] + len(encoded))
+
+    def commit(self) -> None:
+        self._data.close()
+        with open(self._tmp_path, "wb") as file:
+            file.write(_MAGIC)
+            file.write(struct.pack(_COUNT_FORMAT, len(self._offsets) - 1))
+            file.write(struct.pack(f"<{len(self._offsets)}Q", *self._offsets))
+            with open(self._data_path, "rb") as data:
+                shutil.copyfileobj(data, file)
+        os.remove(self._data_path)
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Discards the pages written so far."""
+
+        self._data.close()
+        os.remove(self._data_path)
+
+
+def write_claim_text(path: str, pages: Iterable[str]) -> None:
+    """Writes the pages to path in the page text format, replacing any existing file atomically."""
+
+    writer = ClaimTextWriter(path)
+    try:
+        for page in pages:
+            writer.add(page)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+
+
+class PageTextStore:
+    """Directory of extracted claim text, one file per PDF keyed by the PDF's content hash.
+
+    Safe to share between threads.
+
+    Attributes:
+        store_dir: folder holding the page text files
+        hits: number of claims read from the store
+        misses: number of claims that had to be extracted from the PDF
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _entry_path(self, content_hash: str) -> str:
+        return os.path.join(self.store_dir, content_hash + ".pages")
+
+    def contains(self, pdf_path: str) -> bool:
+        """True if the text of the PDF is already in the store."""
+        return os.path.exists(self._entry_path(hash_file(pdf_path)))
+
+    def get(self, pdf_path: str) -> Optional[StoredClaimText]:
+        """Returns the stored text for the PDF, or None if it hasn't been extracted yet."""
+        return self.get_by_hash(hash_file(pdf_path))
+
+    def get_by_hash(self, content_hash: str) -> Optional[StoredClaimText]:
+        """Returns the stored text of the PDF with the given content hash, if any."""
+
+        entry_path = self._entry_path(content_hash)
+        if not os.path.exists(entry_path):
+            return None
+        return StoredClaimText(entry_path)
+
+    def put(self, pdf_path: str, pages: Iterable[str]) -> None:
+        """Saves the extracted pages of the PDF."""
+        write_claim_text(self._entry_path(hash_file(pdf_path)), pages)
+
+    def iter_pages(
+        self, pdf_path: str, workers: int = 1, window_pages: Optional[int] = None
+    ) -> Iterator[str]:
+        """Yields the pages of the PDF from the store, extracting and storing them on a miss.
+
+        Pages extracted on a miss are written to the store as they are yielded, so a claim is
+        never held in memory as a whole.
+
+        Args:
+            pdf_path: path to the claim PDF file
+            workers: number of extraction processes used on a miss, see utils.iter_pdf_pages
+            window_pages: extraction window used on a miss, see utils.iter_pdf_pages
+        """
+
+        content_hash = hash_file(pdf_path)
+        entry_path = self._entry_path(content_hash)
+
+        if os.path.exists(entry_path):
+            with self._lock:
+                self.hits += 1
+            metrics.count("text_store_hits")
+            logging.info(f"Reading {pdf_path} from page text store")
+            stored = StoredClaimText(entry_path)
+            try:
+                yield from metrics.timed_iter("text_store_page_seconds", stored)
+            finally:
+                stored.close()
+            return
+
+        with self._lock:
+            self.misses += 1
+        metrics.count("text_store_misses")
+        writer = ClaimTextWriter(entry_path)
+        try:
+            for page in metrics.timed_iter(
+                "extraction_page_seconds",
+                iter_pdf_pages(pdf_path, workers=workers, window_pages=window_pages),
+            ):
+                writer.add(page)
+                yield page
+        except BaseException:
+            # Includes the consumer closing the generator before the last page
+            writer.abort()
+            raise
+        writer.commit()
+
+    def warm(self, pdf_paths: list[str], workers: int = 1) -> int:
+        """Extracts and stores every PDF not already in the store; returns how many were added."""
+
+        added = 0
+        for pdf_path in pdf_paths:
+            if self.contains(pdf_path):
+                continue
+            self.put(pdf_path, iter_pdf_pages(pdf_path, workers=workers))
+            added += 1
+        return added
+
+    def log_stats(self) -> None:
+        """Logs the hit / miss counters for the run."""
+        logging.info(
+            f"Page text store {self.store_dir}: {self.hits} hits, {self.misses} misses"
+        )
+
+
+# Store used by process_single_claim; None disables the store
+_ACTIVE_STORE: Optional[PageTextStore] = None
+
+
+def configure_text_store(store_dir: Optional[str]) -> Optional[PageTextStore]:
+    """Makes the store at store_dir the active store; a store_dir of None disables it."""
+
+    global _ACTIVE_STORE
+
+    _ACTIVE_STORE = PageTextStore(store_dir) if store_dir is not None else None
+    return _ACTIVE_STORE
+
+
+def get_text_store() -> Optional[PageTextStore]:
+    """Returns the active store, or None if the store is disabled."""
+    return _ACTIVE_STORE
+
+
+def iter_claim_pages(
+    claim_path: str, workers: int = 1, window_pages: Optional[int] = None
+) -> Iterator[str]:
+    """Yields the claim's pages from the active page text store if enabled, otherwise from the PDF.
+
+    See utils.iter_pdf_pages for workers and window_pages.
+    """
+
+    if (text_store := get_text_store()) is not None:
+        return text_store.iter_pages(
+            claim_path, workers=workers, window_pages=window_pages
+        )
+    return metrics.timed_iter(
+        "extraction_page_seconds",
+        iter_pdf_pages(claim_path, workers=workers, window_pages=window_pages),
+    )
+
+
+def read_claim_pages(claim_path: str, page_nos: Iterable[int]) -> dict[int, str]:
+    """Returns the text of the given pages (numbered from 1) of a claim.
+
+    Reads from the active page text store when the claim is stored there, otherwise
+    extracts only the requested pages from the PDF.
+    """
+
+    text_store = get_text_store()
+    if text_store is not None and (stored := text_store.get(claim_path)) is not None:
+        try:
+            return {page_no: stored.page(page_no) for page_no in page_nos}
+        finally:
+            stored.close()
+
+    reader = PdfReader(claim_path)
+    return {page_no: reader.pages[page_no - 1].extract_text() for page_no in page_nos}
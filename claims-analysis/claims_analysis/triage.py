@@ -0,0 +1,369 @@
+import json
+import logging
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+import numpy as np
+
+from claims_analysis import metrics
+from claims_analysis.constants import (
+    TRIAGE_DEFAULT_THRESHOLD,
+    TRIAGE_NEGATION_PHRASES,
+    TRIAGE_PROXIMITY_CHARS,
+)
+from claims_analysis.prefilter import (
+    PATTERN_FLAGS,
+    PrefilterEngine,
+    get_prefilter_engine,
+)
+from claims_analysis.run_journal import read_journal
+from claims_analysis.text_store import read_claim_pages
+
+# Dollar amounts as they appear in estimate line items, e.g. "$1,250" or "1,250.00"
+CURRENCY_PATTERN = re.compile(
+    r"\$\s?\d[\d,]*(?:\.\d{2})?|\b\d{1,3}(?:,\d{3})*\.\d{2}\b"
+)
+# Replacement cost / actual cash value columns of an estimate
+RCV_ACV_PATTERN = re.compile(
+    r"\b(?:rcv|acv|replacement cost|actual cash value|depreciation)\b",
+    flags=PATTERN_FLAGS,
+)
+
+# Features scored for each (page, violation type), in the order of FEATURE_WEIGHTS
+FEATURE_NAMES = [
+    "keyword_hits",
+    "currency_near_hit",
+    "rcv_acv_columns",
+    "negation_near_hit",
+]
+# Logistic weights of the features: a keyword hit next to a dollar amount on a page with
+# RCV/ACV columns looks like a paid line item, one next to "not covered" looks handled
+FEATURE_WEIGHTS = np.array([0.8, 3.0, 1.0, -2.5])
+FEATURE_BIAS = -3.0
+
+
+def _nearest_distances(positions: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Distance from each position to the nearest target; inf where there are no targets."""
+
+    if len(targets) == 0:
+        return np.full(len(positions), np.inf)
+    idx = np.searchsorted(targets, positions)
+    before = targets[np.clip(idx - 1, 0, len(targets) - 1)]
+    after = targets[np.clip(idx, 0, len(targets) - 1)]
+    return np.minimum(np.abs(positions - before), np.abs(after - positions))
+
+
+def _match_starts(pattern: re.Pattern, page_text: str) -> np.ndarray:
+    return np.array([match.start() for match in pattern.finditer(page_text)])
+
+
+@dataclass
+class TriageStats:
+    """Counts of the triage decisions of a run.
+
+    Attributes:
+        pages: pages scored by the triage stage
+        pages_skipped: pages whose every model call was skipped
+        calls_skipped: (page, prompt) model calls that were skipped
+        skipped_by_type: skipped calls per violation type the page matched
+    """
+
+    pages: int = 0
+    pages_skipped: int = 0
+    calls_skipped: int = 0
+    skipped_by_type: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+
+class PageTriage:
+    """CPU-only scoring stage between the keyword prefilter and the model.
+
+    A model call is skipped when every violation type it asks about scores below its
+    threshold, see calibrate_thresholds.
+
+    Attributes:
+        thresholds: score below which a violation type is considered absent, by type name
+        stats: counts of scored pages and skipped calls
+    """
+
+    def __init__(
+        self,
+        thresholds: dict[str, float] = {},
+        engine: Optional[PrefilterEngine] = None,
+    ):
+        self.thresholds = dict(thresholds)
+        self.stats = TriageStats()
+
+        self._engine = engine or get_prefilter_engine()
+        self._negation_pattern = re.compile(
+            "|".join(re.escape(phrase) for phrase in TRIAGE_NEGATION_PHRASES),
+            flags=PATTERN_FLAGS,
+        )
+        self._lock = threading.Lock()
+
+    def threshold(self, type_name: str) -> float:
+        return self.thresholds.get(type_name, TRIAGE_DEFAULT_THRESHOLD)
+
+    def features(self, page_text: str, type_names: list[str]) -> np.ndarray:
+        """Returns the feature matrix of the page, one row per violation type."""
+
+        hit_starts = [
+            np.array(
+                [start for start, _ in self._engine.match_spans(page_text, [name])]
+            )
+            for name in type_names
+        ]
+        hit_counts = np.array([len(starts) for starts in hit_starts])
+        if not hit_counts.any():
+            return np.zeros((len(type_names), len(FEATURE_NAMES)))
+        # All hits of all types in one array, with the row of their type alongside
+        positions = np.concatenate([starts for starts in hit_starts if len(starts)])
+        rows = np.repeat(np.arange(len(type_names)), hit_counts)
+
+        currency_near = (
+            _nearest_distances(positions, _match_starts(CURRENCY_PATTERN, page_text))
+            <= TRIAGE_PROXIMITY_CHARS
+        )
+        negation_near = (
+            _nearest_distances(
+                positions, _match_starts(self._negation_pattern, page_text)
+            )
+            <= TRIAGE_PROXIMITY_CHARS
+        )
+        per_hit = np.maximum(hit_counts, 1)
+
+        return np.column_stack(
+            [
+                np.log1p(hit_counts),
+                np.bincount(rows, currency_near, len(type_names)) / per_hit,
+                np.full(
+                    len(type_names), float(bool(RCV_ACV_PATTERN.search(page_text)))
+                ),
+                np.bincount(rows, negation_near, len(type_names)) / per_hit,
+            ]
+        )
+
+    def score(self, page_text: str, type_names: Iterable[str]) -> dict[str, float]:
+        """Returns the estimated probability of a violation on the page for each type."""
+
+        type_names = sorted(type_names)
+        if not type_names:
+            return {}
+        logits = self.features(page_text, type_names) @ FEATURE_WEIGHTS + FEATURE_BIAS
+        return dict(zip(type_names, (1 / (1 + np.exp(-logits))).tolist()))
+
+    def select(
+        self,
+        page_text: str,
+        matched_type_names: set[str],
+        candidate_type_names: list[set[str]],
+    ) -> list[bool]:
+        """Decides which of a page's candidate model calls are worth making.
+
+        Args:
+            page_text: the text of the page
+            matched_type_names: the violation types the prefilter matched on the page
+            candidate_type_names: the violation types of each processor the page would be
+                sent to
+
+        Returns:
+            for each candidate, True if it should be sent to the model
+        """
+
+        with metrics.span("triage_page_seconds"):
+            scores = self.score(page_text, matched_type_names)
+        decisions = [
+            any(
+                scores[name] >= self.threshold(name)
+                for name in type_names & matched_type_names
+            )
+            for type_names in candidate_type_names
+        ]
+
+        with self._lock:
+            self.stats.pages += 1
+            self.stats.pages_skipped += not any(decisions)
+            for type_names, keep in zip(candidate_type_names, decisions):
+                if keep:
+                    continue
+                self.stats.calls_skipped += 1
+                metrics.count("triage_skipped_calls")
+                for name in type_names & matched_type_names:
+                    self.stats.skipped_by_type[name] += 1
+                    metrics.count(f"triage_skipped.{name}")
+        if not any(decisions):
+            metrics.count("triage_skipped_pages")
+        return decisions
+
+    def log_stats(self) -> None:
+        """Logs how many pages and model calls the triage stage skipped."""
+
+        stats = self.stats
+        logging.info(
+            f"Page triage: {stats.pages} pages scored, {stats.pages_skipped} skipped "
+            f"entirely, {stats.calls_skipped} model calls skipped "
+            f"{dict(sorted(stats.skipped_by_type.items()))}"
+        )
+
+
+def load_thresholds(path: str) -> dict[str, float]:
+    """Reads per violation type thresholds written by save_thresholds."""
+
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_thresholds(path: str, thresholds: dict[str, float]) -> None:
+    with open(path, "w") as file:
+        json.dump(dict(sorted(thresholds.items())), file, indent=2)
+
+
+@dataclass
+class TriageSample:
+    """Triage scores of one model call of a past run, with the model's verdict.
+
+    Attributes:
+        claim: path to the claim PDF file
+        page_no: 1-based page number within the claim
+        scores: triage score of each violation type the call asked about and the page matched
+        flagged: whether the model reported a violation
+    """
+
+    claim: str
+    page_no: int
+    scores: dict[str, float]
+    flagged: bool
+
+
+def collect_samples(
+    journal_paths: list[str], triage: Optional[PageTriage] = None
+) -> list[TriageSample]:
+    """Scores every model call recorded in the journals of past runs, kept with keep_journal.
+
+    The journals should come from runs without triage, since calls a triage stage skipped
+    were never recorded. Page text is read from the text store or the claim PDFs, which
+    have to be at the paths the runs used.
+    """
+
+    triage = triage or PageTriage()
+    engine = get_prefilter_engine()
+    samples = []
+    for journal_path in journal_paths:
+        records = read_journal(journal_path)
+        if records and records[0]["settings"].get("triage") is not None:
+            logging.warning(
+                f"{journal_path} is from a run with triage, skipped calls are missing"
+            )
+
+        calls_by_claim: dict[str, list[dict]] = defaultdict(list)
+        for record in records[1:]:
+            if record["type"] == "page":
+                calls_by_claim[record["claim"]].append(record)
+
+        for claim, calls in calls_by_claim.items():
+            page_texts = read_claim_pages(claim, {call["page_no"] for call in calls})
+            for call in calls:
+                page_text = page_texts[call["page_no"]]
+                type_names = set(call["processor"].split(",")) & (
+                    engine.scan_page(page_text, call["page_no"]).matched_types
+                )
+                samples.append(
+                    TriageSample(
+                        claim=claim,
+                        page_no=call["page_no"],
+                        scores=triage.score(page_text, type_names),
+                        flagged=bool(call["reasons"]),
+                    )
+                )
+    return samples
+
+
+def calibrate_thresholds(
+    samples: list[TriageSample], target_recall: float = 1.0
+) -> dict[str, float]:
+    """Picks the highest threshold per violation type that keeps target_recall of its flags.
+
+    Types without any flagged sample keep the default threshold, since nothing in the
+    samples says how low their scores can be.
+    """
+
+    flagged_scores: dict[str, list[float]] = defaultdict(list)
+    for sample in samples:
+        if sample.flagged:
+            for name, score in sample.scores.items():
+                flagged_scores[name].append(score)
+
+    return {
+        name: float(
+            np.quantile(scores, 1 - target_recall, method="lower")
+            if target_recall < 1
+            else min(scores)
+        )
+        for name, scores in flagged_scores.items()
+    }
+
+
+@dataclass
+class TriageEvaluation:
+    """Triage decisions replayed against the verdicts of a run without triage.
+
+    Attributes:
+        calls: model calls of the run
+        flagged: calls where the model reported a violation
+        skipped: calls the triage would have skipped
+        missed: skipped calls where the model reported a violation
+    """
+
+    calls: int = 0
+    flagged: int = 0
+    skipped: int = 0
+    missed: int = 0
+
+    @property
+    def recall(self) -> float:
+        """Fraction of the model's flags that the triage would still have sent."""
+        return 1 - self.missed / self.flagged if self.flagged else 1.0
+
+    @property
+    def skip_precision(self) -> float:
+        """Fraction of skipped calls that the model answered with no violation."""
+        return 1 - self.missed / self.skipped if self.skipped else 1.0
+
+
+def evaluate_thresholds(
+    samples: list[TriageSample], thresholds: dict[str, float]
+) -> TriageEvaluation:
+    """Measures which calls of a full-model run the thresholds would have skipped."""
+
+    triage = PageTriage(thresholds)
+    evaluation = TriageEvaluation()
+    for sample in samples:
+        keep = any(
+            score >= triage.threshold(name) for name, score in sample.scores.items()
+        )
+        evaluation.calls += 1
+        evaluation.flagged += sample.flagged
+        evaluation.skipped += not keep
+        evaluation.missed += sample.flagged and not keep
+    return evaluation
+
+
+_ACTIVE_TRIAGE: Optional[PageTriage] = None
+
+
+def configure_page_triage(
+    enabled: bool, thresholds: dict[str, float] = {}
+) -> Optional[PageTriage]:
+    """Starts the triage stage with the given per-type thresholds, or disables it."""
+
+    global _ACTIVE_TRIAGE
+
+    _ACTIVE_TRIAGE = PageTriage(thresholds) if enabled else None
+    return _ACTIVE_TRIAGE
+
+
+def get_page_triage() -> Optional[PageTriage]:
+    """Returns the active triage stage, or None if triage is disabled."""
+    return _ACTIVE_TRIAGE
@@ -1,29 +1,53 @@
 import logging
+import math
+import multiprocessing
+import multiprocessing.util
 import re
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from functools import lru_cache, wraps
 from time import time
-from typing import Any, Callable
+from typing import Any, Callable, Iterator, Optional
 
 from pypdf import PdfReader
 
+from claims_analysis import metrics
+from claims_analysis.constants import PARALLEL_EXTRACTION_MIN_PAGES
+from claims_analysis.prefilter import compile_keywords
 
-def setup_logging(log_path: str) -> None:
-    """Setups logging to save logs in log_path."""
+# Shards per extraction worker; more shards than workers evens out pages that are slow to parse
+SHARDS_PER_WORKER = 4
+
+
+def setup_logging(log_path: str, append: bool = False) -> None:
+    """Setups logging to save logs in log_path, appending to it if append is True."""
 
     logging.basicConfig(
         level=logging.INFO,
         format="[%(asctime)s] %(levelname)s - %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
-        handlers=[logging.FileHandler(log_path, mode="w"), logging.StreamHandler()],
+        handlers=[
+            logging.FileHandler(log_path, mode="a" if append else "w"),
+            logging.StreamHandler(),
+        ],
         force=True,
     )
 
 
 def log_timer(func: Callable) -> Callable:
-    """Decorator for logging the time it takes to run a function."""
+    """Decorator for logging the time it takes to run a function.
+
+    The duration is also recorded as a `<function name>_seconds` span in the run metrics.
+    """
 
+    @wraps(func)
     def wrap_func(*args: Any, **kwargs: Any) -> Any:
         t1 = time()
-        result = func(*args, **kwargs)
+        with metrics.span(f"{func.__name__.lstrip('_')}_seconds"):
+            result = func(*args, **kwargs)
         t2 = time()
         logging.info(f"Function {func.__name__!r} executed in {(t2-t1):.2f}s")
         return result
@@ -31,17 +55,180 @@ def log_timer(func: Callable) -> Callable:
     return wrap_func
 
 
-def convert_pdf_to_page_list(path: str) -> list[str]:
-    """Takes in file path and returns list of string where each string is 1 page."""
+def _iter_reader_pages(
+    reader: PdfReader, start: int, stop: int, window_pages: Optional[int] = None
+) -> Iterator[str]:
+    """Yields the text of pages [start, stop), dropping the reader's parsed objects per window."""
+
+    for page_idx in range(start, stop):
+        if window_pages and page_idx > start and (page_idx - start) % window_pages == 0:
+            # The reader caches every object it parsed, e.g. decoded content streams
+            reader.resolved_objects.clear()
+        yield reader.pages[page_idx].extract_text()
+
+
+def _extract_page_range(
+    path: str, start: int, stop: int, window_pages: Optional[int] = None
+) -> list[str]:
+    """Extracts the text of pages [start, stop) with a reader owned by the calling process."""
+
+    if window_pages is None:
+        return list(_iter_reader_pages(PdfReader(path), start, stop))
+    with open(path, "rb") as file:
+        return list(_iter_reader_pages(PdfReader(file), start, stop, window_pages))
+
+
+def _split_page_ranges(num_pages: int, num_shards: int) -> list[tuple[int, int]]:
+    """Splits num_pages into at most num_shards contiguous (start, stop) ranges in page order."""
+
+    shard_size = math.ceil(num_pages / max(num_shards, 1))
+    return [
+        (start, min(start + shard_size, num_pages))
+        for start in range(0, num_pages, shard_size)
+    ]
+
+
+_EXTRACTION_POOLS: dict[int, ProcessPoolExecutor] = {}
+_EXTRACTION_POOLS_LOCK = threading.Lock()
+_EXTRACTION_POOLS_FINALIZER: Optional[multiprocessing.util.Finalize] = None
+
+
+def get_extraction_pool(workers: int) -> ProcessPoolExecutor:
+    """Returns the process-wide pool of `workers` extraction processes, started on first use.
+
+    Workers are started with forkserver or spawn, since a forked child could inherit locks
+    held by other threads, so scripts processing claims need an `if __name__ == "__main__":`
+    guard.
+    """
+
+    global _EXTRACTION_POOLS_FINALIZER
+
+    with _EXTRACTION_POOLS_LOCK:
+        if (pool := _EXTRACTION_POOLS.get(workers)) is None:
+            # multiprocessing joins a process's children on exit before the executors'
+            # own shutdown hook runs, so idle pool workers would block the exit of a
+            # process that is itself a multiprocessing worker (e.g. a benchmark
+            # scenario). A finalizer stops the pools first; its priority puts it ahead
+            # of the finalizers that close the pools' own queues (priority 10).
+            if _EXTRACTION_POOLS_FINALIZER is None:
+                _EXTRACTION_POOLS_FINALIZER = multiprocessing.util.Finalize(
+                    None, shutdown_extraction_pools, exitpriority=100
+                )
+            start_methods = multiprocessing.get_all_start_methods()
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(
+                    "forkserver" if "forkserver" in start_methods else "spawn"
+                ),
+            )
+            _EXTRACTION_POOLS[workers] = pool
+        return pool
+
+
+def _discard_extraction_pool(workers: int, pool: ProcessPoolExecutor) -> None:
+    """Drops a broken pool so the next claim starts a fresh one."""
+
+    with _EXTRACTION_POOLS_LOCK:
+        if _EXTRACTION_POOLS.get(workers) is pool:
+            del _EXTRACTION_POOLS[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_extraction_pools() -> None:
+    """Stops the extraction processes; later extractions start new ones."""
+
+    with _EXTRACTION_POOLS_LOCK:
+        pools = list(_EXTRACTION_POOLS.values())
+        _EXTRACTION_POOLS.clear()
+    for pool in pools:
+        pool.shutdown()
+
+
+def iter_pdf_pages(
+    path: str,
+    workers: int = 1,
+    min_pages_for_parallel: int = PARALLEL_EXTRACTION_MIN_PAGES,
+    window_pages: Optional[int] = None,
+) -> Iterator[str]:
+    """Yields the text of each page of the PDF in page order as soon as it's extracted.
+
+    Args:
+        path: path to the claim PDF file
+        workers: number of processes to extract text with, see get_extraction_pool; 1
+            extracts serially in this process
+        min_pages_for_parallel: documents with fewer pages are always extracted serially
+        window_pages: if set, extraction works through windows of this many pages: readers
+            read the file as needed instead of loading it whole and drop the objects they
+            parsed after each window, and only one shard per worker is extracted ahead of
+            the consumer. Keeps memory flat for very large claims.
+    """
+
+    # A reader given a path loads the whole file, one given an open file reads it as needed
+    with open(path, "rb") if window_pages is not None else nullcontext(path) as source:
+        reader = PdfReader(source)
+        num_pages = len(reader.pages)
+        logging.info(f"Read {path} with {num_pages} pages")
+
+        if workers <= 1 or num_pages < min_pages_for_parallel:
+            yield from _iter_reader_pages(reader, 0, num_pages, window_pages)
+            return
+    # Each worker opens its own PdfReader since readers can't be shared across processes
+    del reader
+
+    page_ranges = _split_page_ranges(num_pages, workers * SHARDS_PER_WORKER)
+    logging.info(
+        f"Extracting {path} with {workers} processes over {len(page_ranges)} page ranges"
+    )
+    executor = get_extraction_pool(workers)
+    pending: deque[Future[list[str]]] = deque()
+    try:
+        if window_pages is None:
+            # Shards are consumed in submission order so page order is preserved
+            pending.extend(
+                executor.submit(_extract_page_range, path, start, stop)
+                for start, stop in page_ranges
+            )
+            while pending:
+                yield from pending.popleft().result()
+            return
+
+        # Only keep one shard per worker in flight beyond the one being consumed
+        for start, stop in page_ranges:
+            pending.append(
+                executor.submit(_extract_page_range, path, start, stop, window_pages)
+            )
+            if len(pending) > workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    except BrokenProcessPool:
+        _discard_extraction_pool(workers, executor)
+        raise
+    finally:
+        # The pool outlives the claim, so shards of an abandoned claim must not keep it busy
+        for future in pending:
+            future.cancel()
+
+
+def convert_pdf_to_page_list(
+    path: str,
+    workers: int = 1,
+    min_pages_for_parallel: int = PARALLEL_EXTRACTION_MIN_PAGES,
+) -> list[str]:
+    """Takes in file path and returns list of string where each string is 1 page.
+
+    See iter_pdf_pages for the arguments.
+    """
+    return list(iter_pdf_pages(path, workers, min_pages_for_parallel))
+
 
-    reader = PdfReader(path)
-    logging.info(f"Read {path} with {len(reader.pages)} pages")
-    pages = [page.extract_text() for page in reader.pages]
-    return pages
+@lru_cache(maxsize=128)
+def _compile_keywords_pattern(keywords: tuple[str, ...]) -> re.Pattern:
+    """Compiles the standalone-word pattern for a set of keywords once per keyword set."""
+    return compile_keywords(keywords)
 
 
 def words_exist_in_text(keywords: list[str], corpus: str) -> bool:
     """Determines if at least one of the keywords exists standalone in the corpus."""
 
-    pattern = "|".join(r"\b{}\b".format(word) for word in keywords)
-    return bool(re.search(pattern, corpus, flags=re.IGNORECASE | re.DOTALL))
+    return bool(_compile_keywords_pattern(tuple(keywords)).search(corpus))
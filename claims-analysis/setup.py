@@ -17,5 +17,14 @@ setup(
         "pandas-stubs",
         "ipykernel",
         "pypdf",
+        "numpy",
+        "requests",
     ],
+    extras_require={
+        # Parquet output, see outputs.ParquetResultWriter
+        "parquet": ["pyarrow"],
+    },
+    entry_points={
+        "console_scripts": ["claims-analysis=claims_analysis.cli:main"],
+    },
 )
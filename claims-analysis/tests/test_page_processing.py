@@ -0,0 +1,65 @@
+import pytest
+from langchain.schema import AIMessage
+
+from claims_analysis.constants import ALL_VIOLATION_TYPES
+from claims_analysis.page_processing import CombinedPageProcessor
+
+
+@pytest.fixture(scope="module")
+def processor():
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("OPENAI_API_KEY", "test")
+        yield CombinedPageProcessor(ALL_VIOLATION_TYPES)
+
+
+@pytest.mark.parametrize(
+    "content, type_names, expected",
+    [
+        ("NONE", {"pools", "patios"}, []),
+        (
+            "NONE\nYES: pools: pool pump claimed",
+            {"pools"},
+            [("pools", "pool pump claimed")],
+        ),
+        (
+            "YES: pools: pool pump claimed\nYES: patios: patio furniture",
+            {"pools", "patios"},
+            [("pools", "pool pump claimed"), ("patios", "patio furniture")],
+        ),
+        ("  YES:pools:pool pump  ", {"pools"}, [("pools", "pool pump")]),
+        ("YES: decks: deck boards", {"pools", "patios"}, []),
+        (
+            "YES: decks: deck boards\nYES: pools: pool pump",
+            {"pools", "patios"},
+            [("pools", "pool pump")],
+        ),
+        (
+            "YES: pools: pool pump\nYES: pools: hot tub",
+            {"pools", "patios"},
+            [("pools", "pool pump")],
+        ),
+        ("YES: pool pump claimed", {"pools"}, [("pools", "pool pump claimed")]),
+        ("YES: pool pump claimed", {"pools", "patios"}, []),
+        ("YES: pools - pool pump", {"pools", "patios"}, []),
+        ("Pools: pool pump claimed", {"pools"}, []),
+    ],
+    ids=[
+        "none",
+        "none_then_yes",
+        "two_labels",
+        "no_spaces",
+        "unexpected_label",
+        "unexpected_and_expected",
+        "repeated_label",
+        "missing_colon_single_type",
+        "missing_colon_many_types",
+        "missing_label_colon",
+        "missing_delimiter",
+    ],
+)
+def test_process_combined_response(processor, content, type_names, expected):
+    response = AIMessage(content=content)
+    assert (
+        processor._process_combined_response(response, frozenset(type_names))
+        == expected
+    )
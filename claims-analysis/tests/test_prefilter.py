@@ -0,0 +1,89 @@
+import re
+
+import pytest
+
+from benchmarks.prefilter_benchmark import KEYWORD_PHRASES, make_pages
+from claims_analysis.constants import (
+    ALL_VIOLATION_TYPES,
+    GLOBAL_EXCLUDED_KEYWORDS,
+    ViolationType,
+)
+from claims_analysis.prefilter import PrefilterEngine
+
+# Pages written to hit the edges of the literal pre-check: case, line breaks, word
+# boundaries and characters that IGNORECASE matches but casefold does not fold
+EDGE_PAGES = [
+    "",
+    "POOL PUMP",
+    "spool of wire, carpool",
+    "Pool-side furniture",
+    "HOT\nTUB",
+    "hottub",
+    "Hot  tub",
+    "PATıO furniture",
+    "PATİO furniture",
+    "ſecondary residence",
+    "Secondary\nresidence",
+    "shed 1,200.00 RCV",
+    "RCV 300.00\n\n\nShed (detached)",
+    "sheds rcvs",
+    "Upper  Cabinets",
+    "CABINETRY - upper",
+    "cabinetsupper",
+    "upper/cabinets, coverage H",
+    "COVERAGE\nF",
+    "coverage i̇",
+    "KITCHEN (Kitchen) patio",
+]
+SYNTHETIC_PAGES = make_pages(200, 120, 0.5, seed=0)
+ALL_PAGES = (
+    EDGE_PAGES
+    + [phrase.upper() for phrase in KEYWORD_PHRASES]
+    + SYNTHETIC_PAGES
+    + [page.title() for page in SYNTHETIC_PAGES[:50]]
+)
+
+
+def baseline_words_exist_in_text(keywords: list[str], corpus: str) -> bool:
+    """utils.words_exist_in_text as it was before the prefilter engine."""
+
+    pattern = "|".join(r"\b{}\b".format(word) for word in keywords)
+    return bool(re.search(pattern, corpus, flags=re.IGNORECASE | re.DOTALL))
+
+
+@pytest.mark.parametrize(
+    "keyword",
+    [keyword for vt in ALL_VIOLATION_TYPES for keyword in vt.keywords]
+    + GLOBAL_EXCLUDED_KEYWORDS,
+)
+def test_keyword_matches_baseline(keyword):
+    engine = PrefilterEngine(
+        [
+            ViolationType(
+                name="kw", prompt_desc="kw", keywords=[keyword], extended_coverage=None
+            )
+        ],
+        excluded_keywords=[],
+    )
+    for page in ALL_PAGES:
+        expected = baseline_words_exist_in_text([keyword], page)
+        assert (engine.scan_page(page).matched_types == {"kw"}) == expected, page
+
+
+@pytest.mark.parametrize(
+    "pages", [EDGE_PAGES, SYNTHETIC_PAGES], ids=["edge", "synthetic"]
+)
+def test_scan_page_matches_baseline(pages):
+    engine = PrefilterEngine(ALL_VIOLATION_TYPES)
+    for page_no, page in enumerate(pages, 1):
+        page_match = engine.scan_page(page, page_no)
+        assert page_match.matched_types == {
+            vt.name
+            for vt in ALL_VIOLATION_TYPES
+            if baseline_words_exist_in_text(vt.keywords, page)
+        }, page
+        assert page_match.excluded_keywords == [
+            keyword
+            for keyword in GLOBAL_EXCLUDED_KEYWORDS
+            if baseline_words_exist_in_text([keyword], page)
+        ], page
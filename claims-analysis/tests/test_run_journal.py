@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+from benchmarks.stub_chat import StubChatConfig, StubChatModel, patch_chat_model
+from benchmarks.synthetic_claims import generate_claims
+from claims_analysis.claims_processing import RunOptions, process_claims
+from claims_analysis.constants import ClassificationMode
+from claims_analysis.run_journal import read_journal
+
+# Model calls after which the interrupted run is killed: after its first claims are done
+# and in the middle of the next ones
+KILL_AFTER_CALLS = 30
+
+
+@pytest.fixture
+def run_claims(tmp_path, monkeypatch):
+    """Returns a function running process_claims on synthetic claims with the stub model."""
+
+    # process_claims sets the API key of cloud runs in the environment
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    config = {
+        "OPENAI_API_KEY": "test",
+        "CLAIMS_DIR": str(tmp_path / "claims"),
+        "OUTPUTS_DIR": str(tmp_path / "outputs"),
+        "LOGS_DIR": str(tmp_path / "logs"),
+        "CACHE_DIR": str(tmp_path / "cache"),
+    }
+    claim_paths = generate_claims(config["CLAIMS_DIR"], 4, 30, 0.5)
+    os.makedirs(config["OUTPUTS_DIR"])
+    os.makedirs(config["LOGS_DIR"])
+
+    def run(run_id: str, kill_after_calls: int = 0, **kwargs) -> None:
+        if kill_after_calls:
+            calls = 0
+            call_model = StubChatModel.__call__
+
+            def killed_call(self, messages):
+                nonlocal calls
+                calls += 1
+                if calls > kill_after_calls:
+                    raise KeyboardInterrupt
+                return call_model(self, messages)
+
+            monkeypatch.setattr(StubChatModel, "__call__", killed_call)
+
+        try:
+            with patch_chat_model(StubChatConfig(latency_median=0, yes_ratio=0.5)):
+                process_claims(
+                    True,
+                    config,
+                    run_id,
+                    claim_paths=claim_paths,
+                    options=RunOptions(
+                        use_cache=False,
+                        use_text_store=False,
+                        collect_metrics=False,
+                        requests_per_minute=10**9,
+                        tokens_per_minute=10**12,
+                        **kwargs,
+                    ),
+                )
+        finally:
+            monkeypatch.undo()
+
+    run.outputs_dir = config["OUTPUTS_DIR"]
+    return run
+
+
+def read_outputs(outputs_dir: str, run_id: str) -> list[bytes]:
+    outputs = []
+    for suffix in ["_violations.csv", "_summary.csv"]:
+        with open(os.path.join(outputs_dir, run_id + suffix), "rb") as f:
+            outputs.append(f.read())
+    return outputs
+
+
+@pytest.mark.parametrize("concurrent_claims", [False, True])
+def test_resumed_run_matches_uninterrupted_run(run_claims, concurrent_claims):
+    run_claims("full", concurrent_claims=concurrent_claims)
+    journal_path = os.path.join(run_claims.outputs_dir, "resumed_journal.jsonl")
+
+    with pytest.raises(KeyboardInterrupt):
+        run_claims(
+            "resumed",
+            kill_after_calls=KILL_AFTER_CALLS,
+            concurrent_claims=concurrent_claims,
+        )
+    record_types = [record["type"] for record in read_journal(journal_path)]
+    assert record_types[-1] == "page"
+    if not concurrent_claims:
+        # Concurrent claims interleave, so none of them may be done yet
+        assert "claim" in record_types
+
+    run_claims("resumed", resume=True, concurrent_claims=concurrent_claims)
+    assert read_outputs(run_claims.outputs_dir, "resumed") == read_outputs(
+        run_claims.outputs_dir, "full"
+    )
+    assert not os.path.exists(journal_path)
+
+
+def test_resume_drops_truncated_last_record(run_claims):
+    run_claims("full")
+    with pytest.raises(KeyboardInterrupt):
+        run_claims("resumed", kill_after_calls=KILL_AFTER_CALLS)
+
+    # A crash in the middle of a write leaves half a record behind
+    with open(
+        os.path.join(run_claims.outputs_dir, "resumed_journal.jsonl"), "a"
+    ) as journal:
+        journal.write('{"type": "page", "claim": "')
+
+    run_claims("resumed", resume=True)
+    assert read_outputs(run_claims.outputs_dir, "resumed") == read_outputs(
+        run_claims.outputs_dir, "full"
+    )
+
+
+def test_resume_rejects_changed_settings(run_claims):
+    with pytest.raises(KeyboardInterrupt):
+        run_claims("resumed", kill_after_calls=KILL_AFTER_CALLS)
+
+    with pytest.raises(ValueError, match="different settings"):
+        run_claims(
+            "resumed",
+            resume=True,
+            classification_mode=ClassificationMode.Combined,
+        )
+
+
+def test_keep_journal(run_claims):
+    run_claims("kept", keep_journal=True)
+    assert os.path.exists(os.path.join(run_claims.outputs_dir, "kept_journal.jsonl"))